@@ -1,21 +1,173 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, g, render_template, request, jsonify
 from flask_cors import CORS
+import json
+import logging
 import sys
 import os
+import time
 
 # Add the project root to Python path
 sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
 
 # UPDATED: Import the new occupation search engine
-from src.models.enhanced_search import EnhancedNCOSearch
+from src.models.engine_registry import EngineRegistry, models_loaded
+from src.models.query_cache import get_shared_cache
+from src.models.result_cache import result_cache_from_env
+from src.models.suggest_index import ENTRIES_FILE, SuggestIndex, load_popularity
+from src.models.micro_batcher import MicroBatcher
+from src.models.metrics import REGISTRY, trace_request
+
+# NCO_LOG_LEVEL=DEBUG shows every query and its expansions
+logging.basicConfig(level=os.environ.get('NCO_LOG_LEVEL', 'INFO'),
+                    format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+# A sample of /search requests (NCO_TRACE_SAMPLE_RATE, 0 to 1) is logged with its
+# stage timings as JSON lines, to NCO_TRACE_LOG if set, otherwise with the other logs
+TRACE_SAMPLE_RATE = float(os.environ.get('NCO_TRACE_SAMPLE_RATE', 0))
+if os.environ.get('NCO_TRACE_LOG'):
+    trace_handler = logging.FileHandler(os.environ['NCO_TRACE_LOG'])
+    trace_handler.setFormatter(logging.Formatter('%(message)s'))
+    trace_logger = logging.getLogger('nco.trace')
+    trace_logger.addHandler(trace_handler)
+    trace_logger.propagate = False
 
 app = Flask(__name__)
 CORS(app)
 
 # UPDATED: Initialize the new occupation search engine
-print("Initializing NCO Occupation Search Engine...")
-search_engine = EnhancedNCOSearch()
-print("Search engine ready!")
+logger.info("Initializing NCO Occupation Search Engine...")
+# NCO_RETRIEVAL=hybrid fuses BM25 with the dense ranking, NCO_PREFILTER_SIZE
+# restricts dense scoring to that many BM25 candidates
+PREFILTER_SIZE = int(os.environ.get('NCO_PREFILTER_SIZE', 0)) or None
+registry = EngineRegistry()
+try:
+    registry.register('default', 'enhanced', query_cache=get_shared_cache(), result_cache=result_cache_from_env(),
+                      retrieval=os.environ.get('NCO_RETRIEVAL', 'dense'), prefilter_size=PREFILTER_SIZE)
+
+    # More engines served from the same process (and sharing encoders), selected with
+    # "engine" in the request body, e.g. NCO_ENGINES='{"hnsw": {"kind": "enhanced", "index_type": "hnsw"}}'
+    for engine_name, engine_spec in json.loads(os.environ.get('NCO_ENGINES', '{}')).items():
+        engine_spec = dict(engine_spec)
+        engine_kind = engine_spec.pop('kind', 'enhanced')
+        if engine_kind == 'enhanced':
+            engine_spec.setdefault('query_cache', get_shared_cache())
+        registry.register(engine_name, engine_kind, **engine_spec)
+except FileNotFoundError as e:
+    # Stores are built, not committed: a fresh clone gets the build step instead of a traceback
+    sys.exit(f"{e}. Build the stores with: python src/data_processing/create_occupation_embeddings.py")
+
+# NCO_RELOAD_INTERVAL > 0 reloads engines whose embedding store changed on disk
+RELOAD_INTERVAL = float(os.environ.get('NCO_RELOAD_INTERVAL', 0))
+if RELOAD_INTERVAL > 0:
+    registry.watch(RELOAD_INTERVAL)
+logger.info("Search engine ready!")
+
+# Typeahead over titles, codes and synonyms, answered without the encoder.
+# NCO_SUGGEST_POPULARITY points at query counts for ranking, e.g. the trace log
+suggest_index = None
+if os.path.exists(ENTRIES_FILE):
+    popularity_file = os.environ.get('NCO_SUGGEST_POPULARITY')
+    suggest_index = SuggestIndex.from_catalogue(
+        ENTRIES_FILE, synonyms=getattr(registry.get(), 'synonyms', None),
+        popularity=load_popularity(popularity_file) if popularity_file else None)
+MAX_SUGGESTIONS = 20
+
+MAX_BATCH_QUERIES = 1000
+MAX_TOP_K = 100
+
+# Below this top-match confidence, /search also suggests the closest NCO families
+GROUP_FALLBACK_CONFIDENCE = float(os.environ.get('NCO_GROUP_FALLBACK_CONFIDENCE', 0.5))
+
+# Concurrent /search requests share one encode and scoring pass.
+# NCO_BATCH_WINDOW_MS=0 turns micro-batching off.
+BATCH_WINDOW_MS = float(os.environ.get('NCO_BATCH_WINDOW_MS', 3))
+MAX_BATCH_SIZE = int(os.environ.get('NCO_MAX_BATCH_SIZE', 32))
+batchers = {}
+if BATCH_WINDOW_MS > 0:
+    for engine_name in registry.names():
+        if hasattr(registry.get(engine_name), 'search_batch'):
+            # Looks the engine up per batch, so a reload takes effect on the next batch
+            batchers[engine_name] = MicroBatcher(
+                lambda queries, top_k, engine_name=engine_name: registry.get(engine_name).search_batch(queries, top_k=top_k),
+                window_ms=BATCH_WINDOW_MS, max_batch_size=MAX_BATCH_SIZE, metrics=REGISTRY)
+batcher = batchers.get('default')
+
+def after_fork():
+    """Restore what a forked worker does not inherit in working order (see serve.py)"""
+    for micro_batcher in batchers.values():
+        micro_batcher.start()
+    get_shared_cache().reopen()
+    REGISTRY.reset()
+
+def format_document_result(result):
+    """Shape a whole-volume result of a semantic engine like an occupation, best passage as the description"""
+    passages = result.get('passages') or []
+    formatted = {
+        'name': result['file'].replace('\\', '/').split('/')[-1],
+        'confidence': float(result['confidence_percent']),
+        'full_description': passages[0]['text'] if passages else result['file'],
+        'file': result['file']
+    }
+    if passages:
+        formatted['passage_file'] = result['passage_file']
+        formatted['passages'] = passages
+    return formatted
+
+def format_results(results):
+    """Shape search results for the web client"""
+    formatted_results = []
+    for result in results:
+        if 'occupation' not in result:
+            formatted_results.append(format_document_result(result))
+            continue
+        formatted = {
+            'name': result['occupation'],  # Show the occupation description
+            'confidence': float(result['confidence_percent']),
+            'full_description': result['full_occupation']
+        }
+        # The NCO code and its division-to-family path, for engines that know them
+        for key in ('code', 'hierarchy'):
+            if result.get(key) is not None:
+                formatted[key] = result[key]
+        formatted_results.append(formatted)
+    return formatted_results
+
+@app.before_request
+def start_timer():
+    g.start_time = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    endpoint = request.endpoint or 'unknown'
+    if endpoint != 'metrics' and 'start_time' in g:
+        REGISTRY.observe('nco_http_request_seconds', time.perf_counter() - g.start_time, endpoint=endpoint)
+        REGISTRY.inc('nco_http_requests_total', endpoint=endpoint, status=response.status_code)
+    return response
+
+def parse_top_k(value):
+    """top_k from a request as an int in 1..MAX_TOP_K, None when it is anything else"""
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        return None
+    try:
+        top_k = int(value)
+    except ValueError:
+        return None
+    return top_k if 1 <= top_k <= MAX_TOP_K else None
+
+def check_filters(search_engine, filters):
+    """Error message for filters the engine cannot apply, None when they are usable"""
+    if not filters:
+        return None
+    if not isinstance(filters, dict):
+        return 'filters must be an object such as {"division": "7"}'
+    if not hasattr(search_engine, 'filter_index'):
+        return 'This engine does not support filters'
+    try:
+        search_engine.filter_index.rows(filters)
+    except ValueError as e:
+        return str(e)
+    return None
 
 @app.route('/')
 def home():
@@ -24,36 +176,166 @@ def home():
 @app.route('/search', methods=['POST'])
 def search():
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Expected a JSON object such as {"query": "tailor"}'}), 400
         query = data.get('query', '')
+        engine_name = data.get('engine', 'default')
+        filters = data.get('filters')
         
-        if not query:
+        if not isinstance(query, str) or not query:
             return jsonify({'error': 'No query provided'}), 400
+        if engine_name not in registry.engines:
+            return jsonify({'error': f'Unknown engine {engine_name}'}), 404
+        search_engine = registry.get(engine_name)
+        error = check_filters(search_engine, filters)
+        if error:
+            return jsonify({'error': error}), 400
         
-        print(f"Received search query: {query}")
+        logger.debug("Received search query: %r", query)
         
-        # Perform search
-        results = search_engine.search(query, top_k=5)
+        with trace_request('search', TRACE_SAMPLE_RATE, query=query):
+            # Perform search (stage "engine" includes any wait for a micro-batch)
+            with REGISTRY.stage('engine'):
+                if filters:
+                    results = search_engine.search(query, top_k=5, filters=filters)
+                elif engine_name in batchers:
+                    results = batchers[engine_name].search(query, top_k=5)
+                else:
+                    results = search_engine.search(query, top_k=5)
+            
+            # UPDATED: Format results for individual occupations
+            formatted_results = format_results(results)
+            
+            logger.debug("Returning %d results", len(formatted_results))
+            
+            response = {
+                'query': query,
+                'results': formatted_results
+            }
+            if hasattr(search_engine, 'search_groups') and not filters and \
+                    (not results or results[0]['confidence'] < GROUP_FALLBACK_CONFIDENCE):
+                with REGISTRY.stage('groups'):
+                    response['groups'] = [
+                        {'code': group['code'], 'name': group['title'], 'level': group['level'],
+                         'confidence': group['confidence_percent']}
+                        for group in search_engine.search_groups(query, level='family', top_k=3)
+                    ]
+            
+            with REGISTRY.stage('serialization'):
+                return jsonify(response)
+    
+    except Exception as e:
+        REGISTRY.inc('nco_errors_total', endpoint='search')
+        logger.exception("Search error: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/search/batch', methods=['POST'])
+def search_batch():
+    """Accepts a JSON array of queries, or {"queries": [...], "top_k": 5, "filters": {...}}"""
+    try:
+        data = request.get_json(silent=True)
+        top_k = 5
+        engine_name = 'default'
+        filters = None
+        if isinstance(data, dict):
+            top_k = data.get('top_k', top_k)
+            engine_name = data.get('engine', engine_name)
+            filters = data.get('filters')
+            data = data.get('queries')
         
-        # UPDATED: Format results for individual occupations
-        formatted_results = []
-        for result in results:
-            formatted_results.append({
-                'name': result['occupation'],  # Show the occupation description
-                'confidence': float(result['confidence_percent']),
-                'full_description': result['full_occupation']
-            })
+        top_k = parse_top_k(top_k)
+        if top_k is None:
+            return jsonify({'error': f'top_k must be an integer from 1 to {MAX_TOP_K}'}), 400
+        if not isinstance(data, list) or not all(isinstance(q, str) for q in data):
+            return jsonify({'error': 'Expected a JSON array of query strings'}), 400
+        if len(data) > MAX_BATCH_QUERIES:
+            return jsonify({'error': f'At most {MAX_BATCH_QUERIES} queries per batch'}), 400
+        if engine_name not in registry.engines:
+            return jsonify({'error': f'Unknown engine {engine_name}'}), 404
+        search_engine = registry.get(engine_name)
+        if not hasattr(search_engine, 'search_batch'):
+            return jsonify({'error': f'Engine {engine_name} does not support batch search'}), 400
+        error = check_filters(search_engine, filters)
+        if error:
+            return jsonify({'error': error}), 400
         
-        print(f"Returning {len(formatted_results)} results")
+        # Empty queries keep their position in the response but are not searched
+        searchable = [q for q in data if q.strip()]
+        if filters:
+            batch_results = iter(search_engine.search_batch(searchable, top_k=top_k, filters=filters))
+        else:
+            batch_results = iter(search_engine.search_batch(searchable, top_k=top_k))
         
-        return jsonify({
-            'query': query,
-            'results': formatted_results
-        })
+        with REGISTRY.stage('serialization'):
+            return jsonify({
+                'results': [
+                    {'query': q, 'results': format_results(next(batch_results)) if q.strip() else []}
+                    for q in data
+                ]
+            })
     
     except Exception as e:
-        print(f"Search error: {str(e)}")
+        REGISTRY.inc('nco_errors_total', endpoint='search_batch')
+        logger.exception("Batch search error: %s", e)
         return jsonify({'error': str(e)}), 500
 
+@app.route('/occupation/<code>', methods=['GET'])
+def occupation(code):
+    """Catalogue entry for an exact NCO code (7531.0100 or 75310100), looked up without the encoder"""
+    engine_name = request.args.get('engine', 'default')
+    if engine_name not in registry.engines:
+        return jsonify({'error': f'Unknown engine {engine_name}'}), 404
+    search_engine = registry.get(engine_name)
+    if not hasattr(search_engine, 'occupation'):
+        return jsonify({'error': f'Engine {engine_name} does not support code lookups'}), 400
+    entry = search_engine.occupation(code)
+    if entry is None:
+        return jsonify({'error': f'No occupation with code {code}'}), 404
+    return jsonify(entry)
+
+@app.route('/suggest', methods=['GET'])
+def suggest():
+    """As-you-type suggestions for ?q=, at most ?limit= of them (default 10)"""
+    if suggest_index is None:
+        return jsonify({'error': 'Suggestions need the structured catalogue, run extract_occupations.py'}), 503
+    query = request.args.get('q', '')
+    limit = min(request.args.get('limit', 10, type=int), MAX_SUGGESTIONS)
+    with REGISTRY.stage('suggest'):
+        suggestions = suggest_index.suggest(query, limit=limit)
+    return jsonify({'query': query, 'suggestions': suggestions})
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    search_engine = registry.get()
+    stats = search_engine.query_cache.stats()
+    if search_engine.result_cache is not None:
+        stats['result_cache'] = search_engine.result_cache.stats()
+    return jsonify(stats)
+
+@app.route('/batching/stats', methods=['GET'])
+def batching_stats():
+    if batcher is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(batcher.stats(), enabled=True))
+
+@app.route('/engines', methods=['GET'])
+def engines():
+    """Engines served by name, with their load and reload state, and the shared encoders"""
+    return jsonify({'engines': registry.status(), 'models': models_loaded()})
+
+@app.route('/engines/<name>/reload', methods=['POST'])
+def reload_engine(name):
+    """Rebuild an engine from its store in the background; requests keep using the old one until the swap"""
+    if name not in registry.engines:
+        return jsonify({'error': f'Unknown engine {name}'}), 404
+    registry.reload(name)
+    return jsonify({'reloading': name}), 202
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Stage latency histograms and counters in the Prometheus text format"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,115 @@
+"""
+Concurrent load driver for the Flask /search endpoint
+
+Sends the labelled benchmark queries from a number of client threads for a
+fixed duration (or request count) and reports latency percentiles,
+throughput and errors, optionally as JSON for comparison between runs.
+
+Example:
+    python src/api/app.py &
+    python src/api/load_test.py --concurrency 16 --duration 30 --output load.json
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the project root to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+
+from src.models.benchmark import QUERY_SET, latency_summary, load_query_set
+
+
+def post_search(url, query, timeout=30.0):
+    """One POST /search, returning the number of results"""
+    body = json.dumps({"query": query}).encode("utf-8")
+    http_request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(http_request, timeout=timeout) as response:
+        return len(json.loads(response.read())["results"])
+
+
+def run_load(url, queries, concurrency=8, duration=10.0, max_requests=None, timeout=30.0):
+    """
+    Drive url from concurrency client threads
+
+    Each client sends its next query as soon as the previous one answers,
+    until duration seconds have passed or max_requests have been sent.
+    """
+    query_cycle = itertools.cycle(queries)
+    lock = threading.Lock()
+    latencies, errors = [], []
+    sent = 0
+    deadline = time.perf_counter() + duration
+
+    def client():
+        nonlocal sent
+        while time.perf_counter() < deadline:
+            with lock:
+                if max_requests is not None and sent >= max_requests:
+                    return
+                sent += 1
+                query = next(query_cycle)
+            start_time = time.perf_counter()
+            try:
+                post_search(url, query, timeout)
+            except (urllib.error.URLError, OSError, ValueError) as e:
+                with lock:
+                    errors.append(str(e))
+                continue
+            elapsed = (time.perf_counter() - start_time) * 1000
+            with lock:
+                latencies.append(elapsed)
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(client) for _ in range(concurrency)]:
+            future.result()
+    wall_seconds = time.perf_counter() - start_time
+
+    return {
+        "url": url,
+        "concurrency": concurrency,
+        "wall_seconds": round(wall_seconds, 3),
+        "requests": len(latencies),
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "throughput_rps": round(len(latencies) / wall_seconds, 2) if wall_seconds > 0 else None,
+        "latency": latency_summary(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent load test for the /search endpoint")
+    parser.add_argument("--url", default="http://127.0.0.1:5000/search")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[8],
+                        help="Client threads, several values run one test each")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per test")
+    parser.add_argument("--max-requests", type=int, default=None)
+    parser.add_argument("--query-set", default=QUERY_SET)
+    parser.add_argument("--output", default=None, help="Write the results as JSON")
+    args = parser.parse_args()
+
+    queries = [item["query"] for item in load_query_set(args.query_set)]
+    results = []
+    for concurrency in args.concurrency:
+        result = run_load(args.url, queries, concurrency, args.duration, args.max_requests)
+        latency = result["latency"]
+        print(f"concurrency {concurrency}: {result['requests']} requests, {result['errors']} errors, "
+              f"{result['throughput_rps']} req/s, p50 {latency.get('p50_ms')} ms, "
+              f"p95 {latency.get('p95_ms')} ms, p99 {latency.get('p99_ms')} ms")
+        results.append(result)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"created": time.strftime("%Y-%m-%d %H:%M:%S"), "runs": results}, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""
+Pre-fork production server for the search API
+
+The master process imports app.py once, which loads the encoders and the
+memory-mapped embedding stores and builds every index, warms the engines
+up, freezes the garbage collector and only then forks the workers. Model
+weights, quantized copies and the BM25/hierarchy/suggestion indexes are
+therefore shared copy-on-write, and the store matrices through the page
+cache, instead of being rebuilt in every worker.
+
+Each worker serves the master's listening socket with a threaded WSGI
+server and limits torch and BLAS to NCO_WORKER_THREADS threads, so
+NCO_WORKERS x NCO_WORKER_THREADS can match the cores without contention.
+
+    NCO_WORKERS          worker processes (default: cores / NCO_WORKER_THREADS)
+    NCO_WORKER_THREADS   torch/BLAS threads per worker (default 1)
+    NCO_HOST, NCO_PORT   listening address (default 0.0.0.0:5000)
+    NCO_RELOAD_INTERVAL  seconds between store checks by the master (default: off)
+
+SIGHUP reloads every engine in the master and replaces the workers one at
+a time; so does a changed store when NCO_RELOAD_INTERVAL is set. A POST to
+/engines/<name>/reload only reaches the worker that receives it. /metrics
+and the micro-batcher stats are per worker. SIGTERM or SIGINT stops the
+workers after their in-flight requests.
+
+Example:
+    NCO_WORKERS=8 python src/api/serve.py
+"""
+import os
+import sys
+
+WORKER_THREADS = int(os.environ.get('NCO_WORKER_THREADS', 1))
+
+# Thread pools are sized when their libraries load, so this precedes every import that
+# pulls in numpy or torch. onnxruntime cannot take a thread pool across fork, so its
+# sessions are single-threaded, and the tokenizers must not start threads before it.
+for thread_var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'NUMEXPR_NUM_THREADS',
+                   'VECLIB_MAXIMUM_THREADS'):
+    os.environ[thread_var] = str(WORKER_THREADS)
+os.environ['NCO_ENCODER_THREADS'] = '1'
+os.environ['TOKENIZERS_PARALLELISM'] = 'false'
+
+# The master checks the stores itself, app.py must not start a watcher thread before the fork
+RELOAD_INTERVAL = float(os.environ.pop('NCO_RELOAD_INTERVAL', 0))
+
+import gc
+import logging
+import signal
+import socket
+import threading
+import time
+
+from werkzeug.serving import make_server
+
+# Add the project root to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+
+try:
+    import torch
+except ImportError:  # ONNX-only deployments
+    torch = None
+
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:
+    threadpool_limits = None
+
+HOST = os.environ.get('NCO_HOST', '0.0.0.0')
+PORT = int(os.environ.get('NCO_PORT', 5000))
+WORKERS = int(os.environ.get('NCO_WORKERS', 0)) or max(1, (os.cpu_count() or 1) // WORKER_THREADS)
+WARMUP_QUERIES = ["software engineer", "nurse", "tailor", "electrician", "school teacher"]
+
+logger = logging.getLogger("nco.serve")
+
+
+def warm_up(api):
+    """Run every endpoint once, so lazily built state exists before the fork"""
+    client = api.app.test_client()
+    for engine_name in api.registry.names():
+        for query in WARMUP_QUERIES:
+            client.post('/search', json={'query': query, 'engine': engine_name})
+        client.post('/search/batch', json={'queries': WARMUP_QUERIES, 'engine': engine_name})
+    for query in WARMUP_QUERIES:
+        client.get('/suggest', query_string={'q': query[:4]})
+
+
+def freeze():
+    """Move everything allocated so far out of the collector's reach, so no collection dirties shared pages"""
+    gc.collect()
+    gc.freeze()
+
+
+def run_worker(api, listener):
+    """Serve the shared listening socket until SIGTERM, then finish in-flight requests"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # The master handles Ctrl-C
+    signal.signal(signal.SIGHUP, signal.SIG_DFL)
+    if torch is not None:
+        torch.set_num_threads(WORKER_THREADS)
+    if threadpool_limits is not None:
+        threadpool_limits(WORKER_THREADS)
+    api.after_fork()
+
+    server = make_server(HOST, PORT, api.app, threaded=True, fd=listener.fileno())
+    server.daemon_threads = False  # server_close() waits for the requests being served
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    logger.info("Worker %d serving", os.getpid())
+    server.serve_forever()
+    server.server_close()
+    api.get_shared_cache().flush()  # os._exit() skips atexit
+
+
+class Master:
+    """Forks, watches and replaces the workers"""
+
+    def __init__(self, api, listener, workers=WORKERS):
+        self.api = api
+        self.listener = listener
+        self.size = workers
+        self.workers = set()
+        self.stopping = False
+        self.reload_requested = False
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                run_worker(self.api, self.listener)
+            except BaseException:
+                logger.exception("Worker %d failed", os.getpid())
+                status = 1
+            finally:
+                os._exit(status)  # Never return into the master's loop
+        self.workers.add(pid)
+        return pid
+
+    def stop_worker(self, pid):
+        try:
+            os.kill(pid, signal.SIGTERM)
+            os.waitpid(pid, 0)
+        except (ProcessLookupError, ChildProcessError):
+            pass
+        self.workers.discard(pid)
+
+    def reap(self):
+        """Forget exited workers, returning how many there were"""
+        exited = 0
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            if pid in self.workers:
+                self.workers.discard(pid)
+                exited += 1
+                if not self.stopping:
+                    logger.warning("Worker %d exited with status %d, replacing it", pid, status)
+        return exited
+
+    def reload(self, names=None):
+        """Reload engines in the master, then roll the workers over to them"""
+        registry = self.api.registry
+        gc.unfreeze()
+        if names is None:
+            names = registry.names()
+            for name in names:
+                registry.reload(name, background=False)
+        reloaded = [name for name in names if registry.status()[name]["last_error"] is None]
+        if reloaded:
+            warm_up(self.api)
+        freeze()
+        if not reloaded:
+            return
+        logger.info("Reloaded %s, replacing workers", ", ".join(reloaded))
+        for pid in list(self.workers):
+            self.spawn()
+            self.stop_worker(pid)
+
+    def run(self):
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, lambda signum, frame: setattr(self, "stopping", True))
+        signal.signal(signal.SIGHUP, lambda signum, frame: setattr(self, "reload_requested", True))
+
+        for _ in range(self.size):
+            self.spawn()
+        logger.info("Serving on %s:%d with %d workers x %d threads", HOST, PORT, self.size, WORKER_THREADS)
+
+        next_check = time.monotonic() + RELOAD_INTERVAL
+        while not self.stopping:
+            time.sleep(0.5)
+            self.reap()
+            if self.stopping:
+                break
+            if self.reload_requested:
+                self.reload_requested = False
+                self.reload()
+            elif RELOAD_INTERVAL > 0 and time.monotonic() >= next_check:
+                next_check = time.monotonic() + RELOAD_INTERVAL
+                gc.unfreeze()
+                changed = self.api.registry.reload_changed()
+                freeze()
+                if changed:
+                    self.reload(changed)
+            while len(self.workers) < self.size:
+                self.spawn()
+
+        logger.info("Stopping %d workers", len(self.workers))
+        for pid in list(self.workers):
+            os.kill(pid, signal.SIGTERM)
+        for pid in list(self.workers):
+            self.stop_worker(pid)
+
+
+def main():
+    listener = socket.create_server((HOST, PORT), backlog=1024)
+
+    # One thread while warming up: a torch/OpenMP pool that has run is not safe to fork
+    if torch is not None:
+        torch.set_num_threads(1)
+    from src.api import app as api
+
+    start_time = time.perf_counter()
+    warm_up(api)
+    freeze()
+    logger.info("Warmed up in %.1fs", time.perf_counter() - start_time)
+
+    Master(api, listener).run()
+
+
+if __name__ == "__main__":
+    main()
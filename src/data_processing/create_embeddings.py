@@ -1,9 +1,21 @@
-from sentence_transformers import SentenceTransformer
+from itertools import islice
 from pathlib import Path
-import pickle
+import numpy as np
+import sys
+import os
 
-# Load pre-trained model
-model = SentenceTransformer('all-MiniLM-L6-v2')  # Small, fast, very good
+# Add the project root to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+
+from src.data_processing.create_occupation_embeddings import LazyModel
+from src.models.embedding_store import commit_store, open_store_matrix, save_store
+from src.models.passage_index import STRIDE_WORDS, WINDOW_WORDS, sliding_windows
+
+MODEL_NAME = 'all-MiniLM-L6-v2'  # Small, fast, very good
+PASSAGE_BATCH_SIZE = 256  # Windows per encoder call, and the most held in memory at once
+
+# Pre-trained model, loaded on first use so importing this module stays cheap
+model = LazyModel(MODEL_NAME)
 
 def read_documents(folder):
     docs = []
@@ -19,9 +31,53 @@ def create_and_save_embeddings():
     print(f"Encoding {len(docs)} documents...")
     embeddings = model.encode(docs, show_progress_bar=True, batch_size=16)
     # Save embeddings and file order
-    with open("data/processed/nco_embeddings.pkl", "wb") as f:
-        pickle.dump({"files": [str(f) for f in files], "embeddings": embeddings}, f)
-    print("Saved nco_embeddings.pkl with all semantic vectors!")
+    save_store("data/processed/nco_embeddings", embeddings, {"files": [str(f) for f in files]}, MODEL_NAME)
+    print("Saved nco_embeddings.npy with all semantic vectors!")
+
+def create_passage_embeddings(folder="data/raw", output_file="data/processed/nco_passages",
+                              window=WINDOW_WORDS, stride=STRIDE_WORDS):
+    """
+    Encode every volume as overlapping passage windows (see passage_index.py)
+    
+    Windows are cut from the extracted text rather than the stemmed tokens, so
+    the encoder sees real words and the stored offsets point at readable text.
+    The volumes are streamed twice: once to find the window boundaries, which
+    sizes the memory-mapped output, then again to encode the windows in
+    batches written straight into it. Memory does not grow with volume size.
+    """
+    files = sorted(Path(folder).glob("*_extracted.txt"))
+    passage_files, offsets, lengths = [], [], []
+    for file_id, file in enumerate(files):
+        for offset, length, _ in sliding_windows(file, window, stride):
+            passage_files.append(file_id)
+            offsets.append(offset)
+            lengths.append(length)
+    print(f"Encoding {len(offsets)} passages from {len(files)} documents...")
+    
+    matrix = open_store_matrix(output_file, len(offsets), model.get_sentence_embedding_dimension())
+    windows = (text for file in files for _, _, text in sliding_windows(file, window, stride))
+    row = 0
+    while True:
+        texts = list(islice(windows, PASSAGE_BATCH_SIZE))
+        if not texts:
+            break
+        embeddings = model.encode(texts, batch_size=PASSAGE_BATCH_SIZE)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix[row:row + len(texts)] = embeddings / norms
+        row += len(texts)
+        print(f"  {row}/{len(offsets)} passages")
+    shape = matrix.shape
+    matrix.flush()
+    del matrix
+    if row != shape[0]:
+        raise RuntimeError(f"Expected {shape[0]} passages but encoded {row}, a volume changed during the build")
+    
+    metadata = {"files": [str(f) for f in files], "passage_files": passage_files,
+                "offsets": offsets, "lengths": lengths, "window": window, "stride": stride}
+    commit_store(output_file, shape, metadata, MODEL_NAME)
+    print(f"Saved {output_file}.npy with {shape[0]} passage vectors!")
 
 if __name__ == "__main__":
     create_and_save_embeddings()
+    create_passage_embeddings()
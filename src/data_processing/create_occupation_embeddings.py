@@ -1,17 +1,191 @@
 from sentence_transformers import SentenceTransformer
 from pathlib import Path
-import pickle
+from collections import Counter
+import argparse
+import hashlib
+import json
+import re
+import sys
+import os
+import numpy as np
 
-def create_occupation_embeddings():
-    # Load model
-    model = SentenceTransformer('all-mpnet-base-v2')
+# Add the project root to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+
+from src.models.ann_index import INDEX_TYPES, build_index, index_path, faiss
+from src.models.embedding_store import EmbeddingStoreError, load_store, save_store, store_paths
+from src.models.enhanced_search import SYNONYMS
+from src.data_processing.extract_occupations import entry_text
+
+MODEL_NAME = 'all-mpnet-base-v2'
+MAX_EXPANSION_WORDS = 5000  # Most frequent single words kept for query expansion lookups
+ENCODE_BATCH_SIZE = 128
+ANN_INDEX_TYPES = tuple(t for t in INDEX_TYPES if t != "exact")  # Exact search scores the store itself
+HIERARCHY_LEVELS = ("division", "sub_division", "group", "family")
+RECORD_FIELDS = ("code", "title") + HIERARCHY_LEVELS + ("volumes",)
+
+class LazyModel:
+    """Loads the encoder only if something actually needs encoding"""
+    
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self.model = None
+    
+    def load(self):
+        if self.model is None:
+            self.model = SentenceTransformer(self.model_name)
+        return self.model
+    
+    def encode(self, texts, **kwargs):
+        return self.load().encode(texts, **kwargs)
+    
+    def get_sentence_embedding_dimension(self):
+        return self.load().get_sentence_embedding_dimension()
+
+def text_hash(text):
+    """Hash of the whitespace-normalized text, used to detect unchanged entries"""
+    return hashlib.sha1(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+def encode_incrementally(model, texts, store_path, text_key, full=False):
+    """
+    Embed texts, reusing vectors from an existing store for unchanged entries
+    
+    Only new or edited texts are encoded; entries no longer in texts are dropped.
+    
+    Returns:
+        tuple: (embeddings, hashes, number of texts encoded)
+    """
+    hashes = [text_hash(text) for text in texts]
+    previous = {}
+    
+    if not full:
+        try:
+            old_embeddings, old_metadata, _ = load_store(store_path, MODEL_NAME)
+            old_hashes = old_metadata.get("hashes") or [text_hash(t) for t in old_metadata[text_key]]
+            previous = {h: row for row, h in enumerate(old_hashes)}
+        except FileNotFoundError:
+            pass
+        except EmbeddingStoreError as e:
+            print(f"Ignoring existing store ({e}), re-encoding everything")
+    
+    to_encode = list(dict.fromkeys(h for h in hashes if h not in previous))
+    new_rows = {}
+    if to_encode:
+        first_text = {}
+        for text, h in zip(texts, hashes):
+            first_text.setdefault(h, text)
+        encoded = model.encode([first_text[h] for h in to_encode], show_progress_bar=True,
+                               batch_size=ENCODE_BATCH_SIZE)
+        new_rows = dict(zip(to_encode, encoded))
+    
+    dimension = len(next(iter(new_rows.values()))) if new_rows else old_embeddings.shape[1]
+    embeddings = np.empty((len(texts), dimension), dtype=np.float32)
+    for row, h in enumerate(hashes):
+        embeddings[row] = new_rows[h] if h in new_rows else old_embeddings[previous[h]]
+    
+    return embeddings, hashes, len(to_encode)
+
+def save_store_if_changed(output_file, embeddings, metadata, encoded):
+    """
+    Save the store unless nothing was encoded and the sidecar on disk already matches
+    
+    Returns:
+        dict: The manifest of the store on disk
+    """
+    if encoded == 0:
+        try:
+            _, old_metadata, manifest = load_store(output_file, MODEL_NAME)
+            if old_metadata == metadata:
+                print(f"{output_file} is up to date, not rewriting it")
+                return manifest
+        except (FileNotFoundError, EmbeddingStoreError):
+            pass
+    
+    manifest = save_store(output_file, embeddings, metadata, MODEL_NAME)
+    print(f"Saved {len(embeddings)} embeddings to {output_file}")
+    return manifest
+
+def index_hash_path(index_file):
+    """Records the store content_hash an index was built from, e.g. occupation_index_hnsw.faiss.json"""
+    return index_file.with_name(index_file.name + ".json")
+
+def build_search_indexes(embeddings, embeddings_file, index_types=ANN_INDEX_TYPES, store_hash=None):
+    """
+    Build and save the requested ANN indexes (IVF and HNSW by default) next to the embeddings
+    
+    An index already built from the store with content hash store_hash is kept as is.
+    """
+    if not index_types:
+        return
+    if faiss is None:
+        print("faiss is not installed, skipping index build (search will use exact numpy scoring)")
+        return
+    
+    for index_type in index_types:
+        output_file = index_path(embeddings_file, index_type)
+        hash_file = index_hash_path(output_file)
+        if store_hash is not None and output_file.exists() and hash_file.exists():
+            with open(hash_file, "r", encoding="utf-8") as f:
+                if json.load(f).get("content_hash") == store_hash:
+                    print(f"{index_type} index is up to date, skipping it")
+                    continue
+        
+        index = build_index(embeddings, index_type)
+        index.save(output_file)
+        with open(hash_file, "w", encoding="utf-8") as f:
+            json.dump({"content_hash": store_hash}, f)
+        print(f"Saved {index_type} index to {output_file}")
+
+def create_expansion_embeddings(model, occupations, full=False):
+    """Precompute embeddings for synonym phrases and frequent single-word expansions"""
+    phrases = set(SYNONYMS)
+    for synonyms in SYNONYMS.values():
+        phrases.update(synonyms)
+    
+    # EnhancedNCOSearch.expand_query splits lowercased queries on whitespace,
+    # so the vocabulary is built from the same kind of tokens
+    word_counts = Counter()
+    for occupation in occupations:
+        word_counts.update(w for w in occupation.lower().split() if re.fullmatch(r'[a-z][a-z-]*', w))
+    for phrase in list(phrases):
+        phrases.update(phrase.split())
+    phrases.update(w for w, _ in word_counts.most_common(MAX_EXPANSION_WORDS))
+    
+    phrases = sorted(phrases)
+    output_file = store_paths("data/processed/expansion_embeddings")["matrix"]
+    embeddings, hashes, encoded = encode_incrementally(model, phrases, output_file, "phrases", full)
+    print(f"Encoded {encoded} new or changed expansion phrases, reused {len(phrases) - encoded}")
+    
+    save_store_if_changed(output_file, embeddings, {"phrases": phrases, "hashes": hashes}, encoded)
+
+def read_occupations():
+    """
+    Occupation texts to embed, plus row-aligned metadata for the store sidecar
+    
+    Prefers the structured catalogue from extract_occupations.py (codes, titles and
+    hierarchy levels), falling back to the flat all_occupations.txt.
+    """
+    entries_file = Path("data/interim/nco_entries.jsonl")
+    if entries_file.exists():
+        occupations, records = [], []
+        hierarchy_titles = {level: {} for level in HIERARCHY_LEVELS}
+        with open(entries_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                occupations.append(entry_text(record))
+                records.append({key: record[key] for key in RECORD_FIELDS})
+                for level in HIERARCHY_LEVELS:
+                    node = record["hierarchy"][level]
+                    if node["title"]:
+                        hierarchy_titles[level][node["code"]] = node["title"]
+        return occupations, {"records": records, "hierarchy_titles": hierarchy_titles}
     
     # Read all individual occupations
     occupations_file = Path("data/interim/all_occupations.txt")
     
     if not occupations_file.exists():
         print("Error: all_occupations.txt not found. Run extract_occupations.py first.")
-        return
+        return None, None
     
     with open(occupations_file, 'r', encoding='utf-8') as f:
         content = f.read()
@@ -27,23 +201,37 @@ def create_occupation_embeddings():
             if len(clean_entry) > 20:
                 occupations.append(clean_entry)
     
+    return occupations, {}
+
+def create_occupation_embeddings(full=False, index_types=ANN_INDEX_TYPES):
+    # Load model (only when there is something to encode)
+    model = LazyModel(MODEL_NAME)
+    
+    occupations, metadata = read_occupations()
+    if occupations is None:
+        return
+    
     print(f"Creating embeddings for {len(occupations)} occupations...")
     
     if occupations:
-        # Create embeddings
-        embeddings = model.encode(occupations, show_progress_bar=True, batch_size=16)
+        # Create embeddings, encoding only entries whose text changed since the last build
+        output_file = store_paths("data/processed/occupation_embeddings")["matrix"]
+        embeddings, hashes, encoded = encode_incrementally(model, occupations, output_file, "occupations", full)
+        print(f"Encoded {encoded} new or changed occupations, reused {len(occupations) - encoded}")
         
-        # Save embeddings
-        output_file = Path("data/processed/occupation_embeddings.pkl")
-        with open(output_file, "wb") as f:
-            pickle.dump({
-                "occupations": occupations,
-                "embeddings": embeddings
-            }, f)
+        # Save embeddings as a memory-mappable store with a manifest, unless nothing changed
+        metadata.update({"occupations": occupations, "hashes": hashes})
+        manifest = save_store_if_changed(output_file, embeddings, metadata, encoded)
         
-        print(f"Saved {len(occupations)} occupation embeddings to {output_file}")
+        build_search_indexes(embeddings, output_file, index_types, manifest["content_hash"])
+        create_expansion_embeddings(model, occupations, full)
     else:
         print("No occupations found to process!")
 
 if __name__ == "__main__":
-    create_occupation_embeddings()
+    parser = argparse.ArgumentParser(description="Build occupation, index and expansion embeddings")
+    parser.add_argument("--full", action="store_true", help="Re-encode everything instead of only changed entries")
+    parser.add_argument("--indexes", nargs="*", choices=ANN_INDEX_TYPES, default=list(ANN_INDEX_TYPES),
+                        help="ANN indexes to build (none with an empty list)")
+    args = parser.parse_args()
+    create_occupation_embeddings(full=args.full, index_types=args.indexes)
@@ -1,41 +1,403 @@
-import requests
-from pathlib import Path
+import argparse
+import hashlib
+import json
+import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from pathlib import Path
+
+import requests
+
+NCO_URLS = {
+    "nco_vol1_abstract.pdf": "https://labour.gov.in/sites/default/files/National%20Classification%20of%20Occupations%20_Vol%20I-%202015.pdf",
+    "nco_vol2a_detailed.pdf": "https://www.ncs.gov.in/Documents/National%20Classification%20of%20Occupations%20_Vol%20II-A-%202015.pdf",
+    "nco_vol2b_detailed.pdf": "https://labour.gov.in/sites/default/files/National%20Classification%20of%20Occupations_Vol%20II-B-%202015.pdf"
+}
+DATA_FOLDER = Path("data/raw")
+# {filename: {url, size, sha256, etag, last_modified}}, recorded from our own downloads. It detects
+# a changed or damaged local copy; it cannot vouch that the first download was the genuine file.
+MANIFEST_NAME = "download_manifest.json"
+CHUNK_SIZE = 1 << 20  # 1 MB reads, written straight to the .part file
+MAX_WORKERS = 3
+RETRIES = 5
+TIMEOUT = (10, 60)  # Connect and read timeouts in seconds
+
+class ChecksumError(IOError):
+    """Raised when a download does not match the SHA-256 recorded for the same file version"""
+
+    def __init__(self, message, sha256):
+        super().__init__(message)
+        self.sha256 = sha256
+
+def file_sha256(path, block_size=CHUNK_SIZE):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_manifest(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_manifest(path, manifest):
+    tmp_path = Path(str(path) + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def validators(response):
+    """ETag and Last-Modified of a response, the version of the file it carries"""
+    return {'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified')}
+
+def download_file(url, destination, entry=None, session=None, chunk_size=CHUNK_SIZE, force=False):
+    """
+    Download url to destination once, resuming a partial .part file if there is one
 
-def download_file(url, destination):
-    print(f"Downloading {url} ...")
-    response = requests.get(url, stream=True)
-    response.raise_for_status()
-    total_size = int(response.headers.get('content-length', 0))
-    downloaded = 0
-    chunk_size = 8192
-
-    with open(destination, 'wb') as f:
-        for chunk in response.iter_content(chunk_size=chunk_size):
-            if chunk:
-                f.write(chunk)
-                downloaded += len(chunk)
-                done = int(50 * downloaded / total_size)
-                print('\r[{}{}]'.format('=' * done, ' ' * (50-done)), end='')
-
-    print(f"\nSaved to: {destination}")
-
-def download_nco_datasets():
-    urls = {
-        "nco_vol1_abstract.pdf": "https://labour.gov.in/sites/default/files/National%20Classification%20of%20Occupations%20_Vol%20I-%202015.pdf",
-        "nco_vol2a_detailed.pdf": "https://www.ncs.gov.in/Documents/National%20Classification%20of%20Occupations%20_Vol%20II-A-%202015.pdf",
-        "nco_vol2b_detailed.pdf": "https://labour.gov.in/sites/default/files/National%20Classification%20of%20Occupations_Vol%20II-B-%202015.pdf"
-    }
-    data_folder = Path("data/raw")
-    data_folder.mkdir(exist_ok=True)
-    
-    for filename, url in urls.items():
-        destination = data_folder / filename
-        if destination.exists():
-            print(f"{filename} already downloaded.")
+    A complete local copy that still matches entry's SHA-256 is only re-downloaded
+    when the server reports a new version (If-None-Match / If-Modified-Since). A
+    copy without a manifest entry, e.g. from before the manifest existed, is hashed
+    and asked about with its modification time; it is kept when the server says it
+    is not modified or sends a file of the same size. A partial download is
+    continued with a Range request, guarded by If-Range so a changed file restarts
+    from zero instead of being spliced; a .part that is already complete (the
+    server answers 416 with its full size) is just finalised. Nothing replaces
+    destination until the whole file has arrived and been hashed.
+
+    Args:
+        url (str): File to fetch
+        destination (Path): Where the finished file goes
+        entry (dict): Manifest entry from an earlier download, if any
+        session (requests.Session): Connection pool to use
+        chunk_size (int): Bytes per read
+        force (bool): Ignore the local copy and download again
+
+    Returns:
+        dict: The manifest entry for the file now at destination
+
+    Raises:
+        ChecksumError: The download does not match the recorded hash of the same file version
+        IOError: The connection closed before the announced size arrived (resumable)
+    """
+    destination = Path(destination)
+    part_path = destination.with_name(destination.name + '.part')
+    part_meta_path = destination.with_name(destination.name + '.part.json')
+    session = session or requests.Session()
+    entry = entry or {}
+    name = destination.name
+
+    headers = {}
+    adopted = False
+    if not force and destination.exists() and not entry.get('sha256'):
+        stat = destination.stat()
+        entry = {'url': url, 'size': stat.st_size, 'sha256': file_sha256(destination),
+                 'etag': None, 'last_modified': None}
+        headers['If-Modified-Since'] = formatdate(stat.st_mtime, usegmt=True)
+        adopted = True
+    elif not force and destination.exists() and entry.get('sha256'):
+        if file_sha256(destination) == entry['sha256']:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        else:
+            print(f"{name}: local copy does not match the manifest, downloading again")
+
+    offset = part_path.stat().st_size if part_path.exists() else 0
+    if offset:
+        part_version = load_manifest(part_meta_path)
+        validator = part_version.get('etag') or part_version.get('last_modified')
+        if validator:
+            headers['Range'] = f'bytes={offset}-'
+            headers['If-Range'] = validator
         else:
-            download_file(url, destination)
-            time.sleep(1)  # polite delay
+            offset = 0  # No way to tell whether the server still has the same file
+
+    digest = hashlib.sha256()
+    if offset:
+        with open(part_path, 'rb') as f:
+            for block in iter(lambda: f.read(chunk_size), b''):
+                digest.update(block)
+
+    with session.get(url, headers=headers, stream=True, timeout=TIMEOUT) as response:
+        if response.status_code == 304:
+            print(f"{name}: not modified")
+            return dict(entry, **{key: value for key, value in validators(response).items() if value})
+        if response.status_code == 416:
+            total = response.headers.get('Content-Range', '').rsplit('/', 1)[-1]
+            if total.isdigit() and int(total) == offset:
+                # Everything arrived before the last run stopped, only the rename is missing
+                print(f"{name}: partial download is already complete")
+                return finish_download(url, part_path, destination, entry, part_version, digest, offset)
+            # The partial file is not a prefix of what the server has, start over
+            part_path.unlink()
+            raise IOError(f"{name}: server rejected resume at byte {offset}")
+        response.raise_for_status()
+
+        version = validators(response)
+        if response.status_code == 206:
+            content_range = response.headers.get('Content-Range', '')
+            if not content_range.startswith(f'bytes {offset}-'):
+                part_path.unlink()
+                raise IOError(f"{name}: unexpected Content-Range '{content_range}'")
+            total = content_range.rsplit('/', 1)[-1]
+            total_size = int(total) if total.isdigit() else None
+            print(f"{name}: resuming at {offset / 1e6:.1f} MB")
+        else:
+            offset = 0
+            # Servers that omit Content-Length (or use chunked encoding) stream until they close
+            length = response.headers.get('Content-Length')
+            total_size = int(length) if length and length.isdigit() else None
+            if adopted and total_size == entry['size']:
+                # Servers that ignore If-Modified-Since: the size is the only evidence there is
+                print(f"{name}: local copy has the size the server reports, keeping it")
+                return dict(entry, **version)
+            save_manifest(part_meta_path, version)
+            digest = hashlib.sha256()
+
+        downloaded = offset
+        next_report = 0.1
+        with open(part_path, 'ab' if offset else 'wb') as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if chunk:
+                    f.write(chunk)
+                    digest.update(chunk)
+                    downloaded += len(chunk)
+                    if total_size and downloaded / total_size >= next_report:
+                        print(f"{name}: {int(100 * downloaded / total_size)}% of {total_size / 1e6:.1f} MB")
+                        next_report += 0.1
+
+    if total_size is not None and downloaded != total_size:
+        raise IOError(f"{name}: connection closed at {downloaded} of {total_size} bytes")
+    return finish_download(url, part_path, destination, entry, version, digest, downloaded)
+
+def finish_download(url, part_path, destination, entry, version, digest, size):
+    """Check a complete .part file against entry and move it into place, returning its new entry"""
+    name = destination.name
+    part_meta_path = destination.with_name(destination.name + '.part.json')
+    sha256 = digest.hexdigest()
+    same_version = entry.get('sha256') and any(
+        version.get(key) and version.get(key) == entry.get(key) for key in ('etag', 'last_modified'))
+    if same_version and sha256 != entry['sha256']:
+        part_path.unlink()
+        part_meta_path.unlink(missing_ok=True)
+        raise ChecksumError(f"{name}: SHA-256 {sha256} does not match the recorded {entry['sha256']}", sha256)
+
+    os.replace(part_path, destination)
+    part_meta_path.unlink(missing_ok=True)
+    print(f"Saved to: {destination} ({size / 1e6:.1f} MB, sha256 {sha256[:12]})")
+    return dict(version, url=url, size=size, sha256=sha256)
+
+def download_with_retries(url, destination, entry=None, retries=RETRIES, **kwargs):
+    """
+    download_file, retried with exponential backoff; each retry resumes from the .part file
+
+    A hash mismatch gets one clean download from scratch. If that gives the same
+    hash again, the server consistently sends this content and the recorded hash
+    was what was wrong, so it is replaced; a different hash again is an error.
+    """
+    checksum_retried = False
+    with requests.Session() as session:
+        attempt = 1
+        while True:
+            try:
+                return download_file(url, destination, entry, session=session, **kwargs)
+            except ChecksumError as e:
+                if checksum_retried:
+                    raise
+                checksum_retried = True  # Does not use up one of the retries
+                print(f"{e}, downloading once more from scratch")
+                entry = dict(entry, sha256=e.sha256)
+                kwargs['force'] = True
+            except (requests.RequestException, IOError) as e:
+                if attempt == retries:
+                    raise
+                delay = min(2 ** attempt, 60)
+                print(f"{Path(destination).name}: {e}, retrying in {delay}s ({attempt}/{retries - 1})")
+                time.sleep(delay)
+                attempt += 1
+
+def download_all(urls, data_folder=DATA_FOLDER, max_workers=MAX_WORKERS, force=False, retries=RETRIES):
+    """
+    Fetch every file concurrently and record them in the folder's manifest
+
+    Returns:
+        dict: {filename: error message} for the files that failed, empty on success
+    """
+    data_folder = Path(data_folder)
+    data_folder.mkdir(parents=True, exist_ok=True)
+    manifest_path = data_folder / MANIFEST_NAME
+    manifest = load_manifest(manifest_path)
+    lock = threading.Lock()
+    failures = {}
+
+    def fetch(filename, url):
+        try:
+            entry = download_with_retries(url, data_folder / filename, manifest.get(filename),
+                                          retries=retries, force=force)
+        except Exception as e:
+            print(f"{filename}: failed ({e})")
+            with lock:
+                failures[filename] = str(e)
+            return
+        with lock:
+            manifest[filename] = entry
+            save_manifest(manifest_path, manifest)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for future in [executor.submit(fetch, filename, url) for filename, url in urls.items()]:
+            future.result()
+    return failures
+
+def download_nco_datasets(max_workers=MAX_WORKERS, force=False):
+    failures = download_all(NCO_URLS, DATA_FOLDER, max_workers=max_workers, force=force)
+    if failures:
+        print(f"{len(failures)} of {len(NCO_URLS)} downloads failed, run again to resume them")
+    return not failures
+
+# Exercise resume, conditional requests and checksums against a local HTTP server
+def test_downloader():
+    import random
+    import tempfile
+    from functools import partial
+    from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+    class FlakyHandler(SimpleHTTPRequestHandler):
+        """Static files with Range/ETag support; can cut a response short or omit Content-Length"""
+        fail_after = {}  # path -> bytes to send before dropping the connection, once
+        no_length = set()
+        corrupt = {}  # path -> number of responses that get one random byte flipped
+        requests_seen = []
+        statuses = []
+
+        def log_message(self, *args):
+            pass
+
+        def send_response(self, code, message=None):
+            self.statuses.append((self.path, code))
+            super().send_response(code, message)
+
+        def do_GET(self):
+            path = Path(self.translate_path(self.path))
+            data = path.read_bytes()
+            etag = '"%s"' % hashlib.sha256(data).hexdigest()[:16]
+            self.requests_seen.append((self.path, dict(self.headers)))
+
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            start = 0
+            range_header = self.headers.get('Range')
+            if range_header and self.headers.get('If-Range', etag) == etag:
+                start = int(range_header.split('=')[1].split('-')[0])
+                if start >= len(data):
+                    self.send_response(416)
+                    self.send_header('Content-Range', f'bytes */{len(data)}')
+                    self.end_headers()
+                    return
+                self.send_response(206)
+                self.send_header('Content-Range', f'bytes {start}-{len(data) - 1}/{len(data)}')
+            else:
+                self.send_response(200)
+            body = data[start:]
+            if self.corrupt.get(self.path):
+                self.corrupt[self.path] -= 1
+                flipped = random.randrange(len(body))
+                body = body[:flipped] + bytes([body[flipped] ^ 0xFF]) + body[flipped + 1:]
+            self.send_header('ETag', etag)
+            if self.path in self.no_length:
+                self.send_header('Connection', 'close')
+                self.close_connection = True
+            else:
+                self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            cut = self.fail_after.pop(self.path, None)
+            try:
+                self.wfile.write(body if cut is None else body[:cut])
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True  # The client kept its copy after seeing the headers
+            if cut is not None:
+                self.close_connection = True
+
+    with tempfile.TemporaryDirectory() as tmp:
+        served, local = Path(tmp) / 'served', Path(tmp) / 'local'
+        served.mkdir()
+        files = {}
+        for name, size in [('a.pdf', 3_000_000), ('b.pdf', 1_500_000), ('c.pdf', 700_000)]:
+            (served / name).write_bytes(random.randbytes(size))
+            files[name] = hashlib.sha256((served / name).read_bytes()).hexdigest()
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), partial(FlakyHandler, directory=str(served)))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        urls = {name: f'http://127.0.0.1:{server.server_port}/{name}' for name in files}
+
+        print("\n1. Concurrent download, one cut short, one without Content-Length")
+        FlakyHandler.fail_after['/a.pdf'] = 2_500_000  # Bytes of the last, incomplete chunk are lost
+        FlakyHandler.no_length.add('/c.pdf')
+        failures = download_all(urls, local, retries=3)
+        manifest = load_manifest(local / MANIFEST_NAME)
+        resumed = [h for p, h in FlakyHandler.requests_seen if p == '/a.pdf' and 'Range' in h]
+        print(f"Failures: {failures}, hashes match: {all(manifest[n]['sha256'] == h == file_sha256(local / n) for n, h in files.items())}, "
+              f"a.pdf resumed with {resumed[0]['Range'] if resumed else None}")
+
+        print("\n2. Second run is conditional")
+        FlakyHandler.requests_seen.clear()
+        download_all(urls, local)
+        print(f"Sent If-None-Match: {all('If-None-Match' in h for _, h in FlakyHandler.requests_seen)}")
+
+        print("\n3. Corrupted local copy is fetched again")
+        (local / 'b.pdf').write_bytes(b'corrupt')
+        download_all(urls, local)
+        print(f"b.pdf restored: {file_sha256(local / 'b.pdf') == files['b.pdf']}")
+
+        print("\n4. A wrong recorded hash is replaced after one consistent clean download")
+        manifest = load_manifest(local / MANIFEST_NAME)
+        manifest['c.pdf']['sha256'] = '0' * 64
+        save_manifest(local / MANIFEST_NAME, manifest)
+        failures = download_all(urls, local, retries=1)
+        print(f"c.pdf recovered: {not failures and load_manifest(local / MANIFEST_NAME)['c.pdf']['sha256'] == files['c.pdf']}")
+
+        print("\n4b. Downloads that disagree with each other are rejected")
+        (local / 'c.pdf').write_bytes(b'corrupt')
+        FlakyHandler.corrupt['/c.pdf'] = 2
+        failures = download_all(urls, local, retries=1)
+        print(f"c.pdf rejected: {'c.pdf' in failures and 'SHA-256' in failures['c.pdf']}")
+        download_all(urls, local)
+
+        print("\n5. Local copies without a manifest are adopted, not downloaded again")
+        (local / MANIFEST_NAME).unlink()
+        (local / 'c.pdf').write_bytes(b'stale')
+        inodes = {name: (local / name).stat().st_ino for name in files}
+        FlakyHandler.requests_seen.clear()
+        download_all(urls, local)
+        manifest = load_manifest(local / MANIFEST_NAME)
+        print(f"Sent If-Modified-Since: {all('If-Modified-Since' in h for _, h in FlakyHandler.requests_seen)}, "
+              f"a.pdf and b.pdf kept: {all((local / n).stat().st_ino == inodes[n] for n in ('a.pdf', 'b.pdf'))}, "
+              f"c.pdf replaced: {file_sha256(local / 'c.pdf') == files['c.pdf']}, "
+              f"manifest complete: {all(manifest[n]['sha256'] == h and manifest[n]['etag'] for n, h in files.items())}")
+
+        print("\n6. A complete .part left by a crash before the rename is finalised")
+        manifest = load_manifest(local / MANIFEST_NAME)
+        etag = manifest.pop('b.pdf')['etag']
+        save_manifest(local / MANIFEST_NAME, manifest)
+        (local / 'b.pdf').rename(local / 'b.pdf.part')
+        save_manifest(local / 'b.pdf.part.json', {'etag': etag, 'last_modified': None})
+        FlakyHandler.statuses.clear()
+        failures = download_all(urls, local)
+        print(f"b.pdf finalised: {not failures and file_sha256(local / 'b.pdf') == files['b.pdf']}, "
+              f"responses: {[code for p, code in FlakyHandler.statuses if p == '/b.pdf']}")
+
+        server.shutdown()
 
 if __name__ == "__main__":
-    download_nco_datasets()
+    parser = argparse.ArgumentParser(description="Download the NCO 2015 volumes into data/raw")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="Files fetched at once")
+    parser.add_argument("--force", action="store_true", help="Download again even if the local copy is current")
+    args = parser.parse_args()
+    download_nco_datasets(args.workers, args.force)
@@ -1,6 +1,194 @@
 import re
+import json
+import argparse
 from pathlib import Path
 
+# NCO-2015 codes: 1-digit division, 2-digit sub-division, 3-digit group,
+# 4-digit family and 8-digit occupation (e.g. 7531.0100)
+OCCUPATION_CODE = re.compile(r'\b(\d{4}\.\d{4})\b')
+CONCORDANCE_LINE = re.compile(r'^(?:Family\s+)?(\d{4}\.\d{4})\s+([A-Z][^0-9]*?)(?:\s+(\d{4}\.\d{2}))?$')
+HEADER_LINES = {
+    "division": re.compile(r'^Division\s+(\d)\s+([A-Z][^0-9]*)$'),
+    "sub_division": re.compile(r'^Sub-?\s*(?:Division)?\s+(\d{2})\s+([A-Z][^0-9]*)$'),
+    "group": re.compile(r'^Group\s+(\d{3})\s+([A-Z][^0-9]*)$'),
+    "family": re.compile(r'^Family\s+(\d{4})\s+([A-Z][^0-9]*)$'),
+}
+# A family header whose "Family" label was extracted onto another line; only used for
+# families that have no proper header anywhere
+BARE_FAMILY_LINE = re.compile(r'^(\d{4})\s+([A-Z][^0-9]*)$')
+PAGE_FURNITURE = re.compile(
+    r'^(VOLUME\s+I|National Classification of Occupations|NCO 2015 NCO 2004|ISCO 08 Unit Group Details'
+    r'|Code \d{4}$|Title\s|Division$|Sub Division \d{2}$)'
+)
+# Page footer and header. Extracted text interleaves the two columns, so the first line of a
+# new page may be either column, and only continues the last entry if it restates its title
+# (or finishes a concordance title).
+PAGE_BREAK = re.compile(r'^(VOLUME\s+I|National Classification of Occupations)')
+INDEX_SECTION = re.compile(r'^National Classification of Occupations.*Alphabetical Index$')
+MAX_DESCRIPTION_CHARS = 2000  # Per occupation, keeps column-interleaved pages from ballooning one entry
+
+def restates_title(line, title):
+    """Whether a line opens with the first two words of a title, as a description does"""
+    words = (title or "").lower().split()[:2]
+    return bool(words) and line[:1].isupper() and line.lower().split()[:len(words)] == words
+
+class NCOCatalogueParser:
+    """
+    Single-pass, line-streaming parser for the extracted NCO-2015 volumes
+    
+    Every line is matched against a handful of anchored patterns, so parsing is
+    linear in the input. Volume I's concordance table supplies clean occupation
+    titles and the division/sub-division/group/family headers; Volumes II-A and
+    II-B supply the description text that follows each 8-digit code. Memory is
+    bounded by the size of the catalogue, not of the volumes.
+    """
+    
+    def __init__(self):
+        self.records = {}
+        self.level_titles = {level: {} for level in HEADER_LINES}
+        self.bare_family_titles = {}
+        self.current_code = None
+        self.title_open = False  # The last concordance title may continue on the next line
+        self.paused_code = None  # Entry open at the last page break
+        self.in_index = False  # Volume I ends with an alphabetical index, which repeats titles out of order
+    
+    def record(self, code, volume):
+        record = self.records.get(code)
+        if record is None:
+            record = self.records[code] = {
+                "code": code, "title": None, "nco_2004": None, "description": "", "volumes": [],
+            }
+        if volume not in record["volumes"]:
+            record["volumes"].append(volume)
+        return record
+    
+    def append_description(self, code, text):
+        record = self.records[code]
+        if len(record["description"]) < MAX_DESCRIPTION_CHARS:
+            record["description"] = (record["description"] + " " + text).strip()[:MAX_DESCRIPTION_CHARS]
+    
+    def feed_line(self, line, volume):
+        line = line.strip()
+        if INDEX_SECTION.match(line):
+            self.in_index = True
+            self.current_code = None
+        if PAGE_BREAK.match(line):
+            self.paused_code = self.paused_code or self.current_code
+            self.current_code = None
+        if self.in_index or not line or PAGE_FURNITURE.match(line):
+            return
+        paused_code, self.paused_code = self.paused_code, None
+        
+        for level, pattern in HEADER_LINES.items():
+            match = pattern.match(line)
+            if match:
+                self.level_titles[level].setdefault(match.group(1), match.group(2).strip())
+                self.current_code = None
+                self.title_open = False
+                return
+        match = BARE_FAMILY_LINE.match(line)
+        if match:
+            self.bare_family_titles.setdefault(match.group(1), match.group(2).strip())
+            self.current_code = None
+            self.title_open = False
+            return
+        
+        match = CONCORDANCE_LINE.match(line)
+        if match:
+            code, title, old_code = match.groups()
+            record = self.record(code, volume)
+            if record["title"] is None:
+                record["title"] = title.strip()
+                record["nco_2004"] = old_code
+                self.title_open = True
+            self.current_code = code
+            return
+        
+        codes = OCCUPATION_CODE.findall(line)
+        if codes:
+            for code in codes:
+                self.record(code, volume)
+            # Text beside the code is the other column's, so it is not attached to anything
+            self.current_code = codes[-1]
+            self.title_open = False
+            return
+        
+        # A concordance title may run onto the next page of Volume I's single-column table
+        if self.current_code is None and paused_code is not None and \
+                (self.title_open or restates_title(line, self.records[paused_code]["title"])):
+            self.current_code = paused_code
+        if self.current_code is None:
+            return
+        
+        record = self.records[self.current_code]
+        if self.title_open and len(line.split()) <= 6 and not line.endswith("."):
+            record["title"] = f"{record['title']} {line}"
+        else:
+            self.append_description(self.current_code, line)
+        self.title_open = False
+    
+    def feed_file(self, text_file, volume=None):
+        volume = volume or Path(text_file).stem.replace("_extracted", "")
+        with open(text_file, "r", encoding="utf-8") as f:
+            for line in f:
+                self.feed_line(line, volume)
+        self.current_code = None
+        self.title_open = False
+        self.in_index = False
+    
+    def entries(self):
+        """Structured records with hierarchy levels, sorted by code"""
+        family_titles = dict(self.bare_family_titles, **self.level_titles["family"])
+        for code in sorted(self.records):
+            record = dict(self.records[code])
+            family = code[:4]
+            levels = {"division": family[:1], "sub_division": family[:2], "group": family[:3], "family": family}
+            record.update(levels)
+            record["hierarchy"] = {
+                level: {"code": value, "title": (family_titles if level == "family" else self.level_titles[level]).get(value)}
+                for level, value in levels.items()
+            }
+            if not record["title"]:
+                record["title"] = family_titles.get(family) or f"Occupation {code}"
+            yield record
+
+def entry_text(record):
+    """Text that gets embedded for one structured entry"""
+    family_title = record["hierarchy"]["family"]["title"]
+    text = f"NCO-{record['code']}: {record['title']}"
+    if family_title and family_title != record["title"]:
+        text += f" ({family_title})"
+    if record["description"]:
+        text += f". {record['description']}"
+    return text
+
+def parse_all_files(input_folder="data/raw", output_folder="data/interim"):
+    """Parse every *_extracted.txt volume into data/interim/nco_entries.jsonl"""
+    input_folder = Path(input_folder)
+    output_folder = Path(output_folder)
+    output_folder.mkdir(exist_ok=True)
+    
+    parser = NCOCatalogueParser()
+    # Sorted so Volume I's concordance titles are seen before Volume II text
+    for txt_file in sorted(input_folder.glob("*_extracted.txt")):
+        print(f"Parsing {txt_file.name}")
+        parser.feed_file(txt_file)
+    
+    entries_file = output_folder / "nco_entries.jsonl"
+    all_occupations_file = output_folder / "all_occupations.txt"
+    count = 0
+    with open(entries_file, "w", encoding="utf-8") as entries, \
+         open(all_occupations_file, "w", encoding="utf-8") as all_occupations:
+        for record in parser.entries():
+            entries.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+            all_occupations.write(f"Occupation_{count}: {entry_text(record)}\n\n")
+    
+    print(f"\nTotal occupations parsed: {count}")
+    print(f"Structured entries saved to: {entries_file}")
+    print(f"All occupations saved to: {all_occupations_file}")
+    return count
+
 def extract_individual_occupations(text_file):
     """Extract individual occupation entries from NCO text"""
     with open(text_file, 'r', encoding='utf-8') as f:
@@ -100,4 +288,10 @@ def process_all_files():
     return all_occupations
 
 if __name__ == "__main__":
-    process_all_files()
+    arg_parser = argparse.ArgumentParser(description="Extract NCO occupation entries from the extracted volume text")
+    arg_parser.add_argument("--legacy", action="store_true", help="Use the old regex heuristics (capped at 200 per file)")
+    args = arg_parser.parse_args()
+    if args.legacy:
+        process_all_files()
+    else:
+        parse_all_files()
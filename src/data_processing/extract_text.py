@@ -1,12 +1,54 @@
 import pdfplumber
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import argparse
+import hashlib
+import os
+
+PAGE_CACHE_DIR = Path("data/interim/page_cache")
+EXTRACTOR_VERSION = 2  # Bump when extraction settings change, so cached pages are redone
+MARGIN = 0.08  # Header and footer bands, as a fraction of the page height, read across the full width
+GUTTER_SEARCH = (0.3, 0.7)  # Where a column gutter may lie, as fractions of the page width
+MIN_GUTTER = 6  # Points of empty space between two columns
+
+def find_gutter(words, width):
+    """x position of the widest vertical gap near the middle that no word crosses, or None"""
+    lo, hi = width * GUTTER_SEARCH[0], width * GUTTER_SEARCH[1]
+    best, best_width = None, MIN_GUTTER
+    gap_start = lo
+    for x0, x1 in sorted((w["x0"], w["x1"]) for w in words if w["x1"] > lo and w["x0"] < hi) + [(hi, hi)]:
+        if x0 - gap_start >= best_width:
+            best, best_width = (gap_start + x0) / 2, x0 - gap_start
+        gap_start = max(gap_start, x1)
+    if best is None or not any(w["x1"] <= best for w in words) or not any(w["x0"] >= best for w in words):
+        return None  # Text on one side only, a single column
+    return best
+
+def page_text(page):
+    """
+    Text of a page, column by column
+    
+    extract_text() reads a two-column page line by line across both columns,
+    interleaving two occupations' descriptions. When the body has a gutter,
+    each column is read on its own between the full-width header and footer.
+    """
+    top, bottom = page.height * MARGIN, page.height * (1 - MARGIN)
+    body = [w for w in page.extract_words() if w["top"] >= top and w["bottom"] <= bottom]
+    gutter = find_gutter(body, page.width)
+    if gutter is None:
+        return page.extract_text() or ""
+    regions = [(0, 0, page.width, top), (0, top, gutter, bottom), (gutter, top, page.width, bottom),
+               (0, bottom, page.width, page.height)]
+    texts = [page.crop(region).extract_text() for region in regions]
+    return "\n".join(text for text in texts if text)
 
 def extract_text_from_pdf(pdf_path):
     all_text = []
     try:
         with pdfplumber.open(pdf_path) as pdf:
             for i, page in enumerate(pdf.pages):
-                text = page.extract_text()
+                text = page_text(page)
                 if text:
                     all_text.append(text)
                 else:
@@ -16,13 +58,106 @@ def extract_text_from_pdf(pdf_path):
         return None
     return "\n".join(all_text)
 
-def extract_text_from_all_pdfs():
+def file_hash(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def extract_page_range(pdf_path, page_numbers, cache_dir):
+    """Extract a range of pages in a worker, reusing cached page text where present"""
+    cache_dir = Path(cache_dir)
+    results = []
+    pdf = None
+    try:
+        for i in page_numbers:
+            cache_file = cache_dir / f"page_{i + 1:05d}.txt"
+            if cache_file.exists():
+                with open(cache_file, "r", encoding="utf-8") as f:
+                    results.append((i, f.read()))
+                continue
+            
+            if pdf is None:
+                pdf = pdfplumber.open(pdf_path)
+            text = page_text(pdf.pages[i])
+            
+            tmp_file = cache_file.with_suffix(".tmp")
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_file, cache_file)
+            results.append((i, text))
+    finally:
+        if pdf is not None:
+            pdf.close()
+    return results
+
+def extract_text_parallel(pdf_path, output_file, workers=None, pages_per_task=20):
+    """
+    Extract a PDF with page ranges spread over a process pool
+    
+    Page text is streamed to output_file in page order as ranges complete, and
+    cached per page under PAGE_CACHE_DIR keyed by the PDF's hash, so a rerun
+    only extracts pages that are not cached yet.
+    
+    Returns:
+        bool: True if the output was written
+    """
+    pdf_path = Path(pdf_path)
+    output_file = Path(output_file)
+    try:
+        cache_dir = PAGE_CACHE_DIR / f"{file_hash(pdf_path)[:16]}_v{EXTRACTOR_VERSION}"
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        with pdfplumber.open(pdf_path) as pdf:
+            page_count = len(pdf.pages)
+    except Exception as e:
+        print(f"Error extracting text from {pdf_path.name}: {e}")
+        return False
+    
+    page_ranges = [range(start, min(start + pages_per_task, page_count))
+                   for start in range(0, page_count, pages_per_task)]
+    tmp_file = output_file.with_suffix(".tmp")
+    written = 0
+    
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor, open(tmp_file, "w", encoding="utf-8") as out:
+            # map() yields in submission order, so pages are written in order as they complete
+            for results in executor.map(extract_page_range, repeat(pdf_path), page_ranges, repeat(cache_dir)):
+                for i, text in results:
+                    if not text:
+                        print(f"Warning: Page {i+1} in {pdf_path.name} has no extractable text.")
+                        continue
+                    if written:
+                        out.write("\n")
+                    out.write(text)
+                    written += 1
+                print(f"\r{results[-1][0] + 1}/{page_count} pages", end="", flush=True)
+    except Exception as e:
+        print(f"\nError extracting text from {pdf_path.name}: {e}")
+        tmp_file.unlink(missing_ok=True)
+        return False
+    
+    print()
+    if not written:
+        tmp_file.unlink(missing_ok=True)
+        return False
+    os.replace(tmp_file, output_file)
+    return True
+
+def extract_text_from_all_pdfs(parallel=True, workers=None):
     data_folder = Path("data/raw")
     for pdf_file in data_folder.glob("*.pdf"):
         print(f"\nExtracting text from: {pdf_file.name}")
+        output_file = data_folder / (pdf_file.stem + "_extracted.txt")
+        if parallel:
+            if extract_text_parallel(pdf_file, output_file, workers=workers):
+                print(f"Saved extracted text to: {output_file}")
+            else:
+                print(f"Skipped saving for {pdf_file.name} due to extraction error.")
+            continue
+        
         text = extract_text_from_pdf(pdf_file)
         if text:
-            output_file = data_folder / (pdf_file.stem + "_extracted.txt")
             with open(output_file, "w", encoding="utf-8") as f:
                 f.write(text)
             print(f"Saved extracted text to: {output_file}")
@@ -30,4 +165,8 @@ def extract_text_from_all_pdfs():
             print(f"Skipped saving for {pdf_file.name} due to extraction error.")
 
 if __name__ == "__main__":
-    extract_text_from_all_pdfs()
+    parser = argparse.ArgumentParser(description="Extract text from the NCO PDFs in data/raw")
+    parser.add_argument("--sequential", action="store_true", help="Extract pages one after another in this process")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    args = parser.parse_args()
+    extract_text_from_all_pdfs(parallel=not args.sequential, workers=args.workers)
@@ -1,36 +1,108 @@
 import re
+import argparse
 import spacy
+from functools import lru_cache
 from spacy.lang.en.stop_words import STOP_WORDS
 from nltk.stem.porter import PorterStemmer
 from pathlib import Path
 
-# Load spaCy English model and increase max_length limit
-nlp = spacy.load("en_core_web_sm")
-nlp.max_length = 2000000  # Set above your largest file size
+# Pipeline components that tokenization never needs
+UNUSED_COMPONENTS = ["tok2vec", "tagger", "parser", "attribute_ruler", "lemmatizer", "ner", "senter"]
+
+nlp = None
 stemmer = PorterStemmer()
 
-def preprocess_text(text):
+def load_full_pipeline():
+    """Full en_core_web_sm pipeline, loaded on first use by preprocess_text"""
+    global nlp
+    if nlp is None:
+        # Load spaCy English model and increase max_length limit
+        nlp = spacy.load("en_core_web_sm")
+        nlp.max_length = 2000000  # Set above your largest file size
+    return nlp
+
+def load_tokenizer_pipeline():
+    """English tokenizer without the tagger, parser or NER (all we use is is_alpha)"""
+    try:
+        return spacy.load("en_core_web_sm", exclude=UNUSED_COMPONENTS)
+    except OSError:
+        return spacy.blank("en")
+
+@lru_cache(maxsize=None)
+def stem(word):
+    """Porter stem, memoized since the same words repeat throughout a volume"""
+    return stemmer.stem(word)
+
+def clean_text(text):
     # Convert to lowercase
     text = text.lower()
     # Remove extra whitespace/newlines/tabs
     text = re.sub(r'\s+', ' ', text)
     # Remove punctuation
-    text = re.sub(r'[^\w\s]', '', text)
+    return re.sub(r'[^\w\s]', '', text)
+
+def doc_tokens(doc):
+    return [stem(token.text) for token in doc if token.is_alpha and token.text not in STOP_WORDS]
+
+def preprocess_text(text):
     # Tokenize using spaCy
-    doc = nlp(text)
-    tokens = []
-    for token in doc:
-        if token.is_alpha and token.text not in STOP_WORDS:
-            stem = stemmer.stem(token.text)
-            tokens.append(stem)
-    return tokens
-
-def preprocess_nco_files():
+    return doc_tokens(load_full_pipeline()(clean_text(text)))
+
+def read_chunks(txt_file, chunk_size=50000):
+    """Yield cleaned chunks of about chunk_size characters, split on whitespace"""
+    with open(txt_file, "r", encoding="utf-8") as f:
+        carry = ""
+        while True:
+            block = f.read(chunk_size)
+            if not block:
+                break
+            text = carry + block
+            # Keep a trailing partial word for the next chunk
+            cut = max(text.rfind(" "), text.rfind("\n"))
+            if cut <= 0:
+                carry = text
+                continue
+            carry = text[cut:]
+            yield clean_text(text[:cut])
+        if carry.strip():
+            yield clean_text(carry)
+
+def preprocess_file_streaming(txt_file, out_file, n_process=1, batch_size=4, chunk_size=50000):
+    """
+    Tokenize and stem a volume chunk by chunk, writing tokens as they are produced
+    
+    Uses the tokenizer-only pipeline through nlp.pipe, so memory stays bounded
+    by a few chunks regardless of the volume size.
+    
+    Returns:
+        int: Number of tokens written
+    """
+    tokenizer = load_tokenizer_pipeline()
+    written = 0
+    with open(out_file, "w", encoding="utf-8") as f:
+        docs = tokenizer.pipe(read_chunks(txt_file, chunk_size), n_process=n_process, batch_size=batch_size)
+        for doc in docs:
+            tokens = doc_tokens(doc)
+            if not tokens:
+                continue
+            if written:
+                f.write(" ")
+            f.write(" ".join(tokens))
+            written += len(tokens)
+    return written
+
+def preprocess_nco_files(streaming=True, n_process=1, batch_size=4):
     data_folder = Path("data/raw")
     output_folder = Path("data/processed")
     output_folder.mkdir(exist_ok=True)
     for txt_file in data_folder.glob("*_extracted.txt"):
         print(f"Processing {txt_file}")
+        if streaming:
+            out_file = output_folder / (txt_file.stem + "_tokens.txt")
+            count = preprocess_file_streaming(txt_file, out_file, n_process=n_process, batch_size=batch_size)
+            print(f"Saved {count} processed tokens to {out_file}")
+            continue
+        
         with open(txt_file, "r", encoding="utf-8") as f:
             raw_text = f.read()
         tokens = []
@@ -45,4 +117,9 @@ def preprocess_nco_files():
         print(f"Saved processed tokens to {out_file}")
 
 if __name__ == "__main__":
-    preprocess_nco_files()
+    parser = argparse.ArgumentParser(description="Tokenize and stem the extracted NCO text")
+    parser.add_argument("--legacy", action="store_true", help="Run the full spaCy pipeline on whole volumes in memory")
+    parser.add_argument("--n-process", type=int, default=1, help="Processes used by nlp.pipe")
+    parser.add_argument("--batch-size", type=int, default=4, help="Chunks per nlp.pipe batch")
+    args = parser.parse_args()
+    preprocess_nco_files(streaming=not args.legacy, n_process=args.n_process, batch_size=args.batch_size)
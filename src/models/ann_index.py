@@ -0,0 +1,205 @@
+import numpy as np
+from pathlib import Path
+import logging
+import sys
+import os
+
+# Add the project root to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+
+from src.models.scoring import normalize_rows, top_k_indices
+
+try:
+    import faiss
+except ImportError:  # faiss-cpu is optional, we fall back to exact numpy search
+    faiss = None
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("exact", "ivf", "hnsw")
+
+DEFAULT_INDEX_PARAMS = {
+    "exact": {},
+    "ivf": {"nlist": None, "nprobe": 8},
+    "hnsw": {"m": 32, "ef_construction": 200, "ef_search": 64},
+}
+
+
+def index_path(embeddings_file, index_type):
+    """Index file stored next to the embeddings, e.g. occupation_index_hnsw.faiss"""
+    embeddings_file = Path(embeddings_file)
+    prefix = embeddings_file.stem.replace("_embeddings", "")
+    return embeddings_file.with_name(f"{prefix}_index_{index_type}.faiss")
+
+
+class NumpyExactIndex:
+    """Brute-force inner-product search, used when faiss is not installed"""
+
+    index_type = "exact"
+
+    def __init__(self, embeddings):
+        self.embeddings = normalize_rows(embeddings)
+
+    @property
+    def ntotal(self):
+        return self.embeddings.shape[0]
+
+    def set_params(self, **params):
+        pass
+
+    def search(self, queries, k):
+        queries = normalize_rows(queries)
+        k = min(k, self.ntotal)
+        scores = queries @ self.embeddings.T
+        top = np.array([top_k_indices(row, k) for row in scores])
+        return np.take_along_axis(scores, top, axis=1), top
+
+
+class FaissIndex:
+    """Thin wrapper around a faiss inner-product index over normalized vectors"""
+
+    def __init__(self, index, index_type):
+        self.index = index
+        self.index_type = index_type
+
+    @property
+    def ntotal(self):
+        return self.index.ntotal
+
+    def set_params(self, nprobe=None, ef_search=None, **params):
+        if nprobe is not None and self.index_type == "ivf":
+            self.index.nprobe = nprobe
+        if ef_search is not None and self.index_type == "hnsw":
+            self.index.hnsw.efSearch = ef_search
+
+    def search(self, queries, k):
+        queries = normalize_rows(queries)
+        k = min(k, self.ntotal)
+        return self.index.search(queries, k)
+
+    def save(self, path):
+        faiss.write_index(self.index, str(path))
+
+
+def build_index(embeddings, index_type="exact", **params):
+    """
+    Build a search index over the embeddings
+
+    Args:
+        embeddings (np.ndarray): Corpus vectors, normalized here before indexing
+        index_type (str): One of "exact", "ivf" or "hnsw"
+        **params: Overrides for DEFAULT_INDEX_PARAMS
+
+    Returns:
+        FaissIndex, or NumpyExactIndex when faiss is not installed
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+
+    settings = dict(DEFAULT_INDEX_PARAMS[index_type])
+    settings.update(params)
+
+    if faiss is None:
+        if index_type != "exact":
+            logger.warning("faiss is not installed, using exact search instead of %s", index_type)
+        return NumpyExactIndex(embeddings)
+
+    vectors = normalize_rows(embeddings)
+    n, dim = vectors.shape
+
+    if index_type == "exact":
+        index = faiss.IndexFlatIP(dim)
+    elif index_type == "ivf":
+        # Rule of thumb: ~4*sqrt(n) lists, with enough points per list to train
+        nlist = settings["nlist"] or int(4 * np.sqrt(n))
+        nlist = max(1, min(nlist, n // 39 or 1))
+        quantizer = faiss.IndexFlatIP(dim)
+        index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors)
+    else:
+        index = faiss.IndexHNSWFlat(dim, settings["m"], faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = settings["ef_construction"]
+
+    index.add(vectors)
+    wrapped = FaissIndex(index, index_type)
+    wrapped.set_params(**settings)
+    return wrapped
+
+
+def load_index(embeddings, index_type="exact", index_file=None, **params):
+    """
+    Load a saved index, or build one in memory if the file is missing
+
+    Falls back to exact numpy search when faiss is not installed.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+
+    if faiss is None:
+        return build_index(embeddings, index_type, **params)
+
+    if index_file is not None and Path(index_file).exists():
+        index = faiss.read_index(str(index_file))
+        if index.ntotal != len(embeddings):
+            raise ValueError(
+                f"Index {index_file} has {index.ntotal} vectors but embeddings have "
+                f"{len(embeddings)} rows, rebuild it with create_occupation_embeddings.py"
+            )
+        settings = dict(DEFAULT_INDEX_PARAMS[index_type])
+        settings.update(params)
+        wrapped = FaissIndex(index, index_type)
+        wrapped.set_params(**settings)
+        return wrapped
+
+    if index_type != "exact":
+        logger.warning("No saved %s index found, building it in memory...", index_type)
+    return build_index(embeddings, index_type, **params)
+
+
+def recall_at_k(index, exact_index, queries, k=10):
+    """Fraction of the exact top-k neighbours that the index also returns"""
+    _, exact_ids = exact_index.search(queries, k)
+    _, approx_ids = index.search(queries, k)
+    hits = 0
+    for exact_row, approx_row in zip(exact_ids, approx_ids):
+        hits += len(set(exact_row) & set(approx_row[approx_row >= 0]))
+    return hits / exact_ids.size
+
+
+def evaluate_index_params(embeddings, queries, k=10):
+    """Log recall@k for a sweep of IVF nprobe and HNSW efSearch values"""
+    exact = build_index(embeddings, "exact")
+    results = []
+
+    if faiss is None:
+        logger.warning("faiss is not installed, only exact search is available")
+        return results
+
+    ivf = build_index(embeddings, "ivf")
+    for nprobe in (1, 2, 4, 8, 16, 32):
+        ivf.set_params(nprobe=nprobe)
+        results.append(("ivf", f"nprobe={nprobe}", recall_at_k(ivf, exact, queries, k)))
+
+    hnsw = build_index(embeddings, "hnsw")
+    for ef_search in (16, 32, 64, 128, 256):
+        hnsw.set_params(ef_search=ef_search)
+        results.append(("hnsw", f"ef_search={ef_search}", recall_at_k(hnsw, exact, queries, k)))
+
+    logger.info("Recall@%d against exact search (%d queries)", k, len(queries))
+    logger.info("-" * 40)
+    for index_type, setting, recall in results:
+        logger.info("%-5s %-15s %.3f", index_type, setting, recall)
+    return results
+
+
+if __name__ == "__main__":
+    from src.models.embedding_store import load_store
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    embeddings, _, _ = load_store("data/processed/occupation_embeddings", mmap=False)
+
+    # Use a sample of catalogue rows, nudged off their exact positions, as queries
+    rng = np.random.default_rng(0)
+    sample = rng.choice(len(embeddings), size=min(200, len(embeddings)), replace=False)
+    queries = embeddings[sample] + rng.normal(0, 0.02, size=embeddings[sample].shape).astype(np.float32)
+    evaluate_index_params(embeddings, queries, k=10)
@@ -0,0 +1,281 @@
+"""
+Reproducible benchmark of the search engines against a labelled query set
+
+Every engine configuration runs in a fresh process (so peak RSS is its own)
+and reports model load time, single-query latency percentiles, batch
+throughput, peak RSS, and recall@1/5/10 and MRR against the expected NCO
+codes in data/benchmark/labelled_queries.jsonl. An expected code may be a
+family prefix ("2512") or a full code ("2512.0501").
+
+Results are written as JSON. With --baseline, the run is compared with an
+earlier results file and exits non-zero on a latency or recall regression.
+
+Example:
+    python src/models/benchmark.py --configs enhanced enhanced-int8 --output bench.json
+    python src/models/benchmark.py --baseline bench.json --output bench-new.json
+"""
+import argparse
+import contextlib
+import hashlib
+import importlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+# Add the project root to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+
+QUERY_SET = "data/benchmark/labelled_queries.jsonl"
+RECALL_KS = (1, 5, 10)
+
+# name -> (module, class, constructor kwargs)
+ENGINE_CONFIGS = {
+    "semantic": ("src.models.semantic_search", "NCOSemanticSearch", {}),
+    "occupation": ("src.models.occupation_search", "NCOOccupationSearch", {}),
+    "enhanced": ("src.models.enhanced_search", "EnhancedNCOSearch", {}),
+    "enhanced-ivf": ("src.models.enhanced_search", "EnhancedNCOSearch", {"index_type": "ivf"}),
+    "enhanced-hnsw": ("src.models.enhanced_search", "EnhancedNCOSearch", {"index_type": "hnsw"}),
+    "enhanced-hybrid": ("src.models.enhanced_search", "EnhancedNCOSearch", {"retrieval": "hybrid"}),
+    "enhanced-prefilter": ("src.models.enhanced_search", "EnhancedNCOSearch",
+                           {"retrieval": "hybrid", "prefilter_size": 300}),
+    "enhanced-tree": ("src.models.enhanced_search", "EnhancedNCOSearch", {"hierarchical": True}),
+    "enhanced-float16": ("src.models.enhanced_search", "EnhancedNCOSearch", {"precision": "float16"}),
+    "enhanced-int8": ("src.models.enhanced_search", "EnhancedNCOSearch", {"precision": "int8"}),
+}
+DEFAULT_CONFIGS = ["occupation", "enhanced", "enhanced-hnsw", "enhanced-hybrid", "enhanced-int8"]
+
+
+def load_query_set(path=QUERY_SET):
+    """Labelled queries as a list of {"query": str, "codes": [expected code or prefix, ...]}"""
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def file_sha256(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def latency_summary(latencies_ms):
+    """p50/p95/p99, mean and max of a list of latencies in milliseconds"""
+    latencies = np.asarray(latencies_ms, dtype=np.float64)
+    if not len(latencies):
+        return {"count": 0}
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "count": int(len(latencies)),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "mean_ms": round(float(latencies.mean()), 3),
+        "max_ms": round(float(latencies.max()), 3),
+    }
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process (ru_maxrss is KB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def result_code(result):
+    """NCO code of a search result, or None for engines that do not return occupations"""
+    from src.models.enhanced_search import extract_nco_code
+
+    if result.get("code"):
+        return result["code"]
+    if "full_occupation" in result:
+        return extract_nco_code(result["full_occupation"])
+    return None
+
+
+def retrieval_metrics(ranked_codes, labelled):
+    """
+    recall@k and MRR@10 over the query set
+
+    A query counts as found at the first rank whose code starts with any of
+    its expected codes.
+    """
+    first_hits = []
+    for codes, item in zip(ranked_codes, labelled):
+        rank = next((i for i, code in enumerate(codes, 1)
+                     if code and any(code.startswith(expected) for expected in item["codes"])), None)
+        first_hits.append(rank)
+
+    metrics = {f"recall@{k}": round(sum(1 for r in first_hits if r and r <= k) / len(labelled), 4)
+               for k in RECALL_KS}
+    metrics["mrr"] = round(sum(1.0 / r for r in first_hits if r and r <= max(RECALL_KS)) / len(labelled), 4)
+    metrics["missed"] = [item["query"] for item, r in zip(labelled, first_hits) if not r]
+    return metrics
+
+
+def run_config(name, labelled, repeats=3, warmup=5, batch_repeats=5):
+    """Load one engine configuration and measure it, in the current process"""
+    module_name, class_name, kwargs = ENGINE_CONFIGS[name]
+    engine_class = getattr(importlib.import_module(module_name), class_name)
+    queries = [item["query"] for item in labelled]
+    quiet = contextlib.redirect_stdout(io.StringIO())
+
+    start_time = time.perf_counter()
+    with quiet:
+        engine = engine_class(**kwargs)
+    load_seconds = time.perf_counter() - start_time
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for query in queries[:warmup]:
+            engine.search(query, top_k=max(RECALL_KS))
+
+        latencies = []
+        ranked = []
+        for repeat in range(repeats):
+            for query in queries:
+                start_time = time.perf_counter()
+                results = engine.search(query, top_k=max(RECALL_KS))
+                latencies.append((time.perf_counter() - start_time) * 1000)
+                if repeat == 0:
+                    ranked.append([result_code(result) for result in results])
+
+        # Batch throughput, through search_batch where the engine has it
+        batch = queries * batch_repeats
+        start_time = time.perf_counter()
+        if hasattr(engine, "search_batch"):
+            engine.search_batch(batch, top_k=max(RECALL_KS))
+        else:
+            for query in batch:
+                engine.search(query, top_k=max(RECALL_KS))
+        batch_seconds = time.perf_counter() - start_time
+
+    has_codes = any(code for codes in ranked for code in codes)
+    report = {
+        "engine": class_name,
+        "params": kwargs,
+        "load_seconds": round(load_seconds, 3),
+        "latency": latency_summary(latencies),
+        "throughput_qps": round(len(batch) / batch_seconds, 2) if batch_seconds > 0 else None,
+        "batched": hasattr(engine, "search_batch"),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    report.update(retrieval_metrics(ranked, labelled) if has_codes else
+                  {f"recall@{k}": None for k in RECALL_KS})
+    return report
+
+
+def run_isolated(name, labelled, **options):
+    """run_config in a fresh spawned process, so imports and peak RSS are not shared"""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(run_config, name, labelled, **options).result()
+
+
+def run_benchmark(configs=None, query_set=QUERY_SET, isolate=True, **options):
+    """Benchmark each configuration and return the full report"""
+    labelled = load_query_set(query_set)
+    report = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "query_set": {"path": str(query_set), "sha256": file_sha256(query_set), "queries": len(labelled)},
+        "options": options,
+        "results": {},
+    }
+
+    for name in configs or DEFAULT_CONFIGS:
+        print(f"Benchmarking {name}...")
+        try:
+            if isolate:
+                result = run_isolated(name, labelled, **options)
+            else:
+                result = run_config(name, labelled, **options)
+        except Exception as e:
+            print(f"  {name} failed: {e}")
+            result = {"error": str(e)}
+        report["results"][name] = result
+        if "error" not in result:
+            print(f"  load {result['load_seconds']}s, p50 {result['latency']['p50_ms']} ms, "
+                  f"p99 {result['latency']['p99_ms']} ms, {result['throughput_qps']} q/s, "
+                  f"{result['peak_rss_mb']} MB, recall@10 {result['recall@10']}, MRR {result.get('mrr')}")
+    return report
+
+
+def compare_reports(baseline, current, latency_tolerance=0.25, recall_tolerance=0.01):
+    """
+    Regressions of current against baseline, for configurations present in both
+
+    A regression is a p95 latency more than latency_tolerance (relative) above
+    the baseline, a throughput that much below it, or any recall@k or MRR more
+    than recall_tolerance (absolute) below it.
+
+    Returns:
+        list: Human-readable descriptions, empty when nothing regressed
+    """
+    if baseline.get("query_set", {}).get("sha256") != current.get("query_set", {}).get("sha256"):
+        print("Warning: the query sets differ, recall is not comparable between these runs")
+
+    failures = []
+    for name, result in current["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if not old or "error" in old:
+            continue
+        if "error" in result:
+            failures.append(f"{name}: failed ({result['error']})")
+            continue
+
+        old_p95, new_p95 = old["latency"]["p95_ms"], result["latency"]["p95_ms"]
+        if new_p95 > old_p95 * (1 + latency_tolerance):
+            failures.append(f"{name}: p95 latency {old_p95} -> {new_p95} ms")
+        if old["throughput_qps"] and result["throughput_qps"] is not None \
+                and result["throughput_qps"] < old["throughput_qps"] * (1 - latency_tolerance):
+            failures.append(f"{name}: throughput {old['throughput_qps']} -> {result['throughput_qps']} q/s")
+        for metric in [f"recall@{k}" for k in RECALL_KS] + ["mrr"]:
+            if old.get(metric) is not None and result.get(metric) is not None \
+                    and result[metric] < old[metric] - recall_tolerance:
+                failures.append(f"{name}: {metric} {old[metric]} -> {result[metric]}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the NCO search engines")
+    parser.add_argument("--configs", nargs="+", choices=sorted(ENGINE_CONFIGS), default=None,
+                        help=f"Engine configurations to run (default: {' '.join(DEFAULT_CONFIGS)})")
+    parser.add_argument("--query-set", default=QUERY_SET)
+    parser.add_argument("--repeats", type=int, default=3, help="Timed passes over the query set")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", default=None, help="Earlier results file to check for regressions")
+    parser.add_argument("--latency-tolerance", type=float, default=0.25,
+                        help="Allowed relative p95 latency increase / throughput drop")
+    parser.add_argument("--recall-tolerance", type=float, default=0.01, help="Allowed absolute recall/MRR drop")
+    parser.add_argument("--in-process", action="store_true",
+                        help="Run every configuration in this process (peak RSS is then cumulative)")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.configs, args.query_set, isolate=not args.in_process, repeats=args.repeats)
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        failures = compare_reports(baseline, report, args.latency_tolerance, args.recall_tolerance)
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        if failures:
+            sys.exit(1)
+        print("No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""
+Offline bulk assignment of NCO codes to free-text job descriptions
+
+Streams a CSV or JSONL file in chunks, classifies the chunks in a pool of
+worker processes (each holding one EnhancedNCOSearch), and appends the top-k
+codes and scores to the output as chunks complete. A checkpoint next to the
+output records how far the run got in both files and with which settings, so
+rerunning the same command after an interruption seeks past the rows already
+done and resumes where it stopped.
+
+Example:
+    python src/models/bulk_classify.py survey.csv coded.jsonl --text-column occupation_text --workers 8
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from itertools import islice
+from pathlib import Path
+
+# Add the project root to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+
+_engine = None
+
+
+def _init_worker(engine_kwargs, threads_per_worker):
+    """Load one search engine per worker process"""
+    global _engine
+    try:
+        import torch
+        torch.set_num_threads(threads_per_worker)
+    except ImportError:
+        pass
+
+    from src.models.enhanced_search import EnhancedNCOSearch
+    _engine = EnhancedNCOSearch(**engine_kwargs)
+
+
+def _classify_chunk(chunk, top_k):
+    """Classify one chunk of (id, text) rows, returning output records in the same order"""
+    texts = [text for _, text in chunk if text.strip()]
+    batch_results = iter(_engine.search_batch(texts, top_k=top_k))
+
+    records = []
+    for row_id, text in chunk:
+        results = next(batch_results) if text.strip() else []
+        records.append({
+            "id": row_id,
+            "text": text,
+            "matches": [
+                {
+                    "code": result["code"],
+                    "occupation": result["full_occupation"],
+                    "confidence": round(result["confidence"], 4),
+                }
+                for result in results
+            ],
+        })
+    return records
+
+
+class _LineReader:
+    """Decoded lines of a binary file, keeping the byte offset just past the last line read"""
+
+    def __init__(self, file):
+        self.file = file
+        self.offset = file.tell()
+
+    def __iter__(self):
+        for line in self.file:
+            self.offset += len(line)
+            yield line.decode("utf-8")
+
+
+def read_rows(input_file, text_column, id_column=None, start_offset=0, start_row=0):
+    """
+    Yield (id, text, end offset) for every row of a CSV or JSONL file, without reading it all
+
+    The end offset is the input byte position just past the row, so a later
+    run can pass it back as start_offset (with start_row rows already done)
+    to continue from the next row without re-parsing the ones before it.
+    """
+    input_file = Path(input_file)
+    with open(input_file, "rb") as f:
+        lines = _LineReader(f)
+        if input_file.suffix.lower() == ".csv":
+            reader = csv.reader(lines)
+            header = next(reader, None)
+            if start_offset:
+                f.seek(start_offset)
+                lines.offset = start_offset
+            rows = (dict(zip(header, values)) for values in reader)
+        else:
+            f.seek(start_offset)
+            lines.offset = start_offset
+            rows = (json.loads(line) for line in lines if line.strip())
+
+        for row_number, row in enumerate(rows, start_row):
+            row_id = row.get(id_column, row_number) if id_column else row_number
+            yield row_id, str(row.get(text_column) or ""), lines.offset
+
+
+def chunked(rows, chunk_size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def output_columns(output_file, top_k):
+    """Columns of the output, the CSV header or the keys of each JSONL record"""
+    if Path(output_file).suffix.lower() != ".csv":
+        return ["id", "text", "matches"]
+    header = ["id", "text"]
+    for rank in range(1, top_k + 1):
+        header += [f"code_{rank}", f"confidence_{rank}", f"occupation_{rank}"]
+    return header
+
+
+class OutputWriter:
+    """Appends records as JSONL, or as a wide CSV with code_N/confidence_N columns"""
+
+    def __init__(self, output_file, top_k, append):
+        self.output_file = Path(output_file)
+        self.top_k = top_k
+        self.is_csv = self.output_file.suffix.lower() == ".csv"
+        self.file = open(self.output_file, "a" if append else "w", encoding="utf-8", newline="")
+
+        if self.is_csv:
+            self.writer = csv.writer(self.file)
+            if not append:
+                self.writer.writerow(output_columns(output_file, top_k))
+
+    def write(self, records):
+        for record in records:
+            if self.is_csv:
+                row = [record["id"], record["text"]]
+                for rank in range(self.top_k):
+                    if rank < len(record["matches"]):
+                        match = record["matches"][rank]
+                        row += [match["code"] or "", match["confidence"], match["occupation"]]
+                    else:
+                        row += ["", "", ""]
+                self.writer.writerow(row)
+            else:
+                self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def sync(self):
+        """Make everything written so far durable, returning the output size"""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+def checkpoint_path(output_file):
+    return Path(str(output_file) + ".checkpoint.json")
+
+
+def run_params(output_file, text_column, id_column, top_k):
+    """Settings that shape the output, a checkpoint only resumes a run with the same ones"""
+    return {
+        "text_column": text_column,
+        "id_column": id_column,
+        "top_k": top_k,
+        "columns": output_columns(output_file, top_k),
+    }
+
+
+def load_checkpoint(input_file, output_file, params):
+    """Progress of an earlier run of the same job, truncating any partial tail"""
+    path = checkpoint_path(output_file)
+    if not path.exists() or not Path(output_file).exists():
+        return None
+
+    with open(path, "r", encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    if checkpoint["input"] != str(Path(input_file).resolve()):
+        raise ValueError(f"{path} belongs to a run over {checkpoint['input']}, use --restart to overwrite it")
+    if checkpoint.get("params") != params or "input_bytes" not in checkpoint:
+        raise ValueError(f"{path} belongs to a run with {checkpoint.get('params')}, not {params}, "
+                         "use --restart to overwrite it")
+
+    # Anything written after the last checkpoint is redone, so drop it
+    with open(output_file, "r+b") as f:
+        f.truncate(checkpoint["output_bytes"])
+    return checkpoint
+
+
+def save_checkpoint(input_file, output_file, params, rows_done, input_bytes, output_bytes):
+    path = checkpoint_path(output_file)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "input": str(Path(input_file).resolve()),
+            "params": params,
+            "rows_done": rows_done,
+            "input_bytes": input_bytes,
+            "output_bytes": output_bytes,
+            "updated": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }, f)
+    os.replace(tmp_path, path)
+
+
+def bulk_classify(input_file, output_file, text_column="description", id_column=None, top_k=5,
+                  workers=None, chunk_size=512, restart=False, engine_kwargs=None, checkpoint_interval=10.0):
+    """
+    Classify every row of input_file and write the matches to output_file
+
+    At most two chunks per worker are in flight at any time, so memory use
+    does not depend on the size of the input. The output is fsynced and the
+    checkpoint saved at most every checkpoint_interval seconds, and once at the end.
+    """
+    workers = workers or os.cpu_count() or 1
+    threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+
+    params = run_params(output_file, text_column, id_column, top_k)
+    checkpoint = None if restart else load_checkpoint(input_file, output_file, params)
+    rows_done = checkpoint["rows_done"] if checkpoint else 0
+    input_bytes = checkpoint["input_bytes"] if checkpoint else 0
+    if checkpoint:
+        print(f"Resuming after {rows_done} rows")
+
+    rows = read_rows(input_file, text_column, id_column, start_offset=input_bytes, start_row=rows_done)
+    writer = OutputWriter(output_file, top_k, append=checkpoint is not None)
+    start_time = last_checkpoint = time.time()
+    processed = 0
+
+    with multiprocessing.Pool(workers, initializer=_init_worker,
+                              initargs=(engine_kwargs or {}, threads_per_worker)) as pool:
+        pending = deque()
+        chunks = chunked(rows, chunk_size)
+        try:
+            for chunk in chunks:
+                result = pool.apply_async(_classify_chunk, ([(row_id, text) for row_id, text, _ in chunk], top_k))
+                pending.append((len(chunk), chunk[-1][2], result))
+                if len(pending) < 2 * workers:
+                    continue
+                size, input_bytes = _write_next(pending, writer)
+                processed += size
+                if time.time() - last_checkpoint >= checkpoint_interval:
+                    save_checkpoint(input_file, output_file, params, rows_done + processed, input_bytes, writer.sync())
+                    last_checkpoint = time.time()
+                _report_progress(rows_done + processed, processed, start_time)
+
+            while pending:
+                size, input_bytes = _write_next(pending, writer)
+                processed += size
+                _report_progress(rows_done + processed, processed, start_time)
+            save_checkpoint(input_file, output_file, params, rows_done + processed, input_bytes, writer.sync())
+        finally:
+            writer.close()
+
+    print(f"\nClassified {processed} rows ({rows_done + processed} total) into {output_file}")
+    return rows_done + processed
+
+
+def _write_next(pending, writer):
+    """Wait for the oldest chunk and write it, returning its size and input end offset"""
+    size, input_bytes, result = pending.popleft()
+    writer.write(result.get())
+    return size, input_bytes
+
+
+def _report_progress(total_rows, processed, start_time):
+    elapsed = time.time() - start_time
+    rate = processed / elapsed if elapsed > 0 else 0.0
+    print(f"\r{total_rows} rows done ({rate:.1f} rows/s)", end="", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Assign NCO codes to job descriptions in a CSV or JSONL file")
+    parser.add_argument("input", help="CSV or JSONL file with one job description per row")
+    parser.add_argument("output", help="Output file, .csv for wide CSV, anything else for JSONL")
+    parser.add_argument("--text-column", default="description", help="Column/key holding the job description")
+    parser.add_argument("--id-column", default=None, help="Column/key copied to the output as the row id")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=512, help="Rows per task sent to a worker")
+    parser.add_argument("--index-type", default="exact", choices=["exact", "ivf", "hnsw"])
+    parser.add_argument("--restart", action="store_true", help="Ignore any checkpoint and start over")
+    parser.add_argument("--checkpoint-interval", type=float, default=10.0,
+                        help="Seconds between fsyncs of the output and checkpoint saves")
+    args = parser.parse_args()
+
+    bulk_classify(args.input, args.output, text_column=args.text_column, id_column=args.id_column,
+                  top_k=args.top_k, workers=args.workers, chunk_size=args.chunk_size,
+                  restart=args.restart, engine_kwargs={"index_type": args.index_type},
+                  checkpoint_interval=args.checkpoint_interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+import hashlib
+import json
+import os
+import pickle
+from pathlib import Path
+
+import numpy as np
+
+STORE_VERSION = 1
+
+
+class EmbeddingStoreError(ValueError):
+    """Raised when a stored embedding matrix does not match what the caller expects"""
+
+
+def store_paths(path):
+    """
+    Files that make up one embedding store
+
+    Accepts the base path with or without a suffix, so
+    "data/processed/occupation_embeddings.npy" and
+    "data/processed/occupation_embeddings" name the same store.
+    """
+    path = Path(path)
+    base = path.with_suffix("") if path.suffix in (".npy", ".pkl", ".json") else path
+    return {
+        "matrix": base.with_suffix(".npy"),
+        "sidecar": base.with_suffix(".meta.json"),
+        "manifest": base.with_suffix(".manifest.json"),
+    }
+
+
+def content_hash(*files, block_size=1 << 20):
+    """SHA-256 over the given files, read in blocks so large matrices are not loaded"""
+    digest = hashlib.sha256()
+    for file in files:
+        with open(file, "rb") as f:
+            for block in iter(lambda: f.read(block_size), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def _atomic_write(path, write):
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def save_store(path, embeddings, metadata, model_name, normalize=True):
+    """
+    Save embeddings as a raw float32 .npy matrix with a JSON sidecar and manifest
+
+    Args:
+        path (str): Base path of the store, e.g. "data/processed/occupation_embeddings"
+        embeddings (np.ndarray): One row per item
+        metadata (dict): Row-aligned lists (e.g. {"occupations": [...]}) plus any extras
+        model_name (str): Encoder that produced the embeddings
+        normalize (bool): L2-normalize rows before saving
+
+    Returns:
+        dict: The manifest that was written
+    """
+    paths = store_paths(path)
+    paths["matrix"].parent.mkdir(parents=True, exist_ok=True)
+
+    matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+    if normalize:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix = matrix / norms
+
+    _atomic_write(paths["matrix"], lambda f: np.save(f, matrix))
+    return _write_sidecar_and_manifest(paths, matrix.shape, metadata, model_name, normalize)
+
+
+def _write_sidecar_and_manifest(paths, shape, metadata, model_name, normalized):
+    sidecar = json.dumps(metadata, ensure_ascii=False).encode("utf-8")
+    _atomic_write(paths["sidecar"], lambda f: f.write(sidecar))
+
+    # The manifest goes last, so a store without one is known to be incomplete
+    manifest = {
+        "format_version": STORE_VERSION,
+        "model_name": model_name,
+        "dimension": int(shape[1]) if len(shape) == 2 else 0,
+        "rows": int(shape[0]),
+        "dtype": "float32",
+        "normalized": bool(normalized),
+        "content_hash": content_hash(paths["matrix"], paths["sidecar"]),
+    }
+    manifest_bytes = json.dumps(manifest, indent=2).encode("utf-8")
+    _atomic_write(paths["manifest"], lambda f: f.write(manifest_bytes))
+    return manifest
+
+
+def open_store_matrix(path, rows, dimension):
+    """
+    Writable memory-mapped matrix for a store filled in blocks, e.g. straight from encoder batches
+
+    The rows live in a temporary file until commit_store, so memory stays at
+    one block however large the store is and readers never see a partial matrix.
+    """
+    paths = store_paths(path)
+    paths["matrix"].parent.mkdir(parents=True, exist_ok=True)
+    return np.lib.format.open_memmap(_pending_matrix(paths), mode="w+", dtype=np.float32, shape=(rows, dimension))
+
+
+def _pending_matrix(paths):
+    return paths["matrix"].with_name(paths["matrix"].name + ".tmp")
+
+
+def commit_store(path, shape, metadata, model_name, normalized=True):
+    """
+    Publish the matrix written through open_store_matrix with its sidecar and manifest
+
+    Flush and drop the memmap first (Windows cannot replace a mapped file).
+    Rows are stored as written, normalized says whether the caller already
+    L2-normalized them.
+
+    Returns:
+        dict: The manifest that was written
+    """
+    paths = store_paths(path)
+    os.replace(_pending_matrix(paths), paths["matrix"])
+    return _write_sidecar_and_manifest(paths, shape, metadata, model_name, normalized)
+
+
+def load_store(path, model_name=None, dimension=None, mmap=True, verify_hash=False):
+    """
+    Open an embedding store and check it against the configured encoder
+
+    Args:
+        path (str): Base path of the store
+        model_name (str): Expected encoder name, skipped if None
+        dimension (int): Expected embedding size, skipped if None
+        mmap (bool): Memory-map the matrix read-only instead of reading it into the heap
+        verify_hash (bool): Re-hash the files and compare with the manifest
+
+    Returns:
+        tuple: (embeddings, metadata, manifest)
+    """
+    paths = store_paths(path)
+    if not paths["manifest"].exists():
+        raise FileNotFoundError(
+            f"No embedding store manifest at {paths['manifest']}, "
+            "rebuild the embeddings or convert a legacy pickle with embedding_store.py"
+        )
+
+    with open(paths["manifest"], "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    if manifest.get("format_version") != STORE_VERSION:
+        raise EmbeddingStoreError(
+            f"{paths['manifest']} has format version {manifest.get('format_version')}, "
+            f"expected {STORE_VERSION}"
+        )
+    if model_name is not None and manifest["model_name"] != model_name:
+        raise EmbeddingStoreError(
+            f"{paths['matrix']} was built with {manifest['model_name']} "
+            f"but the search engine encodes queries with {model_name}"
+        )
+    if dimension is not None and manifest["dimension"] != dimension:
+        raise EmbeddingStoreError(
+            f"{paths['matrix']} has {manifest['dimension']}-dim vectors "
+            f"but the encoder produces {dimension}-dim vectors"
+        )
+    if verify_hash and content_hash(paths["matrix"], paths["sidecar"]) != manifest["content_hash"]:
+        raise EmbeddingStoreError(f"Content hash mismatch for {paths['matrix']}, the store is corrupt or stale")
+
+    embeddings = np.load(paths["matrix"], mmap_mode="r" if mmap else None)
+    if embeddings.shape[0] != manifest["rows"]:
+        raise EmbeddingStoreError(
+            f"{paths['matrix']} has {embeddings.shape[0]} rows, manifest says {manifest['rows']}"
+        )
+
+    with open(paths["sidecar"], "r", encoding="utf-8") as f:
+        metadata = json.load(f)
+
+    return embeddings, metadata, manifest
+
+
+def load_embeddings(path, model_name=None, dimension=None, mmap=True):
+    """
+    Load an embedding store, or a legacy pickle when given a .pkl path
+
+    Legacy pickles carry no manifest, so only the dimension can be checked.
+    """
+    path = Path(path)
+    if path.suffix != ".pkl":
+        return load_store(path, model_name, dimension, mmap=mmap)
+
+    print(f"Warning: loading legacy pickle {path}, convert it with embedding_store.py")
+    with open(path, "rb") as f:
+        data = pickle.load(f)
+    embeddings = np.asarray(data.pop("embeddings"), dtype=np.float32)
+    if dimension is not None and embeddings.shape[1] != dimension:
+        raise EmbeddingStoreError(
+            f"{path} has {embeddings.shape[1]}-dim vectors but the encoder produces {dimension}-dim vectors"
+        )
+    return embeddings, data, None
+
+
+def convert_pickle(pkl_path, model_name):
+    """Convert a legacy {"embeddings": ..., <lists>} pickle into an embedding store"""
+    pkl_path = Path(pkl_path)
+    with open(pkl_path, "rb") as f:
+        data = pickle.load(f)
+    embeddings = data.pop("embeddings")
+    manifest = save_store(pkl_path.with_suffix(""), embeddings, data, model_name)
+    print(f"Converted {pkl_path} -> {store_paths(pkl_path)['matrix']} "
+          f"({manifest['rows']} x {manifest['dimension']}, {model_name})")
+    return manifest
+
+
+if __name__ == "__main__":
+    # One-off migration of the pickles written by earlier versions of the pipeline
+    legacy_pickles = {
+        "data/processed/occupation_embeddings.pkl": "all-mpnet-base-v2",
+        "data/processed/nco_embeddings.pkl": "all-MiniLM-L6-v2",
+    }
+    for pkl_file, model_name in legacy_pickles.items():
+        if Path(pkl_file).exists():
+            convert_pickle(pkl_file, model_name)
+        else:
+            print(f"{pkl_file} not found, nothing to convert")
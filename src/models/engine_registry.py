@@ -0,0 +1,188 @@
+"""
+Named search engines sharing encoder models, with background reloads
+
+Every engine built through the registry gets its encoder from one
+process-wide table keyed by (model name, backend), so two engines on the
+same model hold one copy of it. Engines are looked up by name on every
+request; reload() builds a replacement in a background thread and swaps it
+in with a single assignment, so requests already running finish on the old
+engine and new ones get the new engine, without any lock on the search path.
+"""
+import importlib
+import inspect
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+# Add the project root to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+
+from src.models.embedding_store import store_paths
+from src.models.onnx_encoder import load_encoder
+
+logger = logging.getLogger(__name__)
+
+# kind -> (module, class)
+ENGINE_KINDS = {
+    "enhanced": ("src.models.enhanced_search", "EnhancedNCOSearch"),
+    "occupation": ("src.models.occupation_search", "NCOOccupationSearch"),
+    "semantic": ("src.models.semantic_search", "NCOSemanticSearch"),
+}
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_model(model_name, backend="torch"):
+    """Encoder for model_name, loaded once per process and backend"""
+    key = (model_name, backend)
+    with _models_lock:
+        if key not in _models:
+            logger.info("Loading encoder %s (%s)", model_name, backend)
+            _models[key] = load_encoder(model_name, backend)
+        return _models[key]
+
+
+def engine_defaults(kind):
+    """Constructor defaults of an engine kind, e.g. its embeddings_file and model_name"""
+    module_name, class_name = ENGINE_KINDS[kind]
+    engine_class = getattr(importlib.import_module(module_name), class_name)
+    return engine_class, {
+        name: parameter.default
+        for name, parameter in inspect.signature(engine_class.__init__).parameters.items()
+        if parameter.default is not inspect.Parameter.empty
+    }
+
+
+class EngineRegistry:
+    """
+    Search engines by name, each rebuilt from its registration arguments on reload
+
+    Example:
+        registry = EngineRegistry()
+        registry.register("default", "enhanced", query_cache=get_shared_cache())
+        registry.register("hybrid", "enhanced", retrieval="hybrid")
+        results = registry.get("hybrid").search("tailor")
+        registry.reload("default")  # Returns at once, swaps when the new engine is ready
+    """
+
+    def __init__(self):
+        self.engines = {}
+        self.specs = {}
+        self.state = {}
+        self.lock = threading.Lock()  # Serializes registrations and reloads, never taken by get()
+        self.watcher = None
+
+    def _build(self, name):
+        kind, kwargs = self.specs[name]
+        engine_class, defaults = engine_defaults(kind)
+        model_name = kwargs.get("model_name", defaults.get("model_name"))
+        backend = kwargs.get("encoder_backend", defaults.get("encoder_backend", "torch"))
+        return engine_class(model=get_model(model_name, backend), **kwargs)
+
+    def manifest_file(self, name):
+        kind, kwargs = self.specs[name]
+        _, defaults = engine_defaults(kind)
+        return store_paths(kwargs.get("embeddings_file", defaults.get("embeddings_file")))["manifest"]
+
+    def store_hash(self, name):
+        """content_hash currently on disk for an engine's store, None if there is no manifest"""
+        try:
+            with open(self.manifest_file(name), "r", encoding="utf-8") as f:
+                return json.load(f).get("content_hash")
+        except (OSError, ValueError):
+            return None
+
+    def register(self, name, kind="enhanced", **kwargs):
+        """Build an engine now and serve it under name"""
+        if kind not in ENGINE_KINDS:
+            raise ValueError(f"Unknown engine kind '{kind}', expected one of {sorted(ENGINE_KINDS)}")
+        with self.lock:
+            self.specs[name] = (kind, kwargs)
+            engine = self._build(name)
+            self.engines[name] = engine
+            self.state[name] = {"kind": kind, "loaded_at": time.time(), "reloading": False,
+                                "reloads": 0, "last_error": None,
+                                "content_hash": (getattr(engine, "manifest", None) or {}).get("content_hash")}
+        return engine
+
+    def get(self, name="default"):
+        """Current engine for name (KeyError if it was never registered)"""
+        return self.engines[name]
+
+    def names(self):
+        return list(self.engines)
+
+    def reload(self, name, background=True):
+        """
+        Rebuild an engine from its store and swap it in
+
+        Returns the reload thread (already started) when background is set,
+        otherwise reloads before returning. A failed reload keeps the current
+        engine and records the error in status().
+        """
+        if name not in self.specs:
+            raise KeyError(name)
+
+        def run():
+            with self.lock:
+                self.state[name]["reloading"] = True
+                try:
+                    engine = self._build(name)
+                except Exception as e:
+                    logger.exception("Reloading engine %s failed, keeping the current one", name)
+                    self.state[name].update(reloading=False, last_error=str(e))
+                    return
+                # The swap itself: requests that already hold the old engine keep using it
+                self.engines[name] = engine
+                self.state[name].update(
+                    reloading=False, last_error=None, loaded_at=time.time(),
+                    reloads=self.state[name]["reloads"] + 1,
+                    content_hash=(getattr(engine, "manifest", None) or {}).get("content_hash"))
+                logger.info("Reloaded engine %s", name)
+
+        if not background:
+            run()
+            return None
+        thread = threading.Thread(target=run, name=f"reload-{name}", daemon=True)
+        thread.start()
+        return thread
+
+    def reload_changed(self):
+        """Reload every engine whose store manifest has a new content_hash on disk"""
+        changed = [name for name in self.names()
+                   if not self.state[name]["reloading"]
+                   and self.store_hash(name) not in (None, self.state[name]["content_hash"])]
+        for name in changed:
+            self.reload(name, background=False)
+        return changed
+
+    def watch(self, interval=30.0):
+        """Poll the store manifests every interval seconds and reload engines whose store changed"""
+        if self.watcher is not None:
+            return self.watcher
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.reload_changed()
+                except Exception:
+                    logger.exception("Store watch failed")
+
+        self.watcher = threading.Thread(target=run, name="store-watcher", daemon=True)
+        self.watcher.start()
+        return self.watcher
+
+    def status(self):
+        """Per-engine kind, load time, reload count and state, for the /engines endpoint"""
+        return {name: dict(state) for name, state in self.state.items()}
+
+
+def models_loaded():
+    """(model name, backend) pairs currently held by the process"""
+    with _models_lock:
+        return [{"model_name": name, "backend": backend} for name, backend in _models]
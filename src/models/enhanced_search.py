@@ -1,30 +1,199 @@
-from sentence_transformers import SentenceTransformer
-import pickle
+import logging
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+import re
+import sys
+import os
+import threading
+
+# Add the project root to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+
+from src.models.ann_index import load_index, index_path
+from src.models.embedding_store import load_embeddings
+from src.models.filter_index import FilterIndex
+from src.models.hierarchical_index import (
+    DEFAULT_BEAM_WIDTHS, HIERARCHY_LEVELS, HierarchicalIndex, hierarchy_path)
+from src.models.metrics import REGISTRY
+from src.models.onnx_encoder import load_encoder
+from src.models.scoring import QuantizedScoringEngine, ScoringEngine, top_k_indices
+
+logger = logging.getLogger(__name__)
+
+# Synonym dictionary for query expansion
+SYNONYMS = {
+    "software engineer": ["programmer", "developer", "software developer", "coder", "software architect"],
+    "nurse": ["nursing", "healthcare worker", "medical nurse", "registered nurse", "healthcare professional"],
+    "teacher": ["educator", "instructor", "professor", "academic", "tutor", "lecturer"],
+    "accountant": ["accounting", "bookkeeper", "financial analyst", "auditor", "tax professional"],
+    "chef": ["cook", "culinary professional", "kitchen staff", "food preparation"],
+    "electrician": ["electrical technician", "electrical worker", "electrical installer"],
+    "mechanic": ["automotive technician", "repair technician", "maintenance worker"],
+    "doctor": ["physician", "medical doctor", "healthcare provider", "medical professional"],
+    "lawyer": ["attorney", "legal professional", "advocate", "counsel"],
+    "manager": ["supervisor", "administrator", "executive", "team leader"]
+}
+
+RETRIEVAL_MODES = ("dense", "hybrid")
+
+TEST_QUERIES = [
+    "software engineer",
+    "nurse",
+    "teacher",
+    "chef",
+    "electrician"
+]
+
+def extract_nco_code(occupation):
+    """NCO code mentioned in an occupation entry ("NCO-1234" or "1234.5678"), or None"""
+    match = re.search(r'NCO-(\d{4}(?:\.\d{4})?)', occupation) or re.search(r'\b(\d{4}\.\d{4})\b', occupation)
+    return match.group(1) if match else None
 
 class EnhancedNCOSearch:
-    def __init__(self, embeddings_file="data/processed/occupation_embeddings.pkl"):
-        self.model = SentenceTransformer('all-mpnet-base-v2')
-        
-        with open(embeddings_file, "rb") as f:
-            data = pickle.load(f)
-            self.occupations = data["occupations"]
-            self.embeddings = data["embeddings"]
-        
-        # Synonym dictionary for query expansion
-        self.synonyms = {
-            "software engineer": ["programmer", "developer", "software developer", "coder", "software architect"],
-            "nurse": ["nursing", "healthcare worker", "medical nurse", "registered nurse", "healthcare professional"],
-            "teacher": ["educator", "instructor", "professor", "academic", "tutor", "lecturer"],
-            "accountant": ["accounting", "bookkeeper", "financial analyst", "auditor", "tax professional"],
-            "chef": ["cook", "culinary professional", "kitchen staff", "food preparation"],
-            "electrician": ["electrical technician", "electrical worker", "electrical installer"],
-            "mechanic": ["automotive technician", "repair technician", "maintenance worker"],
-            "doctor": ["physician", "medical doctor", "healthcare provider", "medical professional"],
-            "lawyer": ["attorney", "legal professional", "advocate", "counsel"],
-            "manager": ["supervisor", "administrator", "executive", "team leader"]
-        }
+    def __init__(self, embeddings_file="data/processed/occupation_embeddings.npy",
+                 index_type="exact", index_file=None, index_params=None, candidate_factor=4,
+                 model_name='all-mpnet-base-v2',
+                 expansion_file="data/processed/expansion_embeddings.npy", query_cache=None,
+                 encoder_backend="torch", retrieval="dense", prefilter_size=None, rrf_k=60,
+                 hierarchical=False, beam_widths=DEFAULT_BEAM_WIDTHS, precision="float32", rescore_size=300,
+                 metrics=None, result_cache=None, model=None):
+        """
+        Args:
+            embeddings_file (str): Embedding store with occupations (see embedding_store.py)
+            index_type (str): "exact", "ivf" or "hnsw" (see ann_index.py)
+            index_file (str): Saved faiss index, defaults to the one next to embeddings_file
+            index_params (dict): Search-time overrides such as nprobe or ef_search
+            candidate_factor (int): ANN candidates fetched per query, as a multiple of top_k
+            model_name (str): Query encoder, must match the one recorded in the store manifest
+            expansion_file (str): Precomputed synonym/word embeddings, None to encode them live
+            query_cache (QueryEmbeddingCache): Optional cache for embeddings of encoded text
+            encoder_backend (str): "torch", or "onnx"/"onnx-int8" for onnxruntime (see onnx_encoder.py)
+            retrieval (str): "dense", or "hybrid" to fuse BM25 and dense rankings (see lexical_index.py)
+            prefilter_size (int): In hybrid mode, only dense-score the top BM25 rows (None scores all)
+            rrf_k (int): Reciprocal rank fusion constant, larger values flatten the rank weights
+            hierarchical (bool): Take candidates from a beam search over the NCO code tree (see hierarchical_index.py)
+            beam_widths (tuple): Nodes kept per level (division, sub-division, group, family)
+            precision (str): "float32", or "float16"/"int8" for a quantized first pass (see scoring.py)
+            rescore_size (int): Rows per query rescored at full precision after a quantized first pass
+            metrics (MetricsRegistry): Where stage timings and counters go, defaults to the process-wide one
+            result_cache (SemanticResultCache): Optional cache of results for repeated and near-duplicate queries
+            model: Already loaded encoder for model_name, e.g. shared through engine_registry.py
+        """
+        if retrieval not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode '{retrieval}', expected one of {RETRIEVAL_MODES}")
+        self.model_name = model_name
+        self.metrics = metrics or REGISTRY
+        self.model = model if model is not None else load_encoder(model_name, encoder_backend)
+        
+        # Fails fast if the store was built with a different encoder
+        self.embeddings, metadata, self.manifest = load_embeddings(
+            embeddings_file, model_name, self.model.get_sentence_embedding_dimension())
+        self.occupations = metadata["occupations"]
+        # Stores built from the structured catalogue carry codes, older ones only mention them in the text
+        self.records = metadata.get("records")
+        if self.records is not None:
+            self.codes = [record["code"] for record in self.records]
+        else:
+            self.codes = [extract_nco_code(occupation) for occupation in self.occupations]
+        self.hierarchy_titles = metadata.get("hierarchy_titles", {})
+        # Sorted codes and per-value row masks, for filtered search and lookups by code
+        self.filter_index = FilterIndex(self.codes, self.records)
+        
+        # Normalized once here so each search is a single matrix product
+        normalized = self.manifest is not None and self.manifest["normalized"]
+        if precision == "float32":
+            self.scorer = ScoringEngine(self.embeddings, normalized=normalized)
+        else:
+            self.scorer = QuantizedScoringEngine(self.embeddings, precision, rescore_size, normalized=normalized)
+        self.embeddings = self.scorer.embeddings
+        
+        # Exact search scores the whole corpus directly, ANN indexes only propose candidates
+        self.index_type = index_type
+        self.index = None
+        if index_type != "exact":
+            if index_file is None:
+                index_file = index_path(embeddings_file, index_type)
+            self.index = load_index(self.embeddings, index_type, index_file, **(index_params or {}))
+        self.candidate_factor = candidate_factor
+        
+        # Division -> family centroids; takes the place of the ANN index for candidates
+        self.hierarchy = None
+        self.group_hierarchy = None
+        self.group_hierarchy_lock = threading.Lock()
+        if hierarchical:
+            if self.index is not None:
+                raise ValueError("hierarchical search replaces the ANN index, use index_type='exact'")
+            self.hierarchy = HierarchicalIndex(self.embeddings, self.codes, beam_widths)
+        
+        # BM25 over the same occupation texts, for exact terms such as codes and rare trade names
+        # Imported here because tokenizing needs spacy and nltk, which dense-only setups can skip
+        self.lexical = None
+        if retrieval == "hybrid":
+            from src.models.lexical_index import BM25Index
+            self.lexical = BM25Index(self.occupations)
+        self.prefilter_size = prefilter_size
+        self.rrf_k = rrf_k
+        
+        self.synonyms = SYNONYMS
+        self.query_cache = query_cache
+        self.result_cache = result_cache
+        
+        # Synonym phrases and common words are encoded at build time, so only
+        # text outside that vocabulary (usually just the raw query) hits the model
+        self.expansion_rows = {}
+        self.expansion_embeddings = None
+        if expansion_file is not None:
+            try:
+                self.expansion_embeddings, metadata, _ = load_embeddings(
+                    expansion_file, model_name, self.model.get_sentence_embedding_dimension())
+                self.expansion_rows = {phrase: i for i, phrase in enumerate(metadata["phrases"])}
+            except FileNotFoundError:
+                logger.warning("No expansion embeddings at %s, expansions will be encoded per query", expansion_file)
+    
+    def encode_expansions(self, expanded_queries, known=None):
+        """
+        Embed expanded queries, looking up precomputed vectors before running the model
+        
+        Args:
+            expanded_queries (list): Texts to embed
+            known (dict): Vectors already computed by the caller, by text
+        """
+        query_embeddings = np.empty(
+            (len(expanded_queries), self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+        
+        self.metrics.inc("nco_expansions_total", len(expanded_queries))
+        missing = []
+        for i, text in enumerate(expanded_queries):
+            row = self.expansion_rows.get(text)
+            if known is not None and text in known:
+                query_embeddings[i] = known[text]
+            elif row is None:
+                missing.append(i)
+            else:
+                query_embeddings[i] = self.expansion_embeddings[row]
+        self.metrics.inc("nco_expansion_lookups_total", len(expanded_queries) - len(missing), source="precomputed")
+        
+        if missing and self.query_cache is not None:
+            still_missing = []
+            for i in missing:
+                cached = self.query_cache.get(self.model_name, expanded_queries[i])
+                if cached is None:
+                    still_missing.append(i)
+                else:
+                    query_embeddings[i] = cached
+            self.metrics.inc("nco_expansion_lookups_total", len(missing) - len(still_missing), source="cache")
+            missing = still_missing
+        
+        if missing:
+            self.metrics.inc("nco_expansion_lookups_total", len(missing), source="encoder")
+            # Each distinct text is encoded once, in as few forward passes as possible
+            texts = list(dict.fromkeys(expanded_queries[i] for i in missing))
+            encoded = dict(zip(texts, self.model.encode(texts, batch_size=64)))
+            for i in missing:
+                query_embeddings[i] = encoded[expanded_queries[i]]
+            if self.query_cache is not None:
+                for text, vector in encoded.items():
+                    self.query_cache.put(self.model_name, text, vector)
+        return query_embeddings
     
     def expand_query(self, query):
         """Expand query with synonyms"""
@@ -43,62 +212,271 @@ class EnhancedNCOSearch:
         
         return expanded_queries
     
-    def search(self, query, top_k=5):
-        """Enhanced search with query expansion"""
-        print(f"Searching for: '{query}'")
+    def candidates(self, query_embeddings, top_k, rows=None):
+        """Occupation rows worth scoring for one query's expansions (None means all rows)"""
+        if rows is not None:
+            # A filtered search scores exactly the rows that pass the filters
+            return rows
+        if self.hierarchy is not None:
+            return self.hierarchy.candidates(query_embeddings)
+        if self.index is None:
+            return None
+        # Any occupation in the combined top k is in the top k of at least one
+        # expanded query, so the index only has to return per-query candidates
+        _, candidate_ids = self.index.search(query_embeddings, top_k * self.candidate_factor)
+        return np.unique(candidate_ids[candidate_ids >= 0])
+    
+    def hybrid_rank(self, expanded_queries, query_embeddings, top_k, rows=None):
+        """
+        Fuse the BM25 and dense rankings of one query with reciprocal rank fusion
         
-        # Expand the query
-        expanded_queries = self.expand_query(query)
-        print(f"Expanded to: {expanded_queries}")
+        Each occupation scores sum(1 / (rrf_k + rank)) over the rankings it appears
+        in. With prefilter_size set, dense scoring is restricted to the top BM25
+        rows, unless too few rows share a term with the query. rows restricts both
+        rankings to a filtered set.
+        """
+        depth = top_k * self.candidate_factor
+        with self.metrics.stage("lexical"):
+            lexical_text = " ".join(expanded_queries)
+            lexical_ids, _ = self.lexical.search(lexical_text, max(depth, self.prefilter_size or 0), rows)
         
-        # Get embeddings for all expanded queries
-        query_embeddings = self.model.encode(expanded_queries)
+        with self.metrics.stage("similarity"):
+            if self.prefilter_size and len(lexical_ids) >= top_k:
+                candidates = np.sort(lexical_ids)
+            else:
+                candidates = self.candidates(query_embeddings, top_k, rows)
+                if candidates is not None:
+                    candidates = np.union1d(candidates, lexical_ids[:depth])
+            lexical_ids = lexical_ids[:depth]
+            
+            max_similarities = self.scorer.max_similarities(query_embeddings, candidates)
+            max_similarities *= 1.2
+            np.minimum(max_similarities, 1.0, out=max_similarities)
         
-        # Calculate similarities for each expanded query
-        all_similarities = []
-        for qemb in query_embeddings:
-            similarities = cosine_similarity([qemb], self.embeddings)[0]
-            all_similarities.append(similarities)
+        with self.metrics.stage("topk"):
+            rows = np.arange(len(self.occupations)) if candidates is None else candidates
+            dense_ids = rows[top_k_indices(max_similarities, depth)]
+            
+            fused = {}
+            for ranking in (dense_ids, lexical_ids):
+                for rank, idx in enumerate(ranking.tolist(), 1):
+                    fused[idx] = fused.get(idx, 0.0) + 1.0 / (self.rrf_k + rank)
+            top_ids = sorted(fused, key=lambda idx: (-fused[idx], idx))[:top_k]
         
-        # Take the MAXIMUM similarity across all expanded queries
-        max_similarities = np.maximum.reduce(all_similarities)
+        with self.metrics.stage("format"):
+            results = []
+            for idx in top_ids:
+                pos = idx if candidates is None else np.searchsorted(candidates, idx)
+                result = self.result(idx, max_similarities[pos])
+                result['fusion_score'] = fused[idx]
+                results.append(result)
+        return results
+    
+    def result(self, idx, confidence):
+        """Result entry for one occupation row"""
+        occupation = self.occupations[idx]
+        display_text = occupation[:150] + "..." if len(occupation) > 150 else occupation
         
-        # Boost scores by 1.2x (20% boost) for multi-query matching
-        max_similarities = np.minimum(max_similarities * 1.2, 1.0)
+        return {
+            'occupation': display_text,
+            'full_occupation': occupation,
+            'code': self.codes[idx],
+            'confidence': float(confidence),
+            'confidence_percent': float(round(confidence * 100, 2)),
+            'hierarchy': hierarchy_path(self.codes[idx], self.hierarchy_titles)
+        }
+    
+    def occupation(self, code):
+        """
+        Catalogue entry for an exact NCO code, without searching (None if there is no such code)
         
-        # Get top k results
-        top_indices = np.argsort(max_similarities)[-top_k:][::-1]
+        Accepts "7531.0100" or "75310100".
+        """
+        idx = self.filter_index.lookup(code)
+        if idx is None:
+            return None
+        entry = dict(self.records[idx]) if self.records is not None else {'code': self.codes[idx]}
+        entry.update({
+            'occupation': self.occupations[idx],
+            'hierarchy': hierarchy_path(self.codes[idx], self.hierarchy_titles)
+        })
+        return entry
+    
+    def search_groups(self, query, level="family", top_k=3):
+        """
+        Closest division, sub-division, group or family to a query
+        
+        Useful as a coarser answer when no single occupation matches confidently.
+        Confidence is the cosine similarity to the node's centroid, without the
+        multi-query boost applied to occupations.
+        """
+        hierarchy = self.hierarchy
+        if hierarchy is None:
+            # Built on first use, without switching candidate generation over to the tree;
+            # the lock keeps concurrent first requests from building it twice
+            with self.group_hierarchy_lock:
+                if self.group_hierarchy is None:
+                    self.group_hierarchy = HierarchicalIndex(self.embeddings, self.codes)
+            hierarchy = self.group_hierarchy
+        query_embeddings = self.encode_expansions(self.expand_query(query))
         
         results = []
-        for idx in top_indices:
-            occupation = self.occupations[idx]
-            display_text = occupation[:150] + "..." if len(occupation) > 150 else occupation
-            
+        for code, similarity in hierarchy.match_nodes(query_embeddings, level, top_k):
+            # Pad group and coarser codes to a family code, then cut the path at the requested level
+            path = hierarchy_path(code.ljust(4, "0"), self.hierarchy_titles)[:HIERARCHY_LEVELS.index(level) + 1]
             results.append({
-                'occupation': display_text,
-                'full_occupation': occupation,
-                'confidence': float(max_similarities[idx]),
-                'confidence_percent': float(round(max_similarities[idx] * 100, 2))
+                'level': level,
+                'code': code,
+                'title': path[-1]['title'],
+                'confidence': similarity,
+                'confidence_percent': float(round(similarity * 100, 2)),
+                'hierarchy': path
             })
+        return results
+    
+    def rank(self, max_similarities, candidates, top_k):
+        """Boost the combined similarities and format the top k occupations"""
+        with self.metrics.stage("topk"):
+            # Boost scores by 1.2x (20% boost) for multi-query matching
+            max_similarities *= 1.2
+            np.minimum(max_similarities, 1.0, out=max_similarities)
+            
+            # Get top k results
+            top_positions = top_k_indices(max_similarities, top_k)
+        
+        with self.metrics.stage("format"):
+            results = []
+            for pos in top_positions:
+                idx = pos if candidates is None else candidates[pos]
+                results.append(self.result(idx, max_similarities[pos]))
         
         return results
+    
+    def search(self, query, top_k=5, filters=None):
+        """
+        Enhanced search with query expansion
+        
+        Args:
+            query (str): Job description/title
+            top_k (int): Number of top matches to return
+            filters (dict): Only return occupations matching these, e.g. {"division": "7"} or
+                {"code": "7531", "volume": "nco_vol2b_detailed"} (see filter_index.py)
+        """
+        rows = self.filter_index.rows(filters)
+        if rows is not None and not len(rows):
+            return []
+        if self.result_cache is not None and rows is None:
+            return self.search_batch([query], top_k)[0]
+        
+        logger.debug("Searching for: %r", query)
+        self.metrics.inc("nco_queries_total")
+        
+        # Expand the query
+        with self.metrics.stage("expansion"):
+            expanded_queries = self.expand_query(query)
+        logger.debug("Expanded to: %s", expanded_queries)
+        
+        # Get embeddings for all expanded queries
+        with self.metrics.stage("encode"):
+            query_embeddings = self.encode_expansions(expanded_queries)
+        if self.lexical is not None:
+            return self.hybrid_rank(expanded_queries, query_embeddings, top_k, rows)
+        
+        with self.metrics.stage("similarity"):
+            candidates = self.candidates(query_embeddings, top_k, rows)
+            # One matrix product for all expanded queries, keeping the MAXIMUM per occupation
+            max_similarities = self.scorer.max_similarities(query_embeddings, candidates)
+        
+        return self.rank(max_similarities, candidates, top_k)
+    
+    def search_batch(self, queries, top_k=5, batch_size=256, filters=None):
+        """
+        Search many queries at once
+        
+        Expansions of a whole batch are encoded together and, for exact search,
+        scored against the corpus in one matrix product.
+        
+        Args:
+            queries (list): Job descriptions/titles
+            top_k (int): Number of top matches per query
+            batch_size (int): Queries scored per matrix product, bounds peak memory
+            filters (dict): Filters applied to every query, as in search
+            
+        Returns:
+            list: One result list per query, in input order
+        """
+        if self.result_cache is None or filters:
+            return self.search_batch_uncached(queries, top_k, batch_size, filters=filters)
+        
+        # Exact repeats first, then near-duplicates of earlier queries by raw query embedding
+        self.result_cache.validate(self.manifest["content_hash"] if self.manifest else None)
+        all_results = [self.result_cache.get(query, top_k) for query in queries]
+        pending = [i for i, results in enumerate(all_results) if results is None]
+        self.metrics.inc("nco_result_cache_lookups_total", len(queries) - len(pending), result="hit")
+        if not pending:
+            return all_results
+        
+        with self.metrics.stage("encode"):
+            texts = list(dict.fromkeys(queries[i] for i in pending))
+            known = dict(zip(texts, self.encode_expansions(texts)))
+        
+        misses = []
+        for i in pending:
+            all_results[i] = self.result_cache.get_similar(known[queries[i]], top_k)
+            if all_results[i] is None:
+                misses.append(i)
+        self.metrics.inc("nco_result_cache_lookups_total", len(pending) - len(misses), result="similar_hit")
+        self.metrics.inc("nco_result_cache_lookups_total", len(misses), result="miss")
+        
+        miss_queries = [queries[i] for i in misses]
+        for i, query, results in zip(misses, miss_queries,
+                                     self.search_batch_uncached(miss_queries, top_k, batch_size, known)):
+            all_results[i] = results
+            self.result_cache.put(query, known[query], results, top_k)
+        return all_results
+    
+    def search_batch_uncached(self, queries, top_k=5, batch_size=256, known=None, filters=None):
+        """search_batch without the result cache, reusing any embeddings in known (text -> vector)"""
+        rows = self.filter_index.rows(filters)
+        if rows is not None and not len(rows):
+            return [[] for _ in queries]
+        all_results = []
+        for start in range(0, len(queries), batch_size):
+            batch = queries[start:start + batch_size]
+            self.metrics.inc("nco_queries_total", len(batch))
+            with self.metrics.stage("expansion"):
+                expanded = [self.expand_query(query) for query in batch]
+                flat_queries = [text for expansions in expanded for text in expansions]
+                offsets = np.cumsum([0] + [len(expansions) for expansions in expanded])
+            
+            with self.metrics.stage("encode"):
+                query_embeddings = self.encode_expansions(flat_queries, known)
+            
+            if self.lexical is not None:
+                for expansions, begin, end in zip(expanded, offsets[:-1], offsets[1:]):
+                    all_results.append(self.hybrid_rank(expansions, query_embeddings[begin:end], top_k, rows))
+            elif self.index is None and self.hierarchy is None and rows is None:
+                with self.metrics.stage("similarity"):
+                    max_similarities = self.scorer.max_similarities_batch(query_embeddings, offsets[:-1])
+                for row in max_similarities:
+                    all_results.append(self.rank(row, None, top_k))
+            else:
+                for begin, end in zip(offsets[:-1], offsets[1:]):
+                    with self.metrics.stage("similarity"):
+                        candidates = self.candidates(query_embeddings[begin:end], top_k, rows)
+                        row = self.scorer.max_similarities(query_embeddings[begin:end], candidates)
+                    all_results.append(self.rank(row, candidates, top_k))
+        
+        return all_results
 
 # Test the enhanced search
 def test_enhanced_search():
     search_engine = EnhancedNCOSearch()
     
-    test_queries = [
-        "software engineer",
-        "nurse", 
-        "teacher",
-        "chef",
-        "electrician"
-    ]
-    
     print("TESTING ENHANCED SEARCH")
     print("="*50)
     
-    for query in test_queries:
+    for query in TEST_QUERIES:
         print(f"\nQuery: '{query}'")
         print("-" * 30)
         results = search_engine.search(query, top_k=3)
@@ -108,5 +486,90 @@ def test_enhanced_search():
             occupation = result['occupation']
             print(f"{i}. {confidence}% - {occupation}")
 
+# Check that precomputed expansion embeddings give the same rankings as live encoding
+def test_expansion_parity(top_k=10):
+    search_engine = EnhancedNCOSearch()
+    if not search_engine.expansion_rows:
+        print("No expansion embeddings loaded, run create_occupation_embeddings.py first")
+        return False
+    
+    queries = TEST_QUERIES + ["senior software engineer", "primary school teacher", "hospital staff nurse"]
+    precomputed = {query: search_engine.search(query, top_k=top_k) for query in queries}
+    
+    expansion_rows = search_engine.expansion_rows
+    search_engine.expansion_rows = {}
+    live = {query: search_engine.search(query, top_k=top_k) for query in queries}
+    search_engine.expansion_rows = expansion_rows
+    
+    print("TESTING EXPANSION EMBEDDING PARITY")
+    print("="*50)
+    
+    all_match = True
+    for query in queries:
+        precomputed_ranking = [r['full_occupation'] for r in precomputed[query]]
+        live_ranking = [r['full_occupation'] for r in live[query]]
+        max_diff = max(abs(a['confidence'] - b['confidence']) for a, b in zip(precomputed[query], live[query]))
+        match = precomputed_ranking == live_ranking
+        all_match = all_match and match
+        print(f"{'OK  ' if match else 'DIFF'} '{query}' (max confidence difference {max_diff:.2e})")
+    
+    return all_match
+
+# Compare dense, hybrid and BM25-prefiltered hybrid rankings on exact-term queries
+def test_hybrid_search(prefilter_size=300):
+    import time
+    
+    engines = {
+        "dense": EnhancedNCOSearch(),
+        "hybrid": EnhancedNCOSearch(retrieval="hybrid"),
+        "prefilter": EnhancedNCOSearch(retrieval="hybrid", prefilter_size=prefilter_size),
+    }
+    queries = ["zari worker", "beedi roller", "7318.0100", "handloom weaver", "software engineer"]
+    
+    print("TESTING HYBRID SEARCH")
+    print("="*50)
+    
+    for query in queries:
+        print(f"\nQuery: '{query}'")
+        for name, engine in engines.items():
+            start_time = time.time()
+            results = engine.search_batch([query], top_k=3)[0]
+            elapsed = (time.time() - start_time) * 1000
+            print(f"  {name:9s} ({elapsed:6.1f} ms): {[r['code'] for r in results]}")
+            for result in results[:1]:
+                print(f"    {result['occupation'][:100]}")
+
+# Compare tree-pruned search with exact search: recall of the exact top k and rows scored per query
+def test_hierarchical_search(top_k=10, **engine_kwargs):
+    exact_engine = EnhancedNCOSearch(**engine_kwargs)
+    tree_engine = EnhancedNCOSearch(hierarchical=True, **engine_kwargs)
+    
+    queries = TEST_QUERIES + ["senior software engineer", "primary school teacher", "hand embroiderer", "tailor"]
+    exact = exact_engine.search_batch(queries, top_k=top_k)
+    pruned = tree_engine.search_batch(queries, top_k=top_k)
+    
+    print("TESTING HIERARCHICAL SEARCH")
+    print(tree_engine.hierarchy.stats())
+    print("="*50)
+    
+    recalls = []
+    for query, exact_results, tree_results in zip(queries, exact, pruned):
+        query_embeddings = tree_engine.encode_expansions(tree_engine.expand_query(query))
+        scored = len(tree_engine.candidates(query_embeddings, top_k))
+        exact_codes = {r['full_occupation'] for r in exact_results}
+        recall = len(exact_codes & {r['full_occupation'] for r in tree_results}) / max(len(exact_codes), 1)
+        recalls.append(recall)
+        groups = tree_engine.search_groups(query, level="group", top_k=1)
+        group = f"{groups[0]['code']} {groups[0]['title']}" if groups else "-"
+        print(f"'{query}': recall@{top_k} {recall:.0%}, scored {scored}/{len(tree_engine.occupations)} rows, "
+              f"best group {group}")
+    
+    print("-" * 50)
+    print(f"Mean recall@{top_k}: {np.mean(recalls):.2%}")
+    return float(np.mean(recalls))
+
 if __name__ == "__main__":
     test_enhanced_search()
+    test_expansion_parity()
+    test_hybrid_search()
+    test_hierarchical_search()
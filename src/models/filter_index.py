@@ -0,0 +1,114 @@
+"""
+Structured filters over occupation rows: code prefix, division and volume
+
+Codes are kept in one sorted array, so every code prefix (a division "7",
+a family "7531", or any finer prefix) is a contiguous range found with two
+binary searches. Categorical fields (the volume) have one precomputed row
+mask per value. A filter resolves to the sorted rows that satisfy it, and
+only those rows are scored.
+"""
+import numpy as np
+
+FILTER_FIELDS = ("code", "division", "volume")
+
+# Filter name -> record field holding its values (a string or a list of strings)
+CATEGORICAL_FIELDS = {"volume": "volumes"}
+
+
+def normalize_code(code):
+    """Dotted form of a code or code prefix ("75310100" or "7531.0100" -> "7531.0100", "7531." -> "7531")"""
+    digits = str(code).strip().replace(".", "")
+    if not digits.isdigit():
+        raise ValueError(f"Invalid NCO code '{code}'")
+    return digits if len(digits) <= 4 else f"{digits[:4]}.{digits[4:]}"
+
+
+class FilterIndex:
+    """
+    Row lookups by code and row sets by filter
+
+    Example:
+        index = FilterIndex(codes, records)
+        index.lookup("7531.0100")                      # Row of one occupation
+        index.rows({"division": "7"})                  # Sorted rows of Division 7
+        index.rows({"code": ["7531", "7532"], "volume": "nco_vol2b_detailed"})
+    """
+
+    def __init__(self, codes, records=None):
+        """
+        Args:
+            codes (list): NCO code per row, None for rows without one
+            records (list): Row-aligned catalogue records, for the categorical fields
+        """
+        self.n_rows = len(codes)
+        self.code_rows = {code: row for row, code in enumerate(codes) if code}
+        coded = sorted((code, row) for row, code in enumerate(codes) if code)
+        self.sorted_codes = np.array([code for code, _ in coded], dtype=str)
+        self.sorted_rows = np.array([row for _, row in coded], dtype=np.int64)
+
+        self.masks = {}
+        for name, field in CATEGORICAL_FIELDS.items():
+            values = {}
+            for row, record in enumerate(records or []):
+                record_values = record.get(field) or []
+                for value in [record_values] if isinstance(record_values, str) else record_values:
+                    values.setdefault(value, []).append(row)
+            if values:
+                self.masks[name] = {}
+                for value, rows in values.items():
+                    mask = np.zeros(self.n_rows, dtype=bool)
+                    mask[rows] = True
+                    self.masks[name][value] = mask
+
+    def lookup(self, code):
+        """Row of an exact code, or None"""
+        try:
+            return self.code_rows.get(normalize_code(code))
+        except ValueError:
+            return None
+
+    def prefix_rows(self, prefix):
+        """Rows whose code starts with prefix, in code order"""
+        prefix = normalize_code(prefix)
+        lo, hi = np.searchsorted(self.sorted_codes, [prefix, prefix + "~"])
+        return self.sorted_rows[lo:hi]
+
+    def values(self, name):
+        """Known values of a categorical filter"""
+        return sorted(self.masks.get(name, {}))
+
+    def rows(self, filters):
+        """
+        Sorted rows matching every filter, or None when filters is empty
+
+        Args:
+            filters (dict): Any of FILTER_FIELDS, each a value or a list of values.
+                Values of one filter are alternatives, different filters must all hold.
+
+        Raises:
+            ValueError: For unknown filters or values, or a filter the catalogue has no data for
+        """
+        filters = {name: value for name, value in (filters or {}).items() if value not in (None, "", [])}
+        if not filters:
+            return None
+
+        mask = np.ones(self.n_rows, dtype=bool)
+        for name, wanted in filters.items():
+            wanted = [wanted] if isinstance(wanted, (str, int)) else list(wanted)
+            if name in ("code", "division"):
+                if name == "division" and any(len(str(value).strip()) != 1 for value in wanted):
+                    raise ValueError(f"A division is one digit, got {wanted}")
+                selected = np.zeros(self.n_rows, dtype=bool)
+                for prefix in wanted:
+                    selected[self.prefix_rows(prefix)] = True
+            elif name in CATEGORICAL_FIELDS:
+                if name not in self.masks:
+                    raise ValueError(f"The occupation catalogue has no {name} data to filter on")
+                unknown = [value for value in wanted if value not in self.masks[name]]
+                if unknown:
+                    raise ValueError(f"Unknown {name} {unknown}, expected one of {self.values(name)}")
+                selected = np.logical_or.reduce([self.masks[name][value] for value in wanted])
+            else:
+                raise ValueError(f"Unknown filter '{name}', expected one of {FILTER_FIELDS}")
+            mask &= selected
+        return np.flatnonzero(mask)
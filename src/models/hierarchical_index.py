@@ -0,0 +1,150 @@
+import numpy as np
+import sys
+import os
+
+# Add the project root to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+
+from src.models.scoring import normalize_rows, top_k_indices
+
+# NCO-2015 levels and the number of code digits that identify each of them
+HIERARCHY_LEVELS = ("division", "sub_division", "group", "family")
+PREFIX_LENGTHS = {"division": 1, "sub_division": 2, "group": 3, "family": 4}
+
+# Nodes kept per level while descending; the catalogue has about 9 divisions,
+# 40 sub-divisions, 120 groups and 370 families
+DEFAULT_BEAM_WIDTHS = (4, 8, 16, 32)
+
+
+def code_digits(code):
+    """Digits of an NCO code ("7318.0100" -> "73180100"), or "" when there is no family-level code"""
+    digits = (code or "").replace(".", "")
+    return digits if len(digits) >= PREFIX_LENGTHS["family"] and digits.isdigit() else ""
+
+
+def hierarchy_path(code, titles=None):
+    """
+    Division to family path of an occupation code
+
+    Args:
+        code (str): NCO code such as "7318.0100" (or a 4-digit family code)
+        titles (dict): {level: {node code: title}}, as stored in the embedding store sidecar
+
+    Returns:
+        list: [{"level", "code", "title"}, ...] from division down, empty for rows without a code
+    """
+    digits = code_digits(code)
+    if not digits:
+        return []
+    titles = titles or {}
+    return [
+        {
+            "level": level,
+            "code": digits[:PREFIX_LENGTHS[level]],
+            "title": titles.get(level, {}).get(digits[:PREFIX_LENGTHS[level]]),
+        }
+        for level in HIERARCHY_LEVELS
+    ]
+
+
+class HierarchicalIndex:
+    """
+    Coarse-to-fine candidate generation over the NCO code tree
+
+    Rows are sorted by code, so every division, sub-division, group and family
+    is a contiguous slice of self.rows, and each node has a normalized centroid
+    of its occupations' embeddings. A search scores the division centroids,
+    keeps the best beam_widths[0], scores only their children, and so on down
+    to families; the occupations under the surviving families are the
+    candidates for exact scoring. Rows without a code are always candidates.
+    """
+
+    def __init__(self, embeddings, codes, beam_widths=DEFAULT_BEAM_WIDTHS):
+        """
+        Args:
+            embeddings (np.ndarray): Normalized occupation embeddings, one row per code
+            codes (list): NCO code per row, None for rows without one
+            beam_widths (tuple): Nodes kept at each level, division first
+        """
+        if len(beam_widths) != len(HIERARCHY_LEVELS):
+            raise ValueError(f"Expected {len(HIERARCHY_LEVELS)} beam widths, got {len(beam_widths)}")
+        self.beam_widths = tuple(beam_widths)
+
+        digits = [code_digits(code) for code in codes]
+        self.rows = np.array(sorted((i for i, d in enumerate(digits) if d), key=lambda i: digits[i]), dtype=np.int64)
+        self.unassigned = np.array([i for i, d in enumerate(digits) if not d], dtype=np.int64)
+        sorted_digits = [digits[i] for i in self.rows]
+        member_embeddings = np.asarray(embeddings[self.rows], dtype=np.float32)
+
+        self.levels = []
+        for level in HIERARCHY_LEVELS:
+            length = PREFIX_LENGTHS[level]
+            node_codes, starts = [], []
+            for pos, row_digits in enumerate(sorted_digits):
+                if not node_codes or node_codes[-1] != row_digits[:length]:
+                    node_codes.append(row_digits[:length])
+                    starts.append(pos)
+            bounds = np.array(starts + [len(sorted_digits)], dtype=np.int64)
+            centroids = np.add.reduceat(member_embeddings, bounds[:-1], axis=0) if starts else member_embeddings[:0]
+            self.levels.append({
+                "level": level,
+                "codes": node_codes,
+                "bounds": bounds,
+                "centroids": normalize_rows(centroids),
+            })
+
+        # Children of node j are nodes child_bounds[j]:child_bounds[j + 1] of the next level
+        for parent, child in zip(self.levels[:-1], self.levels[1:]):
+            parent["child_bounds"] = np.searchsorted(child["bounds"][:-1], parent["bounds"])
+
+    def descend(self, query_embeddings):
+        """
+        Beam search down the tree for one query's expansions
+
+        A node's score is the maximum similarity of its centroid to any expansion,
+        matching how occupation scores are combined.
+
+        Returns:
+            list: (node ids, scores) surviving at each level, division first
+        """
+        # Centroids are unit length, so the queries must be too for the scores to be cosines
+        query_embeddings = normalize_rows(query_embeddings)
+        nodes = np.arange(len(self.levels[0]["codes"]))
+        survivors = []
+        for depth, level in enumerate(self.levels):
+            scores = (query_embeddings @ level["centroids"][nodes].T).max(axis=0)
+            keep = top_k_indices(scores, self.beam_widths[depth])
+            nodes, scores = nodes[keep], scores[keep]
+            survivors.append((nodes, scores))
+            if "child_bounds" in level:
+                child_bounds = level["child_bounds"]
+                nodes = np.concatenate(
+                    [np.arange(child_bounds[j], child_bounds[j + 1]) for j in nodes] or [np.array([], dtype=np.int64)])
+        return survivors
+
+    def candidates(self, query_embeddings):
+        """Sorted occupation rows under the surviving families, plus rows without a code"""
+        families, _ = self.descend(query_embeddings)[-1]
+        bounds = self.levels[-1]["bounds"]
+        leaves = [self.rows[bounds[j]:bounds[j + 1]] for j in families]
+        return np.sort(np.concatenate(leaves + [self.unassigned]))
+
+    def match_nodes(self, query_embeddings, level="family", top_k=3):
+        """
+        Best nodes of one level by centroid similarity, scoring every node of that level
+
+        Returns:
+            list: (node code, similarity) pairs, best first
+        """
+        level_data = self.levels[HIERARCHY_LEVELS.index(level)]
+        if not level_data["codes"]:
+            return []
+        scores = (normalize_rows(query_embeddings) @ level_data["centroids"].T).max(axis=0)
+        return [(level_data["codes"][j], float(scores[j])) for j in top_k_indices(scores, top_k)]
+
+    def stats(self):
+        """Node counts per level and the rows outside the tree"""
+        stats = {level["level"]: len(level["codes"]) for level in self.levels}
+        stats.update({"rows": int(len(self.rows)), "unassigned": int(len(self.unassigned)),
+                      "beam_widths": list(self.beam_widths)})
+        return stats
@@ -0,0 +1,128 @@
+import os
+import re
+import sys
+from collections import Counter
+
+import numpy as np
+
+# Add the project root to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+
+from spacy.lang.en.stop_words import STOP_WORDS
+from src.data_processing.preprocess_nco_text import stem
+from src.models.scoring import top_k_indices
+
+# Words, and numbers with an optional dotted part so codes like 7318.0100 stay whole
+TOKEN_PATTERN = re.compile(r"[a-z]+|\d+(?:\.\d+)?")
+
+
+def tokenize(text):
+    """
+    Lexical terms of a text, normalized like the *_tokens.txt files
+
+    Words are stopword-filtered and Porter-stemmed the same way as in
+    preprocess_nco_text.py. Numbers are kept (the token files drop them) so
+    code queries match: "7318.0100" yields both "7318.0100" and its family "7318".
+    """
+    terms = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token[0].isdigit():
+            terms.append(token)
+            if "." in token:
+                terms.append(token.split(".", 1)[0])
+        elif len(token) > 1 and token not in STOP_WORDS:
+            terms.append(stem(token))
+    return terms
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a fixed list of documents, with postings in numpy arrays
+
+    Postings are stored term by term (CSR layout): postings_docs[offsets[t]:offsets[t + 1]]
+    are the documents containing term t. The BM25 weight of every posting only
+    depends on the document, so it is computed once at build time and a query
+    is a sum of posting slices.
+    """
+
+    def __init__(self, documents, k1=1.2, b=0.75):
+        """
+        Args:
+            documents (list): Document texts, one per occupation row
+            k1 (float): Term frequency saturation
+            b (float): Document length normalization
+        """
+        self.vocabulary = {}
+        self.n_docs = len(documents)
+        doc_ids, term_ids, counts = [], [], []
+        lengths = np.zeros(self.n_docs, dtype=np.float32)
+
+        for doc_id, text in enumerate(documents):
+            term_counts = Counter(tokenize(text))
+            lengths[doc_id] = sum(term_counts.values())
+            for term, count in term_counts.items():
+                term_ids.append(self.vocabulary.setdefault(term, len(self.vocabulary)))
+                doc_ids.append(doc_id)
+                counts.append(count)
+
+        term_ids = np.asarray(term_ids, dtype=np.int32)
+        order = np.argsort(term_ids, kind="stable")
+        self.postings_docs = np.asarray(doc_ids, dtype=np.int32)[order]
+        tf = np.asarray(counts, dtype=np.float32)[order]
+        posting_terms = term_ids[order]
+
+        df = np.bincount(term_ids, minlength=len(self.vocabulary))
+        self.offsets = np.concatenate([[0], np.cumsum(df)]).astype(np.int64)
+        self.idf = np.log1p((self.n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+        avg_length = lengths.mean() if self.n_docs else 0.0
+        norm = k1 * (1 - b + b * lengths[self.postings_docs] / max(avg_length, 1e-9))
+        self.postings_weights = (self.idf[posting_terms] * tf * (k1 + 1) / (tf + norm)).astype(np.float32)
+
+    def scores(self, text):
+        """BM25 score of every document for a query text (distinct terms count once)"""
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        for term in set(tokenize(text)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            # A document appears at most once per term, so plain fancy-index addition is safe
+            scores[self.postings_docs[start:end]] += self.postings_weights[start:end]
+        return scores
+
+    def search(self, text, k, rows=None):
+        """
+        Top k documents that share at least one term with the query
+
+        Args:
+            rows (np.ndarray): Only consider these documents
+
+        Returns:
+            tuple: (document ids, BM25 scores), best first; fewer than k if few documents match
+        """
+        scores = self.scores(text)
+        hits = np.flatnonzero(scores) if rows is None else rows[scores[rows] > 0]
+        top = top_k_indices(scores[hits], k)
+        return hits[top], scores[hits][top]
+
+
+if __name__ == "__main__":
+    import time
+    from src.models.embedding_store import load_store
+
+    _, metadata, _ = load_store("data/processed/occupation_embeddings")
+    occupations = metadata["occupations"]
+
+    start_time = time.time()
+    index = BM25Index(occupations)
+    print(f"Indexed {len(occupations)} occupations, {len(index.vocabulary)} terms, "
+          f"{len(index.postings_docs)} postings in {time.time() - start_time:.2f}s")
+
+    for query in ["zari worker", "beedi roller", "7318.0100", "software engineer"]:
+        start_time = time.time()
+        ids, scores = index.search(query, 3)
+        elapsed = (time.time() - start_time) * 1000
+        print(f"\n'{query}' ({elapsed:.2f} ms)")
+        for doc_id, score in zip(ids, scores):
+            print(f"  {score:6.2f}  {occupations[doc_id][:100]}")
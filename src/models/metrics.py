@@ -0,0 +1,169 @@
+import json
+import logging
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bounds in seconds, from sub-millisecond lookups up to slow encoder batches
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# name -> (type, help) for everything the search engine and the API record
+METRICS = {
+    "nco_search_stage_seconds": ("histogram", "Time spent in each search stage per call"),
+    "nco_queries_total": ("counter", "Queries searched"),
+    "nco_expansions_total": ("counter", "Expanded query texts embedded"),
+    "nco_expansion_lookups_total": ("counter", "Expanded query embeddings by source (precomputed, cache, encoder)"),
+    "nco_http_request_seconds": ("histogram", "HTTP request latency by endpoint"),
+    "nco_http_requests_total": ("counter", "HTTP requests by endpoint"),
+    "nco_errors_total": ("counter", "Failed requests by endpoint"),
+    "nco_result_cache_lookups_total": ("counter", "Result cache lookups by outcome (hit, similar_hit, miss)"),
+}
+
+trace_logger = logging.getLogger("nco.trace")
+_local = threading.local()
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _format_labels(labels, **extra):
+    items = list(labels) + sorted(extra.items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{str(value)}"' for key, value in items) + "}"
+
+
+class MetricsRegistry:
+    """
+    Thread-safe counters and histograms, rendered in the Prometheus text format
+
+    Series are keyed by metric name plus a sorted tuple of label pairs, so
+    registry.inc("nco_errors_total", endpoint="search") and the same call with
+    another endpoint are separate series of one metric.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def stage(self, stage):
+        """Time a search stage into nco_search_stage_seconds and the current request trace, if any"""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start_time
+            self.observe("nco_search_stage_seconds", elapsed, stage=stage)
+            trace = getattr(_local, "trace", None)
+            if trace is not None:
+                trace.add(stage, elapsed)
+
+    def reset(self):
+        """Drop every series, e.g. in a forked worker so the parent's warm-up is not counted"""
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def render(self):
+        """All series in the Prometheus text exposition format"""
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items(), key=lambda item: item[0])
+            histograms = [(key, list(h.counts), h.sum, h.count) for key, h in histograms]
+
+        lines = []
+        described = set()
+
+        def describe(name, kind):
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {METRICS.get(name, (kind, name))[1]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            describe(name, "counter")
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        for (name, labels), counts, total, count in histograms:
+            describe(name, "histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_format_labels(labels, le=repr(bound))} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels, le='+Inf')} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+        return "\n".join(lines) + "\n"
+
+
+class RequestTrace:
+    """Stage timings of one sampled request, logged as a JSON line when it ends"""
+
+    def __init__(self, name, **fields):
+        self.name = name
+        self.fields = fields
+        self.stages = {}
+        self.start_time = time.perf_counter()
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def record(self):
+        return dict(self.fields, request=self.name, timestamp=time.time(),
+                    total_ms=round((time.perf_counter() - self.start_time) * 1000, 3),
+                    stages_ms={stage: round(seconds * 1000, 3) for stage, seconds in self.stages.items()})
+
+
+@contextmanager
+def trace_request(name, sample_rate, **fields):
+    """
+    Sample this request with probability sample_rate and log its stage timings to "nco.trace"
+
+    Stages timed with MetricsRegistry.stage on the same thread are attached
+    to the trace. Yields the RequestTrace, or None when not sampled.
+    """
+    if sample_rate <= 0 or random.random() >= sample_rate:
+        yield None
+        return
+
+    trace = RequestTrace(name, **fields)
+    _local.trace = trace
+    try:
+        yield trace
+    finally:
+        _local.trace = None
+        trace_logger.info(json.dumps(trace.record(), ensure_ascii=False))
+
+
+REGISTRY = MetricsRegistry()
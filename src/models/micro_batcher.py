@@ -0,0 +1,109 @@
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    Groups concurrent single-query searches into batched calls
+
+    Requests are collected for up to window_ms after the first one arrives,
+    or until max_batch_size are waiting, then run through one search_batch
+    call (one batched encode and one scoring pass). Each caller blocks only
+    on its own result, so the window caps the extra latency of a lone request.
+    """
+
+    def __init__(self, search_batch, window_ms=3.0, max_batch_size=32, metrics=None):
+        """
+        Args:
+            search_batch (callable): search_batch(queries, top_k) -> list of result lists
+            window_ms (float): How long to wait for more requests after the first one
+            max_batch_size (int): Flush as soon as this many requests are waiting
+            metrics (MetricsRegistry): Optional registry for the time requests wait for their batch
+        """
+        self.search_batch = search_batch
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self.metrics = metrics
+        self.batch_sizes = Counter()
+        self.counters = {"requests": 0, "batches": 0, "errors": 0}
+        self.start()
+
+    def start(self):
+        """Start the batching thread; call again in a forked child, which inherits no threads"""
+        self.requests = queue.Queue()
+        self.lock = threading.Lock()
+        self.worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self.worker.start()
+
+    def search(self, query, top_k=5, timeout=None):
+        """Same contract as EnhancedNCOSearch.search, served from a shared batch"""
+        future = Future()
+        self.requests.put((query, top_k, future, time.perf_counter()))
+        return future.result(timeout)
+
+    def close(self):
+        self.requests.put(None)
+        self.worker.join()
+
+    def _run(self):
+        while True:
+            first = self.requests.get()
+            if first is None:
+                return
+
+            batch = [first]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self.requests.put(None)  # Stop after this batch
+                    break
+                batch.append(item)
+
+            self._process(batch)
+
+    def _process(self, batch):
+        # One call at the largest requested top_k, then each caller gets its own slice
+        top_k = max(item[1] for item in batch)
+        if self.metrics is not None:
+            started = time.perf_counter()
+            for item in batch:
+                self.metrics.observe("nco_search_stage_seconds", started - item[3], stage="batch_wait")
+        try:
+            results = self.search_batch([item[0] for item in batch], top_k=top_k)
+        except Exception as e:
+            with self.lock:
+                self.counters["errors"] += len(batch)
+            for _, _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        for (_, request_top_k, future, _), result in zip(batch, results):
+            future.set_result(result[:request_top_k])
+
+        with self.lock:
+            self.counters["requests"] += len(batch)
+            self.counters["batches"] += 1
+            self.batch_sizes[len(batch)] += 1
+
+    def stats(self):
+        """Settings, counters and the observed batch-size histogram"""
+        with self.lock:
+            stats = dict(self.counters)
+            stats.update({
+                "window_ms": self.window * 1000.0,
+                "max_batch_size": self.max_batch_size,
+                "queued": self.requests.qsize(),
+                "mean_batch_size": stats["requests"] / stats["batches"] if stats["batches"] else 0.0,
+                "batch_size_histogram": {str(size): count for size, count in sorted(self.batch_sizes.items())},
+            })
+            return stats
@@ -1,20 +1,32 @@
 from sentence_transformers import SentenceTransformer
-import pickle
-import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+import sys
+import os
+
+# Add the project root to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+
+from src.models.embedding_store import load_embeddings
+from src.models.scoring import QuantizedScoringEngine, ScoringEngine, top_k_indices
 
 class NCOOccupationSearch:
-    def __init__(self, embeddings_file="data/processed/occupation_embeddings.pkl"):
-        # Load pre-trained model
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
+    def __init__(self, embeddings_file="data/processed/occupation_embeddings.npy",
+                 model_name='all-mpnet-base-v2', precision="float32", rescore_size=300, model=None):
+        # Load pre-trained model (must be the one the embeddings were built with), unless one is shared
+        self.model = model if model is not None else SentenceTransformer(model_name)
         
         # Load saved occupation embeddings
         print("Loading NCO occupation embeddings...")
-        with open(embeddings_file, "rb") as f:
-            data = pickle.load(f)
-            self.occupations = data["occupations"]
-            self.embeddings = data["embeddings"]
+        self.embeddings, metadata, self.manifest = load_embeddings(
+            embeddings_file, model_name, self.model.get_sentence_embedding_dimension())
+        self.occupations = metadata["occupations"]
         print(f"Loaded {len(self.occupations)} individual occupations")
+        
+        # float16/int8 keep only a quantized copy resident and rescore the best rows from the store
+        normalized = self.manifest is not None and self.manifest["normalized"]
+        if precision != "float32":
+            self.scorer = QuantizedScoringEngine(self.embeddings, precision, rescore_size, normalized=normalized)
+        else:
+            self.scorer = ScoringEngine(self.embeddings, normalized=normalized)
     
     def search(self, query, top_k=5):
         """
@@ -33,10 +45,10 @@ class NCOOccupationSearch:
         query_embedding = self.model.encode([query])
         
         # Calculate similarities
-        similarities = cosine_similarity(query_embedding, self.embeddings)[0]
+        similarities = self.scorer.max_similarities(query_embedding)
         
         # Get top k results
-        top_indices = np.argsort(similarities)[-top_k:][::-1]  # Descending order
+        top_indices = top_k_indices(similarities, top_k)
         
         results = []
         for idx in top_indices:
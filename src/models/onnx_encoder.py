@@ -0,0 +1,203 @@
+import json
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# Add the project root to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+
+try:
+    import onnxruntime as ort
+except ImportError:  # onnxruntime is only needed for the ONNX backends
+    ort = None
+
+ENCODER_BACKENDS = ("torch", "onnx", "onnx-int8")
+ONNX_DIR = "models/onnx"
+
+
+def export_onnx(model_name, output_dir, quantize=True):
+    """
+    Export a sentence-transformers model's transformer to ONNX
+
+    Writes model.onnx (and model_int8.onnx when quantize is set, using dynamic
+    int8 quantization of the weights), the tokenizer files, and an
+    encoder_config.json with the pooling and normalization settings.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0].auto_model.eval()
+    pooling = st_model[1]
+    if not pooling.pooling_mode_mean_tokens:
+        raise ValueError(f"{model_name} does not use mean pooling, which is all OnnxEncoder implements")
+
+    class TokenEmbeddings(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask)[0]
+
+    sample = st_model.tokenizer(["export sample"], return_tensors="pt")
+    model_path = output_dir / "model.onnx"
+    print(f"Exporting {model_name} to {model_path}...")
+    with torch.no_grad():
+        torch.onnx.export(
+            TokenEmbeddings(transformer),
+            (sample["input_ids"], sample["attention_mask"]),
+            str(model_path),
+            input_names=["input_ids", "attention_mask"],
+            output_names=["token_embeddings"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "token_embeddings": {0: "batch", 1: "sequence"},
+            },
+            opset_version=14,
+        )
+
+    st_model.tokenizer.save_pretrained(str(output_dir))
+    with open(output_dir / "encoder_config.json", "w", encoding="utf-8") as f:
+        json.dump({
+            "model_name": model_name,
+            "dimension": st_model.get_sentence_embedding_dimension(),
+            "max_seq_length": st_model.max_seq_length,
+            "normalize": any(isinstance(module, Normalize) for module in st_model),
+        }, f, indent=2)
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantized_path = output_dir / "model_int8.onnx"
+        print(f"Quantizing to {quantized_path}...")
+        quantize_dynamic(str(model_path), str(quantized_path), weight_type=QuantType.QInt8)
+
+
+class OnnxEncoder:
+    """
+    Drop-in replacement for SentenceTransformer.encode backed by onnxruntime
+
+    Tokenizes with the exported tokenizer, runs the ONNX transformer and
+    applies the same mean pooling and normalization as the original model.
+    The model is exported on first use if it is not already in onnx_dir.
+    """
+
+    def __init__(self, model_name='all-mpnet-base-v2', quantize=True, onnx_dir=ONNX_DIR, threads=None):
+        if ort is None:
+            raise ImportError("onnxruntime is required for the ONNX encoder backend (pip install onnxruntime)")
+        from transformers import AutoTokenizer
+
+        model_dir = Path(onnx_dir) / model_name
+        model_path = model_dir / ("model_int8.onnx" if quantize else "model.onnx")
+        if not model_path.exists():
+            export_onnx(model_name, model_dir, quantize=quantize)
+
+        with open(model_dir / "encoder_config.json", "r", encoding="utf-8") as f:
+            self.config = json.load(f)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(str(model_path), options, providers=["CPUExecutionProvider"])
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+        self.tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+        self.model_name = model_name
+        self.quantized = quantize
+
+    def get_sentence_embedding_dimension(self):
+        return self.config["dimension"]
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=False, normalize_embeddings=None, **kwargs):
+        """Encode one string or a list of strings into float32 embeddings"""
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+
+        # Sort by length so each batch pads as little as possible
+        order = np.argsort([-len(sentence) for sentence in sentences], kind="stable")
+        embeddings = np.empty((len(sentences), self.get_sentence_embedding_dimension()), dtype=np.float32)
+
+        for start in range(0, len(sentences), batch_size):
+            batch_ids = order[start:start + batch_size]
+            tokens = self.tokenizer(
+                [sentences[i] for i in batch_ids], padding=True, truncation=True,
+                max_length=self.config["max_seq_length"], return_tensors="np",
+            )
+            feed = {name: tokens[name].astype(np.int64) for name in self.input_names}
+            token_embeddings = self.session.run(None, feed)[0]
+
+            # Mean pooling over real (unpadded) tokens
+            mask = tokens["attention_mask"][..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            embeddings[batch_ids] = pooled
+
+        normalize = self.config["normalize"] if normalize_embeddings is None else normalize_embeddings
+        if normalize:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+
+        return embeddings[0] if single else embeddings
+
+
+def load_encoder(model_name, backend="torch"):
+    """
+    SentenceTransformer for "torch", OnnxEncoder for "onnx" (fp32) and "onnx-int8"
+
+    NCO_ENCODER_THREADS sets the onnxruntime intra-op threads (default: one per core).
+    """
+    if backend not in ENCODER_BACKENDS:
+        raise ValueError(f"Unknown encoder backend '{backend}', expected one of {ENCODER_BACKENDS}")
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name)
+    threads = int(os.environ.get("NCO_ENCODER_THREADS", 0)) or None
+    return OnnxEncoder(model_name, quantize=backend == "onnx-int8", threads=threads)
+
+
+# Compare the ONNX encoder with the PyTorch one on the enhanced search test queries
+def test_onnx_parity(backend="onnx-int8", top_k=10):
+    from src.models.enhanced_search import EnhancedNCOSearch, TEST_QUERIES
+
+    search_engine = EnhancedNCOSearch(encoder_backend="torch")
+    onnx_encoder = load_encoder(search_engine.model_name, backend)
+
+    queries = TEST_QUERIES + ["senior software engineer", "sewing machine operator", "primary school teacher"]
+    torch_embeddings = search_engine.model.encode(queries)
+    onnx_embeddings = onnx_encoder.encode(queries)
+    cosines = np.sum(torch_embeddings * onnx_embeddings, axis=1) / (
+        np.linalg.norm(torch_embeddings, axis=1) * np.linalg.norm(onnx_embeddings, axis=1))
+
+    # Skip precomputed expansion vectors so every expansion goes through the encoder under test
+    search_engine.expansion_rows = {}
+    torch_results = search_engine.search_batch(queries, top_k=top_k)
+    search_engine.model = onnx_encoder
+    onnx_results = search_engine.search_batch(queries, top_k=top_k)
+
+    print(f"TESTING {backend.upper()} ENCODER PARITY")
+    print("=" * 50)
+    overlaps = []
+    for query, cosine, torch_result, onnx_result in zip(queries, cosines, torch_results, onnx_results):
+        torch_top = [r['full_occupation'] for r in torch_result]
+        onnx_top = [r['full_occupation'] for r in onnx_result]
+        overlap = len(set(torch_top) & set(onnx_top)) / max(len(torch_top), 1)
+        overlaps.append(overlap)
+        same_first = torch_top[:1] == onnx_top[:1]
+        print(f"'{query}': cosine {cosine:.4f}, top-{top_k} overlap {overlap:.0%}, same top-1: {same_first}")
+
+    print("-" * 50)
+    print(f"Mean cosine {np.mean(cosines):.4f} (min {np.min(cosines):.4f}), "
+          f"mean top-{top_k} overlap {np.mean(overlaps):.0%}")
+    return float(np.min(cosines)), float(np.mean(overlaps))
+
+
+if __name__ == "__main__":
+    test_onnx_parity("onnx")
+    test_onnx_parity("onnx-int8")
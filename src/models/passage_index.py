@@ -0,0 +1,99 @@
+"""
+Passage windows over the NCO volumes, for search below the document level
+
+A volume is read in fixed-size blocks and cut into overlapping windows of
+WINDOW_WORDS words, STRIDE_WORDS apart, so each window fits in the encoder's
+input and a phrase that straddles one window boundary is whole in the next.
+Every window is identified by its volume and the byte range it covers, which
+is all the passage store keeps besides the vectors; the text is read back
+from the volume with a seek when it is needed.
+"""
+import re
+from collections import deque
+
+import numpy as np
+
+WINDOW_WORDS = 128  # MiniLM reads at most 256 word pieces, about 128 words of the extracted text
+STRIDE_WORDS = 96  # Consecutive windows share 32 words
+READ_BLOCK_SIZE = 1 << 16
+
+WORD = re.compile(rb"\S+")
+TRAILING_WORD = re.compile(rb"\S*\Z")
+
+
+def iter_words(path, block_size=READ_BLOCK_SIZE):
+    """(byte offset, word) for every whitespace-separated word of a file, read block by block"""
+    with open(path, "rb") as f:
+        position = 0  # File offset of buffer[0]
+        buffer = b""
+        while True:
+            block = f.read(block_size)
+            buffer += block
+            # A word cut by the block boundary waits for the next block
+            cut = TRAILING_WORD.search(buffer).start() if block else len(buffer)
+            for match in WORD.finditer(buffer, 0, cut):
+                yield position + match.start(), match.group()
+            buffer = buffer[cut:]
+            position += cut
+            if not block:
+                break
+
+
+def sliding_windows(path, window=WINDOW_WORDS, stride=STRIDE_WORDS, block_size=READ_BLOCK_SIZE):
+    """
+    Overlapping word windows of a file, streamed
+
+    Memory holds one read block and one window whatever the file size. The
+    last window ends at the last word, so every word is in at least one window.
+
+    Yields:
+        tuple: (byte offset, byte length, text) of each window
+    """
+    if not 0 < stride <= window:
+        raise ValueError(f"stride must be between 1 and window ({window}), got {stride}")
+    words = deque()
+    new_words = 0
+    for offset, word in iter_words(path, block_size):
+        words.append((offset, word))
+        new_words += 1
+        if len(words) == window:
+            yield _window(words)
+            for _ in range(stride):
+                words.popleft()
+            new_words = 0
+    if new_words:
+        yield _window(words)
+
+
+def _window(words):
+    start = words[0][0]
+    end = words[-1][0] + len(words[-1][1])
+    return start, end - start, b" ".join(word for _, word in words).decode("utf-8", errors="replace")
+
+
+def read_passage(path, offset, length):
+    """Text of one passage, read directly from its volume"""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return " ".join(f.read(length).decode("utf-8", errors="replace").split())
+
+
+def best_passages_per_document(scores, passage_files, top_k=5, per_document=3):
+    """
+    Aggregate passage scores to documents
+
+    A document scores as its best passage. Returns up to top_k documents,
+    best first, as (file id, score, [passage rows, best first]) with at most
+    per_document rows each.
+    """
+    order = np.argsort(-scores, kind="stable")
+    documents = {}
+    for row in order:
+        file_id = int(passage_files[row])
+        hits = documents.setdefault(file_id, [])
+        if len(hits) < per_document:
+            hits.append(int(row))
+        if len(documents) >= top_k and all(len(h) >= per_document for h in documents.values()):
+            break
+    ranked = sorted(documents.items(), key=lambda item: -scores[item[1][0]])[:top_k]
+    return [(file_id, float(scores[rows[0]]), rows) for file_id, rows in ranked]
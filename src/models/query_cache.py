@@ -0,0 +1,187 @@
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+WRITE_BATCH = 64  # Pending sqlite writes that trigger a commit
+WRITE_INTERVAL = 1.0  # Seconds after which pending sqlite writes are committed anyway
+
+
+def normalize_query(text):
+    """Cache key text: lowercased with collapsed whitespace (both encoders are uncased)"""
+    return " ".join(text.lower().split())
+
+
+class QueryEmbeddingCache:
+    """
+    Thread-safe LRU cache of query embeddings keyed by (model name, normalized query)
+
+    Entries are evicted least-recently-used first once either max_entries or
+    max_bytes is exceeded, and ignored after ttl seconds if a ttl is set.
+    With db_path, every entry is also written to a sqlite file, so a restarted
+    worker (or another process such as the Streamlit app) starts warm. Writes
+    are queued and committed in batches, and sqlite is only touched outside the
+    lock that guards the in-memory entries, so lookups never wait for the disk.
+    """
+
+    def __init__(self, max_entries=10000, max_bytes=64 * 1024 * 1024, ttl=None, db_path=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.counters = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+        self.db = None
+        self.db_path = db_path
+        self.db_lock = threading.Lock()  # Serializes use of the connection; taken before self.lock, never inside it
+        self.pending = []  # Rows waiting to be written
+        self.last_flush = time.time()
+        if db_path is not None:
+            self.reopen()
+            atexit.register(self.flush)
+
+    def reopen(self):
+        """(Re)connect the sqlite store; a forked child must not use the parent's connection"""
+        if self.db_path is None:
+            return
+        self.db_lock = threading.Lock()  # A lock held by another thread at fork time is never released
+        self.db = sqlite3.connect(self.db_path, check_same_thread=False)
+        # WAL lets workers read while another one writes, and syncs on checkpoints rather than every commit
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS query_embeddings ("
+            "model TEXT, query TEXT, vector BLOB, created REAL, PRIMARY KEY (model, query))"
+        )
+        if self.ttl is not None:
+            self.db.execute("DELETE FROM query_embeddings WHERE created < ?", (time.time() - self.ttl,))
+        self.db.commit()
+
+    def flush(self):
+        """Commit the queued sqlite writes"""
+        if self.db is None:
+            return
+        with self.db_lock:
+            with self.lock:
+                rows, self.pending = self.pending, []
+                self.last_flush = time.time()
+            if rows:
+                self.db.executemany("INSERT OR REPLACE INTO query_embeddings VALUES (?, ?, ?, ?)", rows)
+                self.db.commit()
+
+    def _expired(self, created):
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def _store(self, key, vector, created):
+        if key in self.entries:
+            self.bytes -= self.entries.pop(key)[0].nbytes
+        self.entries[key] = (vector, created)
+        self.bytes += vector.nbytes
+
+        while self.entries and (len(self.entries) > self.max_entries or self.bytes > self.max_bytes):
+            _, (evicted, _) = self.entries.popitem(last=False)
+            self.bytes -= evicted.nbytes
+            self.counters["evictions"] += 1
+
+    def get(self, model_name, query):
+        """Cached embedding for the query, or None"""
+        key = (model_name, normalize_query(query))
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                vector, created = entry
+                if not self._expired(created):
+                    self.entries.move_to_end(key)
+                    self.counters["hits"] += 1
+                    return vector
+                self.bytes -= self.entries.pop(key)[0].nbytes
+                self.counters["expirations"] += 1
+            if self.db is None:
+                self.counters["misses"] += 1
+                return None
+
+        with self.db_lock:
+            row = self.db.execute(
+                "SELECT vector, created FROM query_embeddings WHERE model = ? AND query = ?", key
+            ).fetchone()
+        with self.lock:
+            if row is not None and not self._expired(row[1]):
+                vector = np.frombuffer(row[0], dtype=np.float32)
+                self._store(key, vector, row[1])
+                self.counters["disk_hits"] += 1
+                return vector
+            self.counters["misses"] += 1
+            return None
+
+    def put(self, model_name, query, vector):
+        """Add an embedding to the cache (and the sqlite store, if any)"""
+        key = (model_name, normalize_query(query))
+        vector = np.array(vector, dtype=np.float32).ravel()
+        created = time.time()
+        with self.lock:
+            self._store(key, vector, created)
+            if self.db is None:
+                return
+            self.pending.append((key[0], key[1], vector.tobytes(), created))
+            due = len(self.pending) >= WRITE_BATCH or created - self.last_flush >= WRITE_INTERVAL
+        if due:
+            self.flush()
+
+    def clear(self):
+        """Drop every entry, in memory and in the sqlite store"""
+        if self.db is not None:
+            with self.db_lock:
+                with self.lock:
+                    self.pending = []
+                self.db.execute("DELETE FROM query_embeddings")
+                self.db.commit()
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        """Counters plus current size, for the /cache/stats endpoint and the Streamlit sidebar"""
+        with self.lock:
+            lookups = self.counters["hits"] + self.counters["disk_hits"] + self.counters["misses"]
+            stats = dict(self.counters)
+            stats.update({
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hit_rate": (self.counters["hits"] + self.counters["disk_hits"]) / lookups if lookups else 0.0,
+            })
+            return stats
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_shared_cache():
+    """
+    Process-wide cache configured from the environment
+
+    NCO_QUERY_CACHE_SIZE  maximum number of entries (default 10000)
+    NCO_QUERY_CACHE_MB    maximum size in megabytes (default 64)
+    NCO_QUERY_CACHE_TTL   seconds before an entry expires (default: never)
+    NCO_QUERY_CACHE_DB    sqlite file shared by workers and restarts (default: memory only)
+    """
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            ttl = os.environ.get("NCO_QUERY_CACHE_TTL")
+            _shared_cache = QueryEmbeddingCache(
+                max_entries=int(os.environ.get("NCO_QUERY_CACHE_SIZE", 10000)),
+                max_bytes=int(float(os.environ.get("NCO_QUERY_CACHE_MB", 64)) * 1024 * 1024),
+                ttl=float(ttl) if ttl else None,
+                db_path=os.environ.get("NCO_QUERY_CACHE_DB") or None,
+            )
+        return _shared_cache
@@ -0,0 +1,182 @@
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# Add the project root to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+
+from src.models.query_cache import normalize_query
+
+
+class SemanticResultCache:
+    """
+    Thread-safe LRU cache of search results, matched by query text or by embedding
+
+    A lookup first tries the normalized query text. Failing that, the raw
+    query embedding is compared with the embeddings of every cached query (a
+    flat inner-product scan over a preallocated matrix, which is fast at these
+    sizes), and the nearest entry's results are returned if its cosine
+    similarity is at least threshold. Raising the threshold trades hit rate
+    for accuracy; 1.0 effectively limits the cache to exact repeats.
+
+    Cached results belong to one version of the occupation index (the store's
+    content hash), and everything is dropped when validate() sees a new one.
+    """
+
+    def __init__(self, max_entries=2048, threshold=0.95, ttl=None):
+        """
+        Args:
+            max_entries (int): Cached queries, least recently used evicted first
+            threshold (float): Minimum cosine similarity for a near-duplicate hit
+            ttl (float): Seconds before an entry expires, None for never
+        """
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.version = None
+        self.entries = OrderedDict()  # normalized query -> (slot, top_k, results, created)
+        self.vectors = None  # Allocated on the first put, once the dimension is known
+        self.active = np.zeros(max_entries, dtype=bool)
+        self.slot_keys = [None] * max_entries
+        self.free_slots = list(range(max_entries - 1, -1, -1))
+        self.counters = {"hits": 0, "similar_hits": 0, "misses": 0, "evictions": 0,
+                         "expirations": 0, "invalidations": 0}
+
+    @staticmethod
+    def _check_top_k(top_k):
+        if top_k < 1:
+            raise ValueError(f"top_k must be at least 1, got {top_k}")
+
+    def _expired(self, created):
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def _remove(self, key):
+        slot = self.entries.pop(key)[0]
+        self.active[slot] = False
+        self.slot_keys[slot] = None
+        self.free_slots.append(slot)
+
+    def _clear(self):
+        self.entries.clear()
+        self.active[:] = False
+        self.slot_keys = [None] * self.max_entries
+        self.free_slots = list(range(self.max_entries - 1, -1, -1))
+
+    def validate(self, version):
+        """Drop every entry if the occupation index changed since they were cached"""
+        with self.lock:
+            if version != self.version:
+                if self.entries:
+                    self.counters["invalidations"] += 1
+                self._clear()
+                self.version = version
+
+    def get(self, query, top_k):
+        """Cached results for the same normalized query text, or None"""
+        self._check_top_k(top_k)
+        key = normalize_query(query)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[1] < top_k:
+                return None
+            if self._expired(entry[3]):
+                self._remove(key)
+                self.counters["expirations"] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return entry[2][:top_k]
+
+    def get_similar(self, vector, top_k):
+        """Cached results of the nearest earlier query embedding above the threshold, or None"""
+        self._check_top_k(top_k)
+        with self.lock:
+            if self.vectors is None or not self.entries:
+                self.counters["misses"] += 1
+                return None
+
+            vector = np.asarray(vector, dtype=np.float32).ravel()
+            scores = self.vectors @ (vector / max(np.linalg.norm(vector), 1e-12))
+            scores[~self.active] = -np.inf
+            slot = int(np.argmax(scores))
+            key = self.slot_keys[slot]
+            entry = self.entries.get(key) if key is not None else None
+
+            if entry is None or scores[slot] < self.threshold or entry[1] < top_k:
+                self.counters["misses"] += 1
+                return None
+            if self._expired(entry[3]):
+                self._remove(key)
+                self.counters["expirations"] += 1
+                self.counters["misses"] += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.counters["similar_hits"] += 1
+            return entry[2][:top_k]
+
+    def put(self, query, vector, results, top_k):
+        """Cache the top_k results of a query together with its raw embedding"""
+        self._check_top_k(top_k)
+        key = normalize_query(query)
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        with self.lock:
+            if self.vectors is None:
+                self.vectors = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+            if key in self.entries:
+                self._remove(key)
+            while not self.free_slots:
+                self._remove(next(iter(self.entries)))
+                self.counters["evictions"] += 1
+
+            slot = self.free_slots.pop()
+            self.vectors[slot] = vector / max(np.linalg.norm(vector), 1e-12)
+            self.active[slot] = True
+            self.slot_keys[slot] = key
+            self.entries[key] = (slot, top_k, list(results), time.time())
+
+    def clear(self):
+        with self.lock:
+            self._clear()
+
+    def stats(self):
+        """Counters plus current size, for the /cache/stats endpoint"""
+        with self.lock:
+            lookups = self.counters["hits"] + self.counters["similar_hits"] + self.counters["misses"]
+            stats = dict(self.counters)
+            stats.update({
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "ttl": self.ttl,
+                "version": self.version,
+                "hit_rate": (self.counters["hits"] + self.counters["similar_hits"]) / lookups if lookups else 0.0,
+            })
+            return stats
+
+
+def result_cache_from_env():
+    """
+    Result cache configured from the environment, or None when disabled
+
+    Off unless NCO_RESULT_CACHE_SIZE is set: a near-duplicate hit answers a query with
+    another query's results, which has to be a deliberate choice.
+
+    NCO_RESULT_CACHE_SIZE       maximum number of cached queries (default 0, disabled)
+    NCO_RESULT_CACHE_THRESHOLD  cosine similarity for a near-duplicate hit (default 0.95)
+    NCO_RESULT_CACHE_TTL        seconds before an entry expires (default: never)
+    """
+    size = int(os.environ.get("NCO_RESULT_CACHE_SIZE", 0))
+    if size <= 0:
+        return None
+    ttl = os.environ.get("NCO_RESULT_CACHE_TTL")
+    return SemanticResultCache(
+        max_entries=size,
+        threshold=float(os.environ.get("NCO_RESULT_CACHE_THRESHOLD", 0.95)),
+        ttl=float(ttl) if ttl else None,
+    )
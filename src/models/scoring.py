@@ -0,0 +1,201 @@
+import numpy as np
+
+PRECISIONS = ("float32", "float16", "int8")
+
+
+def normalize_rows(matrix):
+    """Return a contiguous float32 copy of matrix with L2-normalized rows"""
+    matrix = np.array(matrix, dtype=np.float32, order="C", ndmin=2)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def top_k_indices(scores, k):
+    """Indices of the k highest scores, best first, without sorting every score"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        top = np.argpartition(scores, len(scores) - k)[-k:]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+class ScoringEngine:
+    """
+    Cosine scoring of query vectors against a fixed corpus
+
+    The corpus is normalized once, so cosine similarity becomes a single
+    matrix product per call no matter how many query vectors there are.
+    Pass normalized=True for an already normalized float32 matrix (such as a
+    memory-mapped embedding store) to use it as-is without a private copy.
+    """
+
+    def __init__(self, embeddings, normalized=False):
+        if normalized and embeddings.dtype == np.float32 and embeddings.flags.c_contiguous:
+            self.embeddings = embeddings
+        else:
+            self.embeddings = normalize_rows(embeddings)
+
+    def max_similarities(self, query_embeddings, rows=None):
+        """
+        Best cosine similarity of each corpus row over all query vectors
+
+        Args:
+            query_embeddings (np.ndarray): One or more query vectors
+            rows (np.ndarray): Optional subset of corpus rows to score
+
+        Returns:
+            np.ndarray: One score per corpus row (or per entry of rows)
+        """
+        queries = normalize_rows(query_embeddings)
+        corpus = self.embeddings if rows is None else self.embeddings[rows]
+        scores = queries @ corpus.T
+
+        # Reduce over the query axis in place, reusing the first row as output
+        best = scores[0]
+        for row in scores[1:]:
+            np.maximum(best, row, out=best)
+        return best
+
+    def max_similarities_batch(self, query_embeddings, offsets):
+        """
+        max_similarities for many queries with one matrix product
+
+        Args:
+            query_embeddings (np.ndarray): Expansion vectors of all queries, stacked
+            offsets (np.ndarray): Row where each query's expansions start
+
+        Returns:
+            np.ndarray: One row of corpus scores per query
+        """
+        queries = normalize_rows(query_embeddings)
+        scores = queries @ self.embeddings.T
+        return np.maximum.reduceat(scores, offsets, axis=0)
+
+
+def quantize(embeddings, precision):
+    """
+    Compact copy of a normalized embedding matrix
+
+    float16 is a plain cast. int8 is symmetric scalar quantization with one
+    scale per dimension, so row i is approximately codes[i] * scale.
+
+    Returns:
+        tuple: (quantized matrix, per-dimension scale or None)
+    """
+    if precision == "float16":
+        return np.ascontiguousarray(embeddings, dtype=np.float16), None
+    if precision == "int8":
+        scale = np.abs(embeddings).max(axis=0).astype(np.float32) / 127.0
+        scale[scale == 0] = 1.0
+        codes = np.clip(np.rint(embeddings / scale), -127, 127).astype(np.int8)
+        return np.ascontiguousarray(codes), scale
+    raise ValueError(f"Unknown precision '{precision}', expected one of {PRECISIONS}")
+
+
+class QuantizedScoringEngine(ScoringEngine):
+    """
+    Two-pass scoring: a quantized first pass, then exact rescoring of the best rows
+
+    Only the float16 or int8 copy is scanned per query. The full precision
+    matrix, typically a read-only memory map of the embedding store, is read
+    just for the rescore_size best first-pass rows, so most of it never has to
+    be resident. Rows outside that set keep their first-pass scores.
+    """
+
+    def __init__(self, embeddings, precision="int8", rescore_size=300, normalized=False, block_rows=1024):
+        """
+        Args:
+            embeddings (np.ndarray): Full precision corpus, kept as-is when already normalized float32
+            precision (str): "float16" or "int8"
+            rescore_size (int): First-pass rows per query rescored at full precision
+            normalized (bool): embeddings rows are already L2-normalized
+            block_rows (int): Rows dequantized at a time in the first pass
+        """
+        super().__init__(embeddings, normalized=normalized)
+        self.precision = precision
+        self.quantized, self.scale = quantize(self.embeddings, precision)
+        self.rescore_size = rescore_size
+        self.block_rows = block_rows
+
+    def approximate_scores(self, queries, rows=None):
+        """Scores of normalized query vectors against the quantized corpus (queries x rows)"""
+        # Fold the int8 scales into the queries, so each block only needs a cast
+        if self.scale is not None:
+            queries = queries * self.scale
+        corpus = self.quantized if rows is None else self.quantized[rows]
+        scores = np.empty((len(queries), len(corpus)), dtype=np.float32)
+        for start in range(0, len(corpus), self.block_rows):
+            block = corpus[start:start + self.block_rows].astype(np.float32)
+            scores[:, start:start + self.block_rows] = queries @ block.T
+        return scores
+
+    def rescore(self, queries, best, rows=None):
+        """Replace the top rescore_size first-pass scores in best with exact ones"""
+        top = top_k_indices(best, self.rescore_size)
+        corpus_rows = top if rows is None else rows[top]
+        exact = queries @ self.embeddings[np.sort(corpus_rows)].T
+        order = np.argsort(corpus_rows)
+        best[top[order]] = exact.max(axis=0)
+        return best
+
+    def max_similarities(self, query_embeddings, rows=None):
+        queries = normalize_rows(query_embeddings)
+        best = self.approximate_scores(queries, rows).max(axis=0)
+        return self.rescore(queries, best, rows)
+
+    def max_similarities_batch(self, query_embeddings, offsets):
+        queries = normalize_rows(query_embeddings)
+        scores = np.maximum.reduceat(self.approximate_scores(queries), offsets, axis=0)
+        ends = list(offsets[1:]) + [len(queries)]
+        for row, begin, end in zip(scores, offsets, ends):
+            self.rescore(queries[begin:end], row)
+        return scores
+
+    def memory_bytes(self):
+        """Bytes of the in-memory quantized copy"""
+        return self.quantized.nbytes + (self.scale.nbytes if self.scale is not None else 0)
+
+
+def evaluate_precisions(embeddings, queries, k=10, rescore_sizes=(0, 100, 300)):
+    """Print recall@k against float32 scoring for each precision and rescore depth"""
+    exact = ScoringEngine(embeddings)
+    exact_top = [set(top_k_indices(exact.max_similarities(query), k)) for query in queries]
+    results = []
+
+    for precision in PRECISIONS[1:]:
+        for rescore_size in rescore_sizes:
+            engine = QuantizedScoringEngine(exact.embeddings, precision, rescore_size, normalized=True)
+            hits = sum(
+                len(expected & set(top_k_indices(engine.max_similarities(query), k)))
+                for query, expected in zip(queries, exact_top)
+            )
+            results.append((precision, rescore_size, hits / (k * len(queries)), engine.memory_bytes()))
+
+    print(f"Recall@{k} against float32 scoring ({len(queries)} queries, "
+          f"float32 matrix {exact.embeddings.nbytes / 1e6:.1f} MB)")
+    print("-" * 50)
+    for precision, rescore_size, recall, nbytes in results:
+        print(f"{precision:8} rescore={rescore_size:<5} {recall:.3f}  ({nbytes / 1e6:.1f} MB)")
+    return results
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+
+    # Add the project root to Python path
+    sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+    from src.models.embedding_store import load_store
+
+    embeddings, _, _ = load_store("data/processed/occupation_embeddings", mmap=False)
+
+    # Use a sample of catalogue rows, nudged off their exact positions, as queries
+    rng = np.random.default_rng(0)
+    sample = rng.choice(len(embeddings), size=min(200, len(embeddings)), replace=False)
+    queries = embeddings[sample] + rng.normal(0, 0.02, size=embeddings[sample].shape).astype(np.float32)
+    evaluate_precisions(embeddings, queries, k=10)
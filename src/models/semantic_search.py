@@ -1,20 +1,95 @@
 from sentence_transformers import SentenceTransformer
-import pickle
 import numpy as np
 from sklearn.metrics.pairwise import cosine_similarity
+import sys
+import os
+
+# Add the project root to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+
+from src.models.embedding_store import EmbeddingStoreError, load_embeddings, store_paths
+from src.models.passage_index import best_passages_per_document, read_passage
 
 class NCOSemanticSearch:
-    def __init__(self, embeddings_file="data/processed/nco_embeddings.pkl"):
-        # Load pre-trained model
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
+    def __init__(self, embeddings_file="data/processed/nco_embeddings.npy",
+                 model_name='all-MiniLM-L6-v2', model=None,
+                 passages_file="data/processed/nco_passages.npy", passages_per_document=3):
+        """
+        Args:
+            embeddings_file (str): Store with one vector per document
+            model_name (str): Query encoder, must match the one recorded in the stores
+            model: Already loaded encoder for model_name, e.g. shared through engine_registry.py
+            passages_file (str): Passage store from create_embeddings.py, used instead of the
+                document vectors when it exists (None to always rank whole documents)
+            passages_per_document (int): Matching passage locations returned per document
+        """
+        # Load pre-trained model, unless one is shared
+        self.model = model if model is not None else SentenceTransformer(model_name)
         
         # Load saved embeddings
         print("Loading NCO embeddings...")
-        with open(embeddings_file, "rb") as f:
-            data = pickle.load(f)
-            self.files = data["files"]
-            self.embeddings = data["embeddings"]
+        self.embeddings, metadata, self.manifest = load_embeddings(
+            embeddings_file, model_name, self.model.get_sentence_embedding_dimension())
+        self.files = metadata["files"]
         print(f"Loaded {len(self.files)} NCO documents")
+        
+        # Passage windows: a volume is found by its best passage, which also says where to look in it
+        self.passage_embeddings = None
+        self.passages_per_document = passages_per_document
+        if passages_file is not None and store_paths(passages_file)["manifest"].exists():
+            self.passage_embeddings, metadata, _ = load_embeddings(
+                passages_file, model_name, self.model.get_sentence_embedding_dimension())
+            self.passage_documents = metadata["files"]
+            self.passage_files = np.asarray(metadata["passage_files"], dtype=np.int32)
+            self.passage_offsets = np.asarray(metadata["offsets"], dtype=np.int64)
+            self.passage_lengths = np.asarray(metadata["lengths"], dtype=np.int32)
+            self.passage_document_files = self.document_files_for(self.passage_documents)
+            print(f"Loaded {len(self.passage_offsets)} passages")
+    
+    def document_files_for(self, passage_documents):
+        """
+        Document store file of each passage volume, so results name the same file in both modes
+        
+        Passages are cut from data/raw/<volume>.txt, documents are data/processed/<volume>_tokens.txt.
+        """
+        def basename(path):
+            return path.replace('\\', '/').split('/')[-1]
+        
+        documents = {basename(f).replace('_tokens.txt', '.txt'): f for f in self.files}
+        missing = [f for f in passage_documents if basename(f) not in documents]
+        if missing:
+            raise EmbeddingStoreError(
+                f"Passage volumes {missing} are not in the document store, rebuild both with create_embeddings.py")
+        return [documents[basename(f)] for f in passage_documents]
+    
+    def passage(self, row, score):
+        """One passage hit with its location and text"""
+        file = self.passage_documents[self.passage_files[row]]
+        offset, length = int(self.passage_offsets[row]), int(self.passage_lengths[row])
+        return {
+            'file': file,
+            'offset': offset,
+            'length': length,
+            'confidence': float(score),
+            'text': read_passage(file, offset, length)
+        }
+    
+    def search_passages(self, query, top_k=10):
+        """
+        Best passages across all volumes
+        
+        Returns:
+            list: Passages with file, byte offset and length in it, confidence and text
+        
+        Raises:
+            ValueError: When no passage store was loaded
+        """
+        if self.passage_embeddings is None:
+            raise ValueError("No passage store loaded, build one with create_embeddings.py")
+        query_embedding = self.model.encode([query])[0]
+        scores = self.passage_embeddings @ (query_embedding / np.linalg.norm(query_embedding))
+        top_indices = np.argsort(-scores, kind="stable")[:top_k]
+        return [self.passage(row, scores[row]) for row in top_indices]
     
     def search(self, query, top_k=5):
         """
@@ -25,13 +100,31 @@ class NCOSemanticSearch:
             top_k (int): Number of top matches to return
             
         Returns:
-            list: Top matches with filenames and similarity scores
+            list: Top matches with document filenames and similarity scores, plus
+                the passage_file and best passages in it when a passage store is loaded
         """
         print(f"Searching for: '{query}'")
         
         # Convert query to embedding
         query_embedding = self.model.encode([query])
         
+        if self.passage_embeddings is not None:
+            # Stored passage vectors are normalized, so the dot product is the cosine
+            scores = self.passage_embeddings @ (query_embedding[0] / np.linalg.norm(query_embedding[0]))
+            results = []
+            for file_id, score, rows in best_passages_per_document(
+                    scores, self.passage_files, top_k, self.passages_per_document):
+                passages = [self.passage(row, scores[row]) for row in rows]
+                results.append({
+                    'file': self.passage_document_files[file_id],
+                    'passage_file': self.passage_documents[file_id],
+                    'confidence': score,
+                    'confidence_percent': round(score * 100, 2),
+                    'offset': passages[0]['offset'],
+                    'passages': passages
+                })
+            return results
+        
         # Calculate similarities
         similarities = cosine_similarity(query_embedding, self.embeddings)[0]
         
@@ -75,6 +168,9 @@ def test_search():
             filename = result['file'].split('\\')[-1]  # Get just filename
             confidence = result['confidence_percent']
             print(f"{i}. {filename} ({confidence}% match)")
+            if 'passages' in result:
+                best = result['passages'][0]
+                print(f"   {result['passage_file']} at byte {best['offset']}: {best['text'][:100]}...")
 
 if __name__ == "__main__":
     test_search()
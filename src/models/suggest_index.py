@@ -0,0 +1,293 @@
+"""
+Typeahead suggestions over occupation titles, NCO codes and the synonym vocabulary
+
+Every suggestion is indexed under each of its word suffixes ("software
+developer" also under "developer") plus its code, in one sorted array, so
+the suggestions for a prefix are a contiguous slice found with two bisects.
+Within the slice they are ranked by a precomputed prior (kind, catalogue
+coverage and, if given, query popularity), with a bonus for matching at the
+start of the title. When a prefix matches too little, each query word is
+corrected to the closest vocabulary word by edit distance, computed for the
+whole vocabulary at once with numpy, and the corrected prefix is looked up
+the same way. Nothing here touches the encoder.
+"""
+import json
+import math
+import os
+import re
+import sys
+import time
+from bisect import bisect_left
+from collections import Counter
+
+import numpy as np
+
+# Add the project root to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+
+ENTRIES_FILE = "data/interim/nco_entries.jsonl"
+
+# Words and numbers, keeping dotted codes like 2512.0501 whole
+WORD_PATTERN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+
+# Base prior per kind: synonyms are curated common queries, families are broad
+KIND_PRIORS = {"synonym": 0.3, "family": 0.2, "occupation": 0.0}
+START_BONUS = 1.0  # Query matches from the first word of the suggestion
+EXACT_BONUS = 0.5  # Query is the whole suggestion
+FUZZY_PENALTY = 1.0  # Per edit on a corrected query
+MAX_FUZZY_ALTERNATIVES = 3  # Corrections of the last (partial) word tried per query
+
+
+def normalize(text):
+    """Lowercased words of a text joined by single spaces, the form every key and query is compared in"""
+    return " ".join(WORD_PATTERN.findall(text.lower()))
+
+
+def max_edits(token):
+    """Edits allowed when correcting a word: none for short words and numbers, then 1, then 2"""
+    if len(token) < 3 or token[0].isdigit():
+        return 0
+    return 1 if len(token) < 6 else 2
+
+
+def load_popularity(path):
+    """
+    Query counts for priors, by normalized text
+
+    Reads a JSON object {text or code: count}, or JSON lines with a "query"
+    field, such as the API trace log (NCO_TRACE_LOG) or a labelled query set.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read()
+    try:
+        counts = json.loads(content)
+        if isinstance(counts, dict):
+            return {normalize(text): float(count) for text, count in counts.items()}
+    except ValueError:
+        pass
+    queries = Counter()
+    for line in content.splitlines():
+        if line.strip():
+            query = json.loads(line).get("query")
+            if query:
+                queries[normalize(query)] += 1
+    return dict(queries)
+
+
+class SuggestIndex:
+    """
+    Prefix and fuzzy suggestions from a sorted key array
+
+    Example:
+        index = SuggestIndex.from_catalogue(synonyms=SYNONYMS)
+        index.suggest("softw", limit=5)   # Prefix matches
+        index.suggest("elektric")         # Fuzzy, corrected to "electric"
+        index.suggest("2512")             # Occupations in family 2512
+    """
+
+    def __init__(self, suggestions, popularity=None):
+        """
+        Args:
+            suggestions (list): {"text", "kind", "code", "volumes"} dicts, code and volumes optional
+            popularity (dict): {normalized text or code: count}, see load_popularity
+        """
+        popularity = popularity or {}
+        self.suggestions = []
+        seen = set()
+        for suggestion in suggestions:
+            key = (normalize(suggestion["text"]), suggestion.get("code"))
+            if key[0] and key not in seen:
+                seen.add(key)
+                self.suggestions.append(suggestion)
+
+        # Priors: kind, occupations described in more volumes, popularity, then shorter texts first
+        priors = np.zeros(len(self.suggestions), dtype=np.float32)
+        keys = []
+        for i, suggestion in enumerate(self.suggestions):
+            text = normalize(suggestion["text"])
+            words = text.split(" ")
+            count = popularity.get(text, 0) + popularity.get(suggestion.get("code") or "", 0)
+            priors[i] = (KIND_PRIORS.get(suggestion["kind"], 0.0)
+                         + 0.1 * max(len(suggestion.get("volumes") or ()) - 1, 0)
+                         + math.log1p(count)
+                         - 0.01 * len(words))
+            keys.extend((" ".join(words[start:]), i, start == 0) for start in range(len(words)))
+            if suggestion.get("code"):
+                keys.append((suggestion["code"], i, True))
+        self.priors = priors
+
+        keys.sort()
+        self.keys = [key for key, _, _ in keys]
+        self.key_rows = np.array([row for _, row, _ in keys], dtype=np.int32)
+        self.key_bonus = np.array([START_BONUS if start else 0.0 for _, _, start in keys], dtype=np.float32)
+
+        # Vocabulary for corrections, as a padded character matrix
+        word_counts = Counter(word for key, _, start in keys if start for word in key.split(" "))
+        self.words = sorted(word for word in word_counts if not word[0].isdigit())
+        self.word_counts = np.array([word_counts[word] for word in self.words], dtype=np.int32)
+        self.word_lengths = np.array([len(word) for word in self.words], dtype=np.int32)
+        width = int(self.word_lengths.max()) if self.words else 0
+        self.word_chars = np.full((len(self.words), width), -1, dtype=np.int32)
+        for i, word in enumerate(self.words):
+            self.word_chars[i, :len(word)] = [ord(c) for c in word]
+        self.word_set = set(self.words)
+
+    @classmethod
+    def from_catalogue(cls, entries_file=ENTRIES_FILE, synonyms=None, popularity=None):
+        """
+        Index occupation titles and codes, family titles and synonym phrases
+
+        Args:
+            entries_file (str): Structured catalogue written by extract_occupations.py
+            synonyms (dict): {phrase: [synonyms, ...]}, e.g. EnhancedNCOSearch.synonyms
+            popularity (dict): {normalized text or code: count}, see load_popularity
+        """
+        suggestions = []
+        families = {}
+        with open(entries_file, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                suggestions.append({"text": entry["title"], "kind": "occupation", "code": entry["code"],
+                                    "volumes": entry.get("volumes", [])})
+                family = (entry.get("hierarchy") or {}).get("family") or {}
+                if family.get("title"):
+                    families[family["code"]] = family["title"]
+        suggestions.extend({"text": title, "kind": "family", "code": code} for code, title in sorted(families.items()))
+        for phrase, alternatives in (synonyms or {}).items():
+            suggestions.extend({"text": text, "kind": "synonym", "code": None} for text in [phrase] + list(alternatives))
+        return cls(suggestions, popularity)
+
+    def prefix_range(self, prefix):
+        """Slice of self.keys starting with prefix"""
+        return bisect_left(self.keys, prefix), bisect_left(self.keys, prefix + "￿")
+
+    def edit_distances(self, token, prefix):
+        """
+        Levenshtein distance from token to every vocabulary word (prefix=False),
+        or to the closest prefix of each word (prefix=True), with the prefix length
+        """
+        limit = len(token) + max_edits(token)
+        chars = self.word_chars[:, :limit]
+        width = chars.shape[1]
+        previous = np.tile(np.arange(width + 1, dtype=np.int32), (len(self.words), 1))
+        for i, c in enumerate(token, 1):
+            current = np.empty_like(previous)
+            current[:, 0] = i
+            substitute = np.minimum(previous[:, :-1] + (chars != ord(c)), previous[:, 1:] + 1)
+            for j in range(1, width + 1):
+                current[:, j] = np.minimum(substitute[:, j - 1], current[:, j - 1] + 1)
+            previous = current
+
+        # Columns past a word's end are padding
+        columns = np.arange(width + 1)
+        previous[columns[None, :] > self.word_lengths[:, None]] = np.iinfo(np.int32).max
+        if prefix:
+            lengths = previous.argmin(axis=1)
+            return previous[np.arange(len(self.words)), lengths], lengths
+        ends = self.word_lengths.clip(max=width)
+        distances = previous[np.arange(len(self.words)), ends]
+        distances[self.word_lengths > width] = np.iinfo(np.int32).max
+        return distances, self.word_lengths
+
+    def corrections(self, query):
+        """
+        Corrected versions of a query that has no prefix match, as (query, edits) pairs
+
+        Complete words are replaced by the closest vocabulary word, the last
+        (possibly partial) word by the closest word prefix; ties go to the more
+        frequent word.
+        """
+        tokens = query.split(" ")
+        fixed, edits = [], 0
+        for token in tokens[:-1]:
+            if token in self.word_set or not max_edits(token):
+                fixed.append(token)
+                continue
+            distances, _ = self.edit_distances(token, prefix=False)
+            best = int(np.lexsort((-self.word_counts, distances))[0])
+            if distances[best] > max_edits(token):
+                return []
+            fixed.append(self.words[best])
+            edits += int(distances[best])
+
+        last = tokens[-1]
+        if not max_edits(last):
+            return [(" ".join(fixed + [last]), edits)] if edits else []
+        distances, lengths = self.edit_distances(last, prefix=True)
+        alternatives = []
+        for i in np.lexsort((-self.word_counts, distances)):
+            if distances[i] > max_edits(last) or len(alternatives) >= MAX_FUZZY_ALTERNATIVES:
+                break
+            alternative = (" ".join(fixed + [self.words[i][:lengths[i]]]), edits + int(distances[i]))
+            if alternative[1] and alternative not in alternatives:
+                alternatives.append(alternative)
+        return alternatives
+
+    def suggest(self, query, limit=10, fuzzy=True):
+        """
+        Ranked suggestions for a partial query
+
+        Returns:
+            list: [{"text", "kind", "code", "score", "match": "prefix"|"fuzzy"}, ...]
+        """
+        query = normalize(query)
+        if not query or limit <= 0:
+            return []
+
+        best = {}
+        lookups = [(query, 0)]
+        for attempt, (prefix, edits) in enumerate(lookups):
+            lo, hi = self.prefix_range(prefix)
+            if hi > lo:
+                rows = self.key_rows[lo:hi]
+                scores = self.priors[rows] + self.key_bonus[lo:hi] - FUZZY_PENALTY * edits
+                for i in np.argsort(-scores, kind="stable"):
+                    row = int(rows[i])
+                    score = float(scores[i]) + (EXACT_BONUS if self.keys[lo + i] == prefix else 0.0)
+                    if row not in best or score > best[row][0]:
+                        best[row] = (score, "fuzzy" if edits else "prefix")
+                    if len(best) >= limit * 2:
+                        break
+            # Corrections only when the query as typed comes up short
+            if attempt == 0 and fuzzy and len(best) < limit:
+                lookups.extend(self.corrections(query))
+
+        ranked = sorted(best.items(), key=lambda item: -item[1][0])[:limit]
+        return [
+            {"text": self.suggestions[row]["text"], "kind": self.suggestions[row]["kind"],
+             "code": self.suggestions[row].get("code"), "score": round(score, 4), "match": match}
+            for row, (score, match) in ranked
+        ]
+
+    def stats(self):
+        return {"suggestions": len(self.suggestions), "keys": len(self.keys), "words": len(self.words)}
+
+
+def test_suggest_index(entries_file=ENTRIES_FILE, repeats=200):
+    """Prefix, code and fuzzy suggestions, and lookup latency"""
+    from src.models.enhanced_search import SYNONYMS
+
+    start_time = time.perf_counter()
+    index = SuggestIndex.from_catalogue(entries_file, synonyms=SYNONYMS)
+    print(f"Built {index.stats()} in {(time.perf_counter() - start_time) * 1000:.1f} ms")
+
+    queries = ["softw", "nurs", "2512", "elec", "tailor", "elektrician", "teachr", "carpnter", "mason", "t"]
+    for query in queries:
+        suggestions = index.suggest(query, limit=5)
+        print(f"{query!r}: " + ", ".join(f"{s['text']} ({s['code'] or s['kind']}, {s['match']})"
+                                         for s in suggestions))
+
+    latencies = []
+    for _ in range(repeats):
+        for query in queries:
+            start_time = time.perf_counter()
+            index.suggest(query)
+            latencies.append((time.perf_counter() - start_time) * 1000)
+    p50, p99 = np.percentile(latencies, [50, 99])
+    print(f"Latency over {len(latencies)} lookups: p50 {p50:.3f} ms, p99 {p99:.3f} ms")
+
+
+if __name__ == "__main__":
+    test_suggest_index()
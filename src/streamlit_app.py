@@ -6,13 +6,18 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 import streamlit as st
 from src.models.enhanced_search import EnhancedNCOSearch
+from src.models.query_cache import get_shared_cache
 
 # Initialize search engine once
 @st.cache_resource
 def load_search_engine():
-    return EnhancedNCOSearch()
+    return EnhancedNCOSearch(query_cache=get_shared_cache())
 
-search_engine = load_search_engine()
+try:
+    search_engine = load_search_engine()
+except FileNotFoundError as e:
+    st.error(f"{e}. Build the stores with: python src/data_processing/create_occupation_embeddings.py")
+    st.stop()
 
 st.title("🔍 NCO Semantic Search")
 
@@ -32,3 +37,6 @@ if st.button("Search NCO Codes") and query.strip():
             st.write("---")
     else:
         st.warning("No matching occupations found.")
+
+with st.sidebar.expander("Query cache"):
+    st.json(search_engine.query_cache.stats())